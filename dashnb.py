@@ -4,20 +4,45 @@
 # ## Load data
 
 # %%
+import os
 import sqlite3
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 from pprint import pprint
 
-SQLITE_PATH = "prod-measurements.db"
+# Read before lpo_measure.db is imported, which fixes its database path
+os.environ.setdefault("LPO_MEASURE_DB", "prod-measurements.db")
+
+from lpo_measure.db import SQLITE_PATH, close_connection, migrate
+from lpo_measure.summaries import summarize_runs
+
+# An older database lacks the columns and summaries read below
+migrate()
+summarize_runs()
+close_connection()
 
 # %%
 conn = sqlite3.connect(SQLITE_PATH)
 
 df_runs = pd.read_sql_query("SELECT * FROM runs", conn)
-df_measurements = pd.read_sql_query("SELECT * FROM measurements", conn)
+# Final states are left out, see below; judge errors are failures of the judge infrastructure, not score 0 verdicts
+df_measurements = pd.read_sql_query(
+    """
+    SELECT id, run_id, case_id, score, reason, clay_runtime_seconds, judge_runtime_seconds, status, trial
+    FROM measurements WHERE status != 'judge_error'
+    """,
+    conn,
+)
 df_cases = pd.read_sql_query("SELECT * FROM cases", conn)
+# Per-run aggregates written when each run finishes, see `lpo_measure/summaries.py`
+df_run_summaries = pd.read_sql_query(
+    """
+    SELECT s.*, r.clay_commit_sha, r.clay_commit_message, r.timestamp
+    FROM run_summaries s JOIN runs r ON r.id = s.run_id
+    """,
+    conn,
+)
 
 conn.close()
 
@@ -32,18 +57,25 @@ display(df_cases.head())
 # ## Run results
 
 # %%
-df_merged_runs = pd.merge(df_measurements, df_runs, left_on="run_id", right_on="id")
-
-df_agg_runs = df_merged_runs.groupby("clay_commit_sha").agg(
-    avg_score=("score", "mean"),
-    total_runtime=("clay_runtime_seconds", "sum"),
-    # min to get first timestamp
-    timestamp=("timestamp", "min"),
-    # first to get commit message
-    clay_commit_message=("clay_commit_message", "first")
-).reset_index()
-
-df_agg_runs = df_agg_runs.sort_values(by="timestamp")
+# Every run holds all of its cases, reused or executed, so a commit is shown by its latest run;
+# the error bars are the bootstrap confidence interval over cases and repeated trials
+df_agg_runs = (
+    df_run_summaries.sort_values(by="run_id")
+    .groupby("clay_commit_sha")
+    .last()
+    .reset_index()
+    .rename(
+        columns={
+            "score_mean": "avg_score",
+            "clay_runtime_total": "total_runtime",
+            "score_ci_low": "ci_low",
+            "score_ci_high": "ci_high",
+        }
+    )
+)
+df_agg_runs = df_agg_runs[
+    ["clay_commit_sha", "avg_score", "total_runtime", "timestamp", "clay_commit_message", "ci_low", "ci_high"]
+].sort_values(by="timestamp")
 
 fig = go.Figure()
 
@@ -52,6 +84,12 @@ fig.add_trace(
         x=df_agg_runs["clay_commit_sha"],
         y=df_agg_runs["avg_score"],
         name="Average Score",
+        error_y=dict(
+            type="data",
+            symmetric=False,
+            array=df_agg_runs["ci_high"] - df_agg_runs["avg_score"],
+            arrayminus=df_agg_runs["avg_score"] - df_agg_runs["ci_low"],
+        ),
         customdata=df_agg_runs,
         hovertemplate="<b>Commit:</b> %{x}<br><b>Avg Score:</b> %{y:.2f}<br><b>Message:</b> %{customdata[4]}<extra></extra>"
     )
@@ -99,6 +137,33 @@ fig.update_layout(
 fig.show()
 
 
+# %% [markdown]
+# ## Trial noise
+#
+# Cases of the latest run with repeated trials (`--trials`), noisiest first.
+
+# %%
+from lpo_measure.stats import case_statistics, score_matrix
+
+df_trial_runs = df_runs[df_runs["trials"] > 1] if "trials" in df_runs else df_runs.iloc[0:0]
+if len(df_trial_runs):
+    latest_trial_run = df_trial_runs["id"].max()
+    df_trials = df_measurements[df_measurements["run_id"] == latest_trial_run]
+    df_case_scores = df_trials.groupby("case_id")["score"].apply(list)
+    statistics = case_statistics(score_matrix(df_case_scores.tolist()))
+    df_noise = pd.DataFrame(
+        {
+            "case_id": df_case_scores.index,
+            "trials": statistics.trials,
+            "mean": statistics.mean,
+            "variance": statistics.variance,
+            "ci_low": statistics.ci_low,
+            "ci_high": statistics.ci_high,
+        }
+    ).merge(df_cases[["id", "instruction"]], left_on="case_id", right_on="id").drop(columns="id")
+    display(df_noise.sort_values(by="variance", ascending=False).head(20))
+
+
 # %% [markdown]
 # ## Case results
 
@@ -195,4 +260,26 @@ fig.update_layout(
 
 fig.show()
 
+# %% [markdown]
+# ## Final states
+#
+# Final states are stored compressed and deduplicated in `state_blobs`. `final_state_json` decodes them in SQL.
+
+# %%
+from lpo_measure.blobs import register_functions
+
+conn = sqlite3.connect(SQLITE_PATH)
+register_functions(conn)
+df_final_states = pd.read_sql_query(
+    """
+    SELECT m.id, m.run_id, m.case_id, final_state_json(m.final_state, b.data) AS final_state
+    FROM measurements m
+    LEFT JOIN state_blobs b ON b.id = m.final_state_blob_id
+    """,
+    conn,
+)
+conn.close()
+
+display(df_final_states.head())
+
 # %%
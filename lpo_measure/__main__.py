@@ -1,40 +1,80 @@
 import argparse
+import asyncio
 import logging
+import multiprocessing
 import os
-import sqlite3
+import signal
 import subprocess
-from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from dataclasses import replace
 from datetime import datetime
 from pathlib import Path
+from typing import Any, Iterator
 
+import orjson
 from dotenv import load_dotenv
 from tqdm import tqdm
 
-from lpo_measure.run import BenchmarkRun
-from lpo_measure.worker import run_case_and_save
+from lpo_measure.run import (
+    CASCADE_ESCALATE_SCORES,
+    CASCADE_MIN_CONFIDENCE,
+    CLAY_TIMEOUT_SECONDS,
+    JUDGE_MODEL,
+    BenchmarkRun,
+    JudgeConfig,
+    RunSummary,
+    hash_script,
+)
+from lpo_measure.worker import init_worker, run_case_and_log
 
-from .case import Case
-from .db import SQLITE_PATH
+from . import condense, judge_cache, rules
+from .batch_judge import BATCH_SYSTEM_PROMPT
+from .case import Case, CaseMeasurement
+from .db import BatchWriter, close_connection, migrate
+from .judge import SYSTEM_PROMPT
 from .log import setup_logging
+from .transport import DEFAULT_TRANSPORT, TRANSPORTS
+
+# Modules that import numpy, and the async pipeline, are imported by the commands that use them, so `add` and the like start fast
 
 N_WORKERS = 3
+# Cases submitted to the process pool ahead of the ones finished, so workers never wait on the parent
+SUBMIT_WINDOW = 2 * N_WORKERS
+CLAY_CONCURRENCY = 8
+JUDGE_CONCURRENCY = 16
+JUDGE_QUEUE_SIZE = 16
+
+
+def read_case_entries(file_path: Path) -> Iterator[tuple[str, dict[str, Any] | None]]:
+    """
+    Stream (instruction, initial_state) pairs from a file, one per line.
+    Plaintext files hold one instruction per line; .jsonl files hold objects
+    with an "instruction" and an optional "initial_state".
+    """
+    is_jsonl = file_path.suffix == ".jsonl"
+    with open(file_path, "rb") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if is_jsonl:
+                entry = orjson.loads(line)
+                yield entry["instruction"], entry.get("initial_state")
+            else:
+                yield line.decode(), None
 
 
 def add_cases_from_file(filepath: str) -> None:
-    """Add cases from a plaintext file where each line is an instruction."""
+    """Add cases from a plaintext file where each line is an instruction, or a JSONL file of cases."""
     file_path = Path(filepath)
 
     if not file_path.exists():
         logging.error(f"Error: File {filepath} not found")
         return
 
-    with open(file_path, "r") as f:
-        instructions = [line.strip() for line in f if line.strip()]
-
-    logging.info(f"Creating {len(instructions)} cases from {filepath}")
-
-    for instruction in instructions:
-        Case.get_or_create(instruction)
+    logging.info(f"Creating cases from {filepath}")
+    created, existing = Case.bulk_create(read_case_entries(file_path))
+    logging.info(f"Created {created} cases, {existing} already existed")
 
 
 def get_git_commit_sha() -> str:
@@ -54,55 +94,248 @@ def get_git_commit_sha() -> str:
         return "unknown"
 
 
+def parse_shard(value: str) -> tuple[int, int]:
+    """Parse a shard given as "i/N" into (i, N), with shards numbered from 1."""
+    try:
+        index, count = (int(part) for part in value.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Expected a shard as i/N, got {value!r}")
+    if not 1 <= index <= count:
+        raise argparse.ArgumentTypeError(f"Shard {index} is not between 1 and {count}")
+    return index, count
+
+
+def parse_scores(value: str) -> tuple[int, ...]:
+    """Parse comma-separated judge scores, e.g. "1,2", allowing none."""
+    try:
+        scores = tuple(int(part) for part in value.split(",") if part.strip())
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Expected comma-separated scores, got {value!r}")
+    if not all(0 <= score <= 3 for score in scores):
+        raise argparse.ArgumentTypeError(f"Scores {value!r} are not all between 0 and 3")
+    return scores
+
+
+def parse_rules(value: str) -> tuple[str, ...]:
+    """Parse comma-separated structural rule names, allowing none, or "all"."""
+    if value.strip() == "all":
+        return tuple(rules.RULES)
+    names = tuple(part.strip() for part in value.split(",") if part.strip())
+    unknown = [name for name in names if name not in rules.RULES]
+    if unknown:
+        raise argparse.ArgumentTypeError(f"Unknown rules {', '.join(unknown)}, choose from {', '.join(rules.RULES)}")
+    return names
+
+
+def run_with_processes(case_ids: list[int], run: BenchmarkRun, budget: float | None = None) -> RunSummary:
+    """
+    Run cases in a pool of N_WORKERS processes, each blocking on clay and judge.
+    Workers get the run once, then case ids to load themselves, at most SUBMIT_WINDOW ahead.
+    They hand their measurements back, and the parent is the only process writing them.
+    Once the judge spend reaches the budget, cases that have not started are cancelled.
+    Ctrl-C or SIGTERM stops the workers, which terminate the clay executions in flight.
+    """
+    run_id = run.id
+    if run_id is None:
+        raise ValueError("BenchmarkRun must have an id to save measurements.")
+
+    summary = RunSummary()
+    previous_sigterm = signal.signal(signal.SIGTERM, signal.default_int_handler)
+    executor = ProcessPoolExecutor(max_workers=N_WORKERS, initializer=init_worker, initargs=(run,))
+    try:
+        with (
+            tqdm(total=len(case_ids)) as progress,
+            BatchWriter[CaseMeasurement](lambda cursor, m: m.insert(cursor, run_id)) as writer,
+        ):
+            pending = iter(case_ids)
+            in_flight: set[Future[CaseMeasurement]] = set()
+            try:
+                while True:
+                    while len(in_flight) < SUBMIT_WINDOW and not summary.over_budget(budget):
+                        case_id = next(pending, None)
+                        if case_id is None:
+                            break
+                        in_flight.add(executor.submit(run_case_and_log, case_id))
+                    if not in_flight:
+                        break
+                    done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        if future.cancelled():
+                            continue
+                        measurement = future.result()
+                        writer.add(measurement)
+                        summary.add(measurement)
+                        progress.update(1)
+                    if summary.over_budget(budget):
+                        for future in in_flight:
+                            future.cancel()
+            except KeyboardInterrupt:
+                summary.interrupted = True
+                logging.warning("Run interrupted, cancelled the cases in flight")
+                # Workers only see Ctrl-C from the terminal, not a SIGTERM sent to this process
+                for worker in multiprocessing.active_children():
+                    worker.terminate()
+    finally:
+        executor.shutdown(wait=not summary.interrupted, cancel_futures=True)
+        signal.signal(signal.SIGTERM, previous_sigterm)
+    summary.skipped = len(case_ids) - summary.cases
+    return summary
+
+
 def run_all_cases(
     script_path: str,
     clay_commit_sha: str,
     clay_commit_message: str,
     model: str,
+    engine: str = "async",
+    clay_concurrency: int = CLAY_CONCURRENCY,
+    judge_concurrency: int = JUDGE_CONCURRENCY,
+    judge_queue_size: int = JUDGE_QUEUE_SIZE,
+    judge: JudgeConfig | None = None,
+    force: bool = False,
+    clay_runner: str = "spawn",
+    clay_transport: str = DEFAULT_TRANSPORT,
+    budget: float | None = None,
+    judge_batch_tokens: int | None = None,
+    clay_timeout: float | None = CLAY_TIMEOUT_SECONDS,
+    clay_idle_timeout: float | None = None,
+    resume: int | None = None,
+    shard: tuple[int, int] | None = None,
+    trials: int = 1,
 ) -> None:
-    """Run measurements against all cases in the database."""
-    run = BenchmarkRun(
-        script_path=script_path,
-        clay_commit_sha=clay_commit_sha,
-        clay_commit_message=clay_commit_message,
-        model=model,
-        timestamp=datetime.now(),
-        benchmark_commit_sha=get_git_commit_sha(),
-    )
+    """
+    Run measurements against all cases in the database.
+    With resume, continue that run instead, only measuring the trials it has no measurement for yet.
+    With shard (i, N), only measure the i-th of N deterministic slices of the cases.
+    With trials, measure every case up to that many times, stopping early once its scores converge.
+    """
+    from .pipeline import run_pipeline
+    from .stats import CONFIDENCE
+    from .summaries import update_run_summary
+    from .trials import TrialScheduler
+
+    if engine == "process":
+        if clay_runner != "spawn":
+            raise ValueError("The process engine only supports spawning clay per case.")
+        if judge_batch_tokens:
+            raise ValueError("The process engine only supports judging one case per request.")
+    if judge is not None and judge.cascade_model is not None and judge_batch_tokens:
+        raise ValueError("A cascade judge judges one case per request, it cannot be combined with batching.")
+
+    if resume is None:
+        run = BenchmarkRun(
+            script_path=script_path,
+            clay_commit_sha=clay_commit_sha,
+            clay_commit_message=clay_commit_message,
+            model=model,
+            timestamp=datetime.now(),
+            benchmark_commit_sha=get_git_commit_sha(),
+            script_hash=hash_script(script_path),
+            shard_index=shard[0] if shard else None,
+            shard_count=shard[1] if shard else None,
+            trials=trials,
+        )
+    else:
+        run = BenchmarkRun.load_from_db(resume, script_path)
+    if engine == "process" and run.trials > 1:
+        raise ValueError("The process engine only supports a single trial per case.")
+    run.judge = judge or JudgeConfig()
+    if run.judge_config is not None and run.judge_config != run.judge.verdict_settings():
+        raise ValueError(
+            f"Run {resume} was judged with {run.judge_config}, resume it with the same judge settings, "
+            f"not {run.judge.verdict_settings()}"
+        )
+    run.clay_timeout = clay_timeout
+    run.clay_idle_timeout = clay_idle_timeout
+    run.clay_transport = clay_transport
 
-    cases = Case.load_all_from_db()
-    num_cases = len(cases)
+    # Only ids are held here, each case is loaded by whoever measures it
+    case_ids = list(Case.iter_ids(run.shard_index, run.shard_count))
+    if run.shard_index is not None:
+        logging.info(f"Shard {run.shard_index}/{run.shard_count} has {len(case_ids)} cases")
 
-    if not cases:
+    if not case_ids:
         logging.info("No cases found in the database.")
+        if run.shard_index is not None and resume is None:
+            # Merging looks for a run in every shard database, an empty shard has measured all it has
+            run.save_to_db()
+            run.set_status("complete")
+            close_connection()
         return
 
-    logging.info(f"Running {num_cases} cases with {N_WORKERS} workers...")
-
-    with sqlite3.connect(SQLITE_PATH) as conn:
-        cursor = conn.cursor()
-        cursor.execute(
-            "INSERT INTO runs (timestamp, clay_commit_sha, clay_commit_message, benchmark_commit_sha, model) VALUES (?, ?, ?, ?, ?)",
-            (
-                run.timestamp.isoformat(),
-                run.clay_commit_sha,
-                run.clay_commit_message,
-                run.benchmark_commit_sha,
-                run.model,
-            ),
-        )
-        conn.commit()
-        run.id = cursor.lastrowid
-        assert run.id is not None, "Failed to create run entry"
+    measured: dict[int, dict[int, int | None]] = {}
+    if resume is None:
+        run.save_to_db()
+    else:
+        measured = run.measured_trials()
+        logging.info(f"Resuming run {run.id} with model {run.model}, {len(measured)} cases already measured")
+        case_ids = [case_id for case_id in case_ids if len(measured.get(case_id, {})) < run.trials]
+        run.set_status("running")
+    num_cases = len(case_ids)
 
-    with ProcessPoolExecutor(max_workers=N_WORKERS, initializer=setup_logging) as executor:
-        futures = []
-        for case in cases:
-            futures.append(executor.submit(run_case_and_save, case, run))
+    try:
+        reused_case_ids: set[int] = set()
+        if run.trials > 1:
+            # Cached verdicts and reused measurements would hide the noise the trials are there to measure
+            logging.info(f"Measuring up to {run.trials} trials per case, without reuse or the judge cache")
+            run.judge = replace(run.judge, use_cache=False)
+        elif not force:
+            reused_case_ids = run.reuse_measurements(case_ids)
+            if reused_case_ids:
+                logging.info(
+                    f"Reused {len(reused_case_ids)} measurements already taken with script {run.script_hash} and model {run.model}"
+                )
+                case_ids = [case_id for case_id in case_ids if case_id not in reused_case_ids]
+                num_cases = len(case_ids)
 
-        for future in tqdm(as_completed(futures), total=num_cases):
-            future.result()
+        if engine == "process":
+            if run.judge.requests_per_second is not None:
+                # Every worker process has its own rate limiter
+                run.judge = replace(run.judge, requests_per_second=run.judge.requests_per_second / N_WORKERS)
+            logging.info(f"Running {num_cases} cases with {N_WORKERS} workers...")
+            summary = run_with_processes(case_ids, run, budget)
+        elif engine == "async":
+            logging.info(
+                f"Running {num_cases} cases with {clay_concurrency} clay workers and {judge_concurrency} judge workers..."
+            )
+            summary = asyncio.run(
+                run_pipeline(
+                    TrialScheduler(case_ids, run.trials, measured),
+                    run,
+                    clay_concurrency,
+                    judge_concurrency,
+                    judge_queue_size,
+                    clay_runner,
+                    budget,
+                    judge_batch_tokens,
+                )
+            )
+        else:
+            raise ValueError(f"Unknown engine: {engine}")
+    except BaseException:
+        # Whatever was measured so far is kept, and the run can be resumed
+        run.update_totals()
+        update_run_summary(run.id)
+        run.set_status("failed")
+        logging.error(f"Run {run.id} failed, continue it with --resume {run.id}")
+        raise
 
+    summary.reused = len(reused_case_ids)
+    run.update_totals()
+    if summary.interrupted:
+        logging.warning(f"Run was interrupted, {summary.skipped} cases were not run")
+    elif summary.skipped:
+        logging.warning(f"Judge budget of ${budget} reached, {summary.skipped} cases were not run")
+    run.set_status("partial" if summary.skipped else "complete")
+    if summary.skipped:
+        logging.warning(f"Continue run {run.id} with --resume {run.id}")
+    summary.log()
+    statistics = update_run_summary(run.id)
+    logging.info(
+        f"Run score {statistics.mean:.3f} ({CONFIDENCE:.0%} CI {statistics.ci_low:.3f}-{statistics.ci_high:.3f}) "
+        f"over {statistics.cases} cases, mean variance between trials {statistics.trial_variance:.3f}"
+    )
+    close_connection()
     logging.info("Measurement run complete")
 
 
@@ -114,7 +347,7 @@ if __name__ == "__main__":
 
     # Add cases mode
     add_parser = subparsers.add_parser("add", help="Add cases from file")
-    add_parser.add_argument("file", help="Plaintext file with instructions")
+    add_parser.add_argument("file", help="Plaintext file with instructions, or JSONL file with cases")
 
     # Run mode
     run_parser = subparsers.add_parser("run", help="Run all cases")
@@ -138,8 +371,243 @@ if __name__ == "__main__":
         help="Model name to use",
         default="gpt-5-mini",
     )
+    run_parser.add_argument(
+        "--engine",
+        help="Execution engine: an asyncio clay -> judge pipeline, or a pool of N_WORKERS processes",
+        choices=["async", "process"],
+        default="async",
+    )
+    run_parser.add_argument(
+        "--clay-concurrency",
+        help="Number of clay stage workers (async engine)",
+        type=int,
+        default=CLAY_CONCURRENCY,
+    )
+    run_parser.add_argument(
+        "--judge-concurrency",
+        help="Number of judge stage workers (async engine)",
+        type=int,
+        default=JUDGE_CONCURRENCY,
+    )
+    run_parser.add_argument(
+        "--judge-queue-size",
+        help="Maximum number of final states waiting between the clay and judge stages (async engine)",
+        type=int,
+        default=JUDGE_QUEUE_SIZE,
+    )
+
+    run_parser.add_argument(
+        "--no-judge-cache",
+        help="Always call the judge, ignoring cached verdicts (fresh verdicts are still cached)",
+        action="store_true",
+    )
+
+    run_parser.add_argument(
+        "--force",
+        help="Execute every case, even those already measured with the same script, model and case hash",
+        action="store_true",
+    )
+
+    run_parser.add_argument(
+        "--clay-runner",
+        help="Spawn clay once per case, or keep a pool of persistent clay processes (async engine)",
+        choices=["spawn", "pool"],
+        default="spawn",
+    )
+
+    run_parser.add_argument(
+        "--clay-transport",
+        help="How spawned clay gets its initial state and returns its final state: temp files, tmpfs files or pipes",
+        choices=TRANSPORTS,
+        default=DEFAULT_TRANSPORT,
+    )
+
+    run_parser.add_argument(
+        "--budget",
+        help="Stop starting new cases once the run's judge spend reaches this many dollars",
+        type=float,
+    )
+
+    run_parser.add_argument(
+        "--judge-batch-tokens",
+        help="Judge queued cases together in requests of up to this many prompt tokens (async engine)",
+        type=int,
+    )
+
+    run_parser.add_argument(
+        "--judge-state-profile",
+        help="How final states are condensed in judge prompts",
+        choices=list(condense.PROFILES),
+        default=condense.DEFAULT_PROFILE,
+    )
+
+    run_parser.add_argument(
+        "--judge-rules",
+        help=f"Comma-separated structural rules run before the judge model ({', '.join(rules.RULES)}), "
+        "or all; none by default",
+        type=parse_rules,
+        default=rules.DEFAULT_RULES,
+    )
+    run_parser.add_argument("--judge-model", help="Judge model, the strong tier of a cascade", default=JUDGE_MODEL)
+    run_parser.add_argument(
+        "--judge-cascade-model",
+        help="Cheap model that judges first, escalating unsure and borderline verdicts to --judge-model",
+    )
+    run_parser.add_argument(
+        "--judge-cascade-confidence",
+        help="Escalate cheap verdicts with a confidence below this",
+        type=float,
+        default=CASCADE_MIN_CONFIDENCE,
+    )
+    run_parser.add_argument(
+        "--judge-cascade-escalate-scores",
+        help="Comma-separated cheap verdict scores that are always escalated, empty for none",
+        type=parse_scores,
+        default=CASCADE_ESCALATE_SCORES,
+    )
+
+    run_parser.add_argument(
+        "--judge-rps",
+        help="Maximum judge requests per second over all workers, backing off further on 429s",
+        type=float,
+    )
+    run_parser.add_argument(
+        "--judge-max-retries",
+        help="Retries of a judge request on rate limits, timeouts and connection errors",
+        type=int,
+        default=JudgeConfig.max_retries,
+    )
+    run_parser.add_argument(
+        "--judge-timeout",
+        help="Seconds before a single judge request times out",
+        type=float,
+        default=JudgeConfig.request_timeout,
+    )
+
+    run_parser.add_argument(
+        "--resume",
+        help="Continue the run with this id, only measuring cases it has no measurement for yet",
+        type=int,
+        metavar="RUN_ID",
+    )
+    run_parser.add_argument(
+        "--shard",
+        help="Only measure shard i of N, e.g. 2/4, writing to the database in LPO_MEASURE_DB",
+        type=parse_shard,
+        metavar="i/N",
+    )
+    run_parser.add_argument(
+        "--trials",
+        help="Measure every case up to this many times, stopping early for cases whose scores converge (async engine)",
+        type=int,
+        default=1,
+    )
+    run_parser.add_argument(
+        "--clay-timeout",
+        help="Seconds before a clay execution is killed and recorded as clay_timeout, 0 for no limit",
+        type=float,
+        default=CLAY_TIMEOUT_SECONDS,
+    )
+    run_parser.add_argument(
+        "--clay-idle-timeout",
+        help="Seconds clay may go without writing any output before it is killed",
+        type=float,
+    )
+
+    # Merge mode
+    merge_parser = subparsers.add_parser("merge", help="Fold the runs of shard databases into one run")
+    merge_parser.add_argument("shards", nargs="+", help="Shard database files, one per shard")
+
+    # Summarize mode
+    summarize_parser = subparsers.add_parser(
+        "summarize", help="Recompute run summaries, by default of finished runs that have none"
+    )
+    summarize_parser.add_argument("run_ids", nargs="*", type=int, help="Runs to summarize again")
+
+    # Export dashboard mode
+    export_parser = subparsers.add_parser(
+        "export-dashboard", help="Write a static dashboard page with its data files, loaded per case"
+    )
+    export_parser.add_argument("--out", help="Output directory", type=Path, default=Path("dashboard"))
+
+    # Compare mode
+    compare_parser = subparsers.add_parser(
+        "compare", help="Report score and runtime changes between two runs, failing on significant regressions"
+    )
+    compare_parser.add_argument("base", help="Run id or clay commit SHA (prefix) to compare against")
+    compare_parser.add_argument("head", help="Run id or clay commit SHA (prefix) to compare")
+    compare_parser.add_argument(
+        "--alpha", help="Significance level for flagging regressions, 0.05 by default", type=float
+    )
+    compare_parser.add_argument(
+        "--max-drop",
+        help="Score drop flagging a case with a single trial on a side, which cannot be t-tested, 2 by default",
+        type=float,
+    )
+    compare_parser.add_argument("--limit", help="Number of other changed cases to list", type=int, default=20)
+
+    # Judge cache mode
+    cache_parser = subparsers.add_parser("cache", help="Inspect or evict cached judge verdicts")
+    cache_parser.add_argument("action", choices=["stats", "clear"])
+    cache_parser.add_argument("--judge-model", help="Only evict verdicts from this judge model")
+    cache_parser.add_argument("--older-than-days", type=float, help="Only evict verdicts older than this")
+    cache_parser.add_argument(
+        "--stale-prompt",
+        help="Only evict verdicts made with a different system prompt than the current one",
+        action="store_true",
+    )
+
+    # Batched judge calibration mode
+    calibrate_parser = subparsers.add_parser(
+        "calibrate-batch", help="Report agreement of batched judging with single-case verdicts"
+    )
+    calibrate_parser.add_argument(
+        "--judge-batch-tokens", help="Prompt tokens per batched request", type=int, default=32_000
+    )
+    calibrate_parser.add_argument("--limit", help="Only use the most recent measurements", type=int)
+    calibrate_parser.add_argument(
+        "--fresh-single",
+        help="Compare against fresh single-case verdicts instead of the recorded scores",
+        action="store_true",
+    )
+
+    # Condensed state calibration mode
+    condense_parser = subparsers.add_parser(
+        "calibrate-condense", help="Report judge prompt token savings of a condense profile"
+    )
+    condense_parser.add_argument(
+        "--judge-state-profile", choices=list(condense.PROFILES), default="compact", help="Profile to evaluate"
+    )
+    condense_parser.add_argument("--limit", help="Only use the most recent measurements", type=int)
+    condense_parser.add_argument(
+        "--judge", help="Also re-judge condensed states and report score agreement", action="store_true"
+    )
+    condense_parser.add_argument(
+        "--fresh-full",
+        help="Compare against fresh full-state verdicts instead of the recorded scores",
+        action="store_true",
+    )
+
+    # Clay state transport calibration mode
+    transport_parser = subparsers.add_parser(
+        "calibrate-transport", help="Time spawned clay runs on a large synthetic canvas over every state transport"
+    )
+    transport_parser.add_argument(
+        "--script",
+        help="Clay script to time, by default the stub, which times the harness side alone",
+        default=str(Path(__file__).with_name("stub_clay.py")),
+    )
+    transport_parser.add_argument("--model", help="Model name passed to clay", default="gpt-5-mini")
+    transport_parser.add_argument("--nodes", help="Nodes in the synthetic canvas", type=int, default=20_000)
+    transport_parser.add_argument("--repeats", help="Timed runs per transport", type=int, default=10)
+
+    # Migrate mode
+    subparsers.add_parser("migrate", help="Bring the database schema up to date, which every command does first")
 
     args = parser.parse_args()
+    migrated = migrate()
+    if migrated:
+        logging.info(f"Applied {migrated} schema migrations")
 
     if args.mode == "add":
         add_cases_from_file(args.file)
@@ -151,6 +619,80 @@ if __name__ == "__main__":
             args.clay_commit_sha,
             args.clay_commit_message,
             args.model,
+            engine=args.engine,
+            clay_concurrency=args.clay_concurrency,
+            judge_concurrency=args.judge_concurrency,
+            judge_queue_size=args.judge_queue_size,
+            judge=JudgeConfig(
+                model=args.judge_model,
+                cascade_model=args.judge_cascade_model,
+                cascade_min_confidence=args.judge_cascade_confidence,
+                cascade_escalate_scores=args.judge_cascade_escalate_scores,
+                rules=args.judge_rules,
+                state_profile=args.judge_state_profile,
+                use_cache=not args.no_judge_cache,
+                requests_per_second=args.judge_rps,
+                max_retries=args.judge_max_retries,
+                request_timeout=args.judge_timeout,
+            ),
+            force=args.force,
+            clay_runner=args.clay_runner,
+            clay_transport=args.clay_transport,
+            budget=args.budget,
+            judge_batch_tokens=args.judge_batch_tokens,
+            clay_timeout=args.clay_timeout or None,
+            clay_idle_timeout=args.clay_idle_timeout,
+            resume=args.resume,
+            shard=args.shard,
+            trials=args.trials,
+        )
+    elif args.mode == "migrate":
+        pass
+    elif args.mode == "merge":
+        from .merge import merge_shards
+
+        merge_shards([Path(path) for path in args.shards])
+    elif args.mode == "summarize":
+        from .summaries import summarize_runs
+
+        summarize_runs(args.run_ids or None)
+    elif args.mode == "export-dashboard":
+        from .dashboard import export_dashboard
+
+        export_dashboard(args.out)
+    elif args.mode == "compare":
+        from .compare import ALPHA, MAX_DROP, compare_runs, log_comparison
+
+        comparison = compare_runs(
+            args.base,
+            args.head,
+            ALPHA if args.alpha is None else args.alpha,
+            MAX_DROP if args.max_drop is None else args.max_drop,
         )
+        log_comparison(comparison, args.limit)
+        if comparison.regressed:
+            raise SystemExit(1)
+    elif args.mode == "cache":
+        if args.action == "stats":
+            for judge_model, prompt_hash, entries in judge_cache.stats():
+                logging.info(f"{judge_model} prompt {prompt_hash}: {entries} verdicts")
+        else:
+            keep_prompt_hashes = None
+            if args.stale_prompt:
+                keep_prompt_hashes = [judge_cache.prompt_hash(p) for p in (SYSTEM_PROMPT, BATCH_SYSTEM_PROMPT)]
+            removed = judge_cache.clear(args.judge_model, args.older_than_days, keep_prompt_hashes)
+            logging.info(f"Evicted {removed} cached verdicts")
+    elif args.mode == "calibrate-batch":
+        from .calibration import calibrate_batch
+
+        asyncio.run(calibrate_batch(args.judge_batch_tokens, args.limit, args.fresh_single))
+    elif args.mode == "calibrate-condense":
+        from .calibration import calibrate_condense
+
+        asyncio.run(calibrate_condense(args.judge_state_profile, args.limit, args.judge, args.fresh_full))
+    elif args.mode == "calibrate-transport":
+        from .calibration import calibrate_transport
+
+        asyncio.run(calibrate_transport(args.script, args.model, args.nodes, args.repeats))
     else:
         raise Exception("Unreachable code.")
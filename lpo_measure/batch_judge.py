@@ -0,0 +1,188 @@
+import logging
+from dataclasses import dataclass
+from typing import Any
+
+import orjson
+
+from . import condense, judge_cache, judge_client, rules
+from .case import CaseResult
+from .judge import (
+    NO_FINAL_STATE_REASON,
+    STRONG_TIER,
+    format_facts,
+    judge_instruction_achieved_async,
+    response_usage,
+)
+from .run import JudgeConfig
+from .timing import MeasurementTimings, span
+
+logger = logging.getLogger(__name__)
+
+BATCH_SYSTEM_PROMPT = """You are an expert evaluator that judges how well user instructions were completed on a canvas interface.
+
+You will be given several numbered cases. For each case, analyze the final state of the canvas and determine how successfully the user's instruction was fulfilled. Judge every case on its own, independently of the others.
+
+Evaluation criteria:
+- Score 0: Instruction completely failed or ignored
+- Score 1: Minimal progress, major elements missing or incorrect
+- Score 2: Good progress, instruction mostly completed with minor issues
+- Score 3: Perfect completion, instruction fully achieved as intended
+
+You must respond with valid JSON in this exact format, with one entry per case:
+{
+  "results": [
+    {"case": <case number>, "score": <0-3>, "reason": "<explanation in 100 words or less>"}
+  ]
+}
+
+Focus on whether the final canvas state matches what the user requested. Consider node types, content, positioning, relationships, and overall structure."""
+
+# Upper bound on cases per request, however small they are, to keep responses well-formed
+MAX_BATCH_CASES = 16
+
+
+@dataclass
+class BatchItem:
+    """One (instruction, final state) pair waiting to be judged in a batch."""
+
+    instruction: str
+    final_state: dict[str, Any] | None
+    timings: MeasurementTimings
+    # For the rules that compare against it, None when unknown
+    initial_state: dict[str, Any] | None = None
+
+    def tokens(self, config: JudgeConfig) -> int:
+        """Approximate prompt tokens this case adds to a batch."""
+        if self.final_state is None:
+            return 0
+        _, facts = rules.check(self.initial_state, self.final_state, config.rules)
+        return judge_client.get_litellm().token_counter(
+            model=config.model, text=_case_prompt(0, self.instruction, self.final_state, config.state_profile, facts)
+        )
+
+
+def _case_prompt(
+    number: int, instruction: str, final_state: dict[str, Any], state_profile: str, facts: list[str]
+) -> str:
+    return f"""Case {number}
+Instruction: "{instruction}"
+
+Final canvas state:
+{condense.serialize(final_state, condense.PROFILES[state_profile])}{format_facts(facts)}"""
+
+
+def _valid_result(entry: Any) -> CaseResult | None:
+    if not isinstance(entry, dict):
+        return None
+    score, reason = entry.get("score"), entry.get("reason")
+    if not isinstance(score, int) or isinstance(score, bool) or not 0 <= score <= 3 or not isinstance(reason, str):
+        return None
+    return CaseResult(score=score, reason=reason, judge_tier=STRONG_TIER)
+
+
+def _share(total: int, parts: int, first: bool) -> int:
+    """One of equal parts of a token count, the first also taking the remainder so the parts add up to it."""
+    share, remainder = divmod(total, parts)
+    return share + remainder if first else share
+
+
+async def judge_batch_async(items: list[BatchItem], config: JudgeConfig | None = None) -> list[CaseResult]:
+    """
+    Judge several cases with a single LLM request, returning one CaseResult per item in order.
+    Cached verdicts, cases without a final state and cases a structural rule decides are resolved
+    without the request.
+    Items the response leaves out or gets malformed are re-judged one by one.
+    """
+    if config is None:
+        config = JudgeConfig()
+    results: list[CaseResult | None] = [None] * len(items)
+    keys: dict[int, str] = {}
+    facts: dict[int, list[str]] = {}
+    for i, item in enumerate(items):
+        if item.final_state is None:
+            results[i] = CaseResult(score=0, reason=NO_FINAL_STATE_REASON)
+            continue
+        verdict, facts[i] = rules.check(item.initial_state, item.final_state, config.rules)
+        if verdict is not None:
+            results[i] = verdict
+            continue
+        keys[i] = judge_cache.cache_key(
+            item.instruction, item.final_state, config.model, BATCH_SYSTEM_PROMPT, config.state_profile, facts[i]
+        )
+        if config.use_cache and (cached := judge_cache.get(keys[i])) is not None:
+            cached.judge_tier = STRONG_TIER
+            results[i] = cached
+
+    pending = [i for i, result in enumerate(results) if result is None]
+    if len(pending) > 1:
+        timings = MeasurementTimings()
+        try:
+            user_prompt = "\n\n".join(
+                _case_prompt(
+                    number, items[i].instruction, items[i].final_state, config.state_profile, facts[i]  # type: ignore[arg-type]
+                )
+                for number, i in enumerate(pending, start=1)
+            )
+            with span(timings, "judge_request"):
+                response = await judge_client.complete_async(
+                    config,
+                    messages=[
+                        {"role": "system", "content": BATCH_SYSTEM_PROMPT},
+                        {"role": "user", "content": user_prompt},
+                    ],
+                    response_format={"type": "json_object"},
+                )
+            with span(timings, "judge_parse"):
+                content = response.choices[0].message.content  # type: ignore
+                assert content is not None
+                entries = orjson.loads(content)["results"]
+                by_number = {entry.get("case"): entry for entry in entries if isinstance(entry, dict)}
+            prompt_tokens, completion_tokens, cost = response_usage(response)
+
+            judged = [
+                (i, result)
+                for number, i in enumerate(pending, start=1)
+                if (result := _valid_result(by_number.get(number))) is not None
+            ]
+            for n, (i, result) in enumerate(judged):
+                # The batch request is shared by the items it judged: each carries an equal part of it and the
+                # first also the remainder, so they add up to the request. Items judged again carry their own.
+                result.prompt_tokens = _share(prompt_tokens, len(judged), first=n == 0)
+                result.completion_tokens = _share(completion_tokens, len(judged), first=n == 0)
+                result.cost = cost / len(judged)
+                items[i].timings.judge_request = timings.judge_request
+                items[i].timings.judge_parse = timings.judge_parse
+                judge_cache.put(keys[i], config.model, BATCH_SYSTEM_PROMPT, result)
+                results[i] = result
+        except Exception as e:
+            logger.error(f"LLM batch judge error, judging {len(pending)} cases one by one: {e}")
+
+    missing = [i for i, result in enumerate(results) if result is None]
+    if missing and len(pending) > 1:
+        logger.warning(f"Batch judge left {len(missing)} of {len(pending)} cases unjudged, judging them one by one")
+    for i in missing:
+        results[i] = await judge_instruction_achieved_async(
+            items[i].instruction,
+            items[i].final_state,
+            config,
+            timings=items[i].timings,
+            initial_state=items[i].initial_state,
+        )
+    return results  # type: ignore[return-value]
+
+
+def pack_batches(items: list[BatchItem], batch_tokens: int, config: JudgeConfig) -> list[list[BatchItem]]:
+    """Split items into consecutive batches of at most batch_tokens prompt tokens."""
+    batches: list[list[BatchItem]] = []
+    batch: list[BatchItem] = []
+    tokens = 0
+    for item in items:
+        item_tokens = item.tokens(config)
+        if batch and (tokens + item_tokens > batch_tokens or len(batch) >= MAX_BATCH_CASES):
+            batches.append(batch)
+            batch, tokens = [], 0
+        batch.append(item)
+        tokens += item_tokens
+    if batch:
+        batches.append(batch)
+    return batches
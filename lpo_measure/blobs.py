@@ -0,0 +1,108 @@
+import hashlib
+import sqlite3
+import zlib
+from typing import Any, Callable
+
+import orjson
+
+COMPRESSION_LEVEL = 9
+
+
+def encode(state: dict[str, Any]) -> tuple[str, bytes]:
+    """Return the content hash and compressed canonical JSON of a canvas state."""
+    data = orjson.dumps(state, option=orjson.OPT_SORT_KEYS)
+    return hashlib.sha256(data).hexdigest(), zlib.compress(data, COMPRESSION_LEVEL)
+
+
+def decode(data: bytes) -> dict[str, Any]:
+    """Inverse of encode."""
+    return orjson.loads(zlib.decompress(data))
+
+
+def store(cursor: sqlite3.Cursor, state: dict[str, Any]) -> int:
+    """Store a state blob once per distinct content and return its id."""
+    data = orjson.dumps(state, option=orjson.OPT_SORT_KEYS)
+    state_hash = hashlib.sha256(data).hexdigest()
+    return store_encoded(cursor, state_hash, lambda: zlib.compress(data, COMPRESSION_LEVEL))
+
+
+def store_encoded(cursor: sqlite3.Cursor, state_hash: str, data: bytes | Callable[[], bytes]) -> int:
+    """
+    Store an already encoded state blob once per distinct content and return its id.
+    data can be a callable, so compression is skipped when the blob is already stored.
+    """
+    cursor.execute("SELECT id FROM state_blobs WHERE hash = ?", (state_hash,))
+    row = cursor.fetchone()
+    if row:
+        return row[0]
+    cursor.execute(
+        "INSERT INTO state_blobs (hash, data) VALUES (?, ?)",
+        (state_hash, data() if callable(data) else data),
+    )
+    if cursor.lastrowid is None:
+        raise TypeError("Failed to get last row id after insert.")
+    return cursor.lastrowid
+
+
+def decode_final_state(final_state: str, blob: bytes | None) -> dict[str, Any] | None:
+    """
+    Decode a measurement's final state from its blob, falling back to the legacy
+    inline TEXT column. Returns None when the measurement has no final state.
+    """
+    if blob is not None:
+        return decode(blob)
+    if final_state in ("", "{}"):
+        return None
+    return orjson.loads(final_state)
+
+
+def load_final_state(conn: sqlite3.Connection, measurement_id: int) -> dict[str, Any] | None:
+    """Load the decoded final state of a measurement."""
+    row = conn.execute(
+        """
+        SELECT m.final_state, b.data
+        FROM measurements m
+        LEFT JOIN state_blobs b ON b.id = m.final_state_blob_id
+        WHERE m.id = ?
+        """,
+        (measurement_id,),
+    ).fetchone()
+    if row is None:
+        raise ValueError(f"Measurement with id {measurement_id} not found")
+    return decode_final_state(row[0], row[1])
+
+
+def recorded_final_states(conn: sqlite3.Connection, limit: int | None = None) -> list[tuple[str, int, dict[str, Any]]]:
+    """(instruction, score, final state) of the most recent executed measurements that have a final state."""
+    rows = conn.execute(
+        """
+        SELECT c.instruction, m.score, m.final_state, b.data
+        FROM measurements m
+        JOIN cases c ON c.id = m.case_id
+        LEFT JOIN state_blobs b ON b.id = m.final_state_blob_id
+        WHERE m.reused_from IS NULL
+        ORDER BY m.id DESC
+        """
+    )
+    states = []
+    for instruction, score, final_state, blob in rows:
+        state = decode_final_state(final_state, blob)
+        if state is not None:
+            states.append((instruction, score, state))
+            if limit is not None and len(states) >= limit:
+                break
+    return states
+
+
+def register_functions(conn: sqlite3.Connection) -> None:
+    """
+    Register a final_state_json(final_state, blob) SQL function, so queries can read
+    final states as JSON text, e.g. in pandas.read_sql_query.
+    """
+
+    def final_state_json(final_state: str, blob: bytes | None) -> str:
+        if blob is not None:
+            return zlib.decompress(blob).decode()
+        return final_state
+
+    conn.create_function("final_state_json", 2, final_state_json, deterministic=True)
@@ -0,0 +1,181 @@
+import logging
+import os
+import time
+from dataclasses import replace
+from datetime import datetime
+from typing import Any
+
+import numpy as np
+import orjson
+
+from . import condense, judge_client
+from .batch_judge import BatchItem, judge_batch_async, pack_batches
+from .blobs import recorded_final_states
+from .case import Case
+from .clay import run_clay_async
+from .db import get_connection
+from .judge import judge_instruction_achieved_async
+from .run import BenchmarkRun, JudgeConfig
+from .timing import MeasurementTimings
+from .transport import TRANSPORTS
+
+logger = logging.getLogger(__name__)
+
+
+def log_agreement(reference: list[int], candidate: list[int], description: str) -> None:
+    """Log how well two lists of 0-3 scores for the same cases agree."""
+    ref = np.array(reference)
+    cand = np.array(candidate)
+    confusion = np.zeros((4, 4), dtype=int)
+    np.add.at(confusion, (ref, cand), 1)
+
+    # Cohen's kappa: agreement corrected for what the score distributions agree on by chance
+    observed = np.trace(confusion) / len(ref)
+    expected = (confusion.sum(axis=1) @ confusion.sum(axis=0)) / len(ref) ** 2
+    kappa = (observed - expected) / (1 - expected) if expected < 1 else 1.0
+
+    logger.info(
+        f"{description} on {len(ref)} cases: "
+        f"{observed:.1%} exact agreement, {np.mean(np.abs(ref - cand) <= 1):.1%} within one point, "
+        f"mean absolute difference {np.mean(np.abs(ref - cand)):.2f}, Cohen's kappa {kappa:.2f}"
+    )
+    logger.info(f"Confusion matrix (rows reference score 0-3, columns candidate score 0-3):\n{confusion}")
+
+
+async def _reference_scores(states: list[tuple[str, int, dict]], fresh: bool, config: JudgeConfig) -> list[int]:
+    if not fresh:
+        return [score for _, score, _ in states]
+    return [
+        (await judge_instruction_achieved_async(instruction, state, config)).score
+        for instruction, _, state in states
+    ]
+
+
+async def calibrate_batch(batch_tokens: int, limit: int | None = None, fresh_single: bool = False) -> None:
+    """
+    Judge recorded final states in batches and log how well the batched verdicts agree
+    with single-case verdicts: the scores stored in measurements, or fresh ones.
+    """
+    with get_connection() as conn:
+        states = recorded_final_states(conn, limit)
+    if not states:
+        logger.info("No recorded final states to calibrate against.")
+        return
+
+    config = JudgeConfig(use_cache=False)
+    reference = await _reference_scores(states, fresh_single, config)
+
+    items = [BatchItem(instruction, state, MeasurementTimings()) for instruction, _, state in states]
+    batched: list[int] = []
+    for batch in pack_batches(items, batch_tokens, config):
+        batched.extend(result.score for result in await judge_batch_async(batch, config))
+
+    log_agreement(reference, batched, f"Batched vs {'fresh' if fresh_single else 'recorded'} single-case verdicts")
+
+
+async def calibrate_condense(
+    state_profile: str,
+    limit: int | None = None,
+    judge: bool = False,
+    fresh_full: bool = False,
+) -> None:
+    """
+    Log judge prompt tokens of recorded final states before and after condensing with a profile.
+    With judge, also re-judge the condensed states and log agreement with full-state verdicts:
+    the scores stored in measurements, or fresh ones.
+    """
+    with get_connection() as conn:
+        states = recorded_final_states(conn, limit)
+    if not states:
+        logger.info("No recorded final states to calibrate against.")
+        return
+
+    config = JudgeConfig(use_cache=False)
+    profile = condense.PROFILES[state_profile]
+
+    def tokens(state: dict, profile: condense.CondenseProfile) -> int:
+        return judge_client.get_litellm().token_counter(model=config.model, text=condense.serialize(state, profile))
+
+    full = np.array([tokens(state, condense.PROFILES["full"]) for *_, state in states])
+    condensed = np.array([tokens(state, profile) for *_, state in states])
+    logger.info(
+        f"Final state tokens on {len(states)} states, full -> {state_profile}: "
+        f"total {full.sum()} -> {condensed.sum()} ({1 - condensed.sum() / full.sum():.1%} saved), "
+        f"mean {full.mean():.0f} -> {condensed.mean():.0f}, max {full.max()} -> {condensed.max()}"
+    )
+
+    if judge:
+        reference = await _reference_scores(states, fresh_full, config)
+        condensed_config = replace(config, state_profile=state_profile)
+        candidate = [
+            (await judge_instruction_achieved_async(instruction, state, condensed_config)).score
+            for instruction, _, state in states
+        ]
+        log_agreement(
+            reference,
+            candidate,
+            f"{state_profile} vs {'fresh' if fresh_full else 'recorded'} full-state verdicts",
+        )
+
+
+def synthetic_canvas(nodes: int) -> dict[str, Any]:
+    """A canvas of text nodes on a grid, chained by edges, about 250 bytes of JSON per node."""
+    return {
+        "nodes": [
+            {
+                "id": f"node-{i}",
+                "type": "text",
+                "data": {"text": f"Node {i}: " + "lorem ipsum dolor sit amet " * 4},
+                "x": i % 100 * 250,
+                "y": i // 100 * 150,
+            }
+            for i in range(nodes)
+        ],
+        "edges": [{"id": f"edge-{i}", "source": f"node-{i}", "target": f"node-{i + 1}"} for i in range(nodes - 1)],
+    }
+
+
+async def calibrate_transport(script_path: str, model: str, nodes: int, repeats: int) -> None:
+    """
+    Log median wall time, and time until clay exited, of spawned clay runs on a synthetic
+    canvas over every state transport. Transports take turns, after one untimed warm-up run each,
+    so drift in machine load spreads over all of them.
+    """
+    # The stub sleeps per case by default, which would drown out the transport
+    os.environ.setdefault("STUB_CLAY_DELAY", "0")
+    canvas = synthetic_canvas(nodes)
+    case = Case(id=0, hash="", instruction="Add a node", initial_state=canvas)
+    run = BenchmarkRun(
+        script_path=script_path,
+        clay_commit_sha="",
+        clay_commit_message="",
+        model=model,
+        timestamp=datetime.now(),
+        benchmark_commit_sha="",
+    )
+    logger.info(f"Canvas of {nodes} nodes, {len(orjson.dumps(canvas)) / 1e6:.1f} MB of JSON, {repeats} runs per transport")
+
+    async def measure(transport: str) -> tuple[float, float]:
+        timings = MeasurementTimings()
+        start = time.perf_counter()
+        final_state, _ = await run_clay_async(case, replace(run, clay_transport=transport), timings)
+        wall = time.perf_counter() - start
+        if final_state is None:
+            raise RuntimeError(f"Clay returned no final state over the {transport} transport")
+        return wall, timings.exit or 0.0
+
+    for transport in TRANSPORTS:
+        await measure(transport)
+    results: dict[str, list[tuple[float, float]]] = {transport: [] for transport in TRANSPORTS}
+    for _ in range(repeats):
+        for transport in TRANSPORTS:
+            results[transport].append(await measure(transport))
+
+    baseline = np.median([wall for wall, _ in results[TRANSPORTS[0]]])
+    for transport, timed in results.items():
+        wall = np.median([wall for wall, _ in timed])
+        exited = np.median([exited for _, exited in timed])
+        logger.info(
+            f"{transport}: median {wall * 1000:.1f} ms per run ({wall / baseline:.2f}x {TRANSPORTS[0]}), "
+            f"{exited * 1000:.1f} ms until clay exited"
+        )
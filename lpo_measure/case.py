@@ -1,13 +1,15 @@
 import hashlib
 import logging
 import sqlite3
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from datetime import datetime
-from typing import Any
+from typing import Any, Iterable, Iterator
 
 import orjson
 
-from .db import SQLITE_PATH
+from . import blobs
+from .db import get_connection
+from .timing import MeasurementTimings
 
 logger = logging.getLogger(__name__)
 
@@ -21,6 +23,21 @@ class Case:
     instruction: str
     initial_state: dict[str, Any]
 
+    @staticmethod
+    def compute_hash(instruction: str, initial_state: dict[str, Any]) -> str:
+        """Hash identifying a case by its instruction and initial state."""
+        to_hash = instruction.encode() + orjson.dumps(initial_state, option=orjson.OPT_SORT_KEYS)
+        return hashlib.sha256(to_hash).hexdigest()[:16]
+
+    @staticmethod
+    def hash_in_shard(case_hash: str, shard_index: int, shard_count: int) -> bool:
+        """Whether a case hash belongs to shard shard_index (1-based) of shard_count."""
+        return int(case_hash, 16) % shard_count == shard_index - 1
+
+    def in_shard(self, shard_index: int, shard_count: int) -> bool:
+        """Whether the case belongs to shard shard_index (1-based) of shard_count, decided by its hash."""
+        return self.hash_in_shard(self.hash, shard_index, shard_count)
+
     @classmethod
     def get_or_create(cls, instruction: str, initial_state: dict[str, Any] | None = None) -> "Case":
         """
@@ -30,10 +47,9 @@ class Case:
         if initial_state is None:
             initial_state = {"nodes": [], "edges": []}
 
-        to_hash = instruction.encode() + orjson.dumps(initial_state, option=orjson.OPT_SORT_KEYS)
-        instruction_hash = hashlib.sha256(to_hash).hexdigest()[:16]
+        instruction_hash = cls.compute_hash(instruction, initial_state)
 
-        with sqlite3.connect(SQLITE_PATH) as conn:
+        with get_connection() as conn:
             cursor = conn.cursor()
 
             # Try to find existing case
@@ -68,10 +84,56 @@ class Case:
                 initial_state=initial_state,
             )
 
+    @classmethod
+    def bulk_create(
+        cls,
+        entries: Iterable[tuple[str, dict[str, Any] | None]],
+        batch_size: int = 10_000,
+    ) -> tuple[int, int]:
+        """
+        Create cases for a stream of (instruction, initial_state) pairs in a single transaction.
+        Entries are hashed and checked against existing cases one batch at a time,
+        so the stream can be larger than memory. Returns (created, already existing).
+        """
+        created = 0
+        existing = 0
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            batch: dict[str, tuple[str, str, str]] = {}
+
+            def flush() -> None:
+                nonlocal created, existing
+                hashes = list(batch)
+                placeholders = ",".join("?" * len(hashes))
+                cursor.execute(f"SELECT hash FROM cases WHERE hash IN ({placeholders})", hashes)
+                for (case_hash,) in cursor.fetchall():
+                    del batch[case_hash]
+                existing += len(hashes) - len(batch)
+                cursor.executemany(
+                    "INSERT INTO cases (hash, instruction, initial_state) VALUES (?, ?, ?)",
+                    batch.values(),
+                )
+                created += len(batch)
+                batch.clear()
+
+            for instruction, initial_state in entries:
+                if initial_state is None:
+                    initial_state = {"nodes": [], "edges": []}
+                case_hash = cls.compute_hash(instruction, initial_state)
+                if case_hash in batch:
+                    existing += 1
+                    continue
+                batch[case_hash] = (case_hash, instruction, orjson.dumps(initial_state).decode())
+                if len(batch) >= batch_size:
+                    flush()
+            if batch:
+                flush()
+        return created, existing
+
     @classmethod
     def load_from_db(cls, case_id: int) -> "Case":
         """Load a case from the database by its ID."""
-        with sqlite3.connect(SQLITE_PATH) as conn:
+        with get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("SELECT id, hash, instruction, initial_state FROM cases WHERE id = ?", (case_id,))
             row = cursor.fetchone()
@@ -84,10 +146,20 @@ class Case:
                 )
             raise ValueError(f"Case with id {case_id} not found")
 
+    @staticmethod
+    def iter_ids(shard_index: int | None = None, shard_count: int | None = None) -> Iterator[int]:
+        """
+        Stream the ids of all cases, or of one shard's cases, from a cursor,
+        without loading or decoding their initial states.
+        """
+        for case_id, case_hash in get_connection().execute("SELECT id, hash FROM cases ORDER BY id"):
+            if shard_index is None or shard_count is None or Case.hash_in_shard(case_hash, shard_index, shard_count):
+                yield case_id
+
     @classmethod
     def load_all_from_db(cls) -> list["Case"]:
         """Load all cases from the database."""
-        with sqlite3.connect(SQLITE_PATH) as conn:
+        with get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("SELECT id, hash, instruction, initial_state FROM cases")
             cases = []
@@ -109,6 +181,16 @@ class CaseResult:
 
     score: int
     reason: str
+    cached: bool = False
+    # The judge could not produce a verdict, the score is not a real 0
+    judge_error: bool = False
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cost: float = 0.0
+    # How sure the cheap tier of a cascade judge was of its score, from 0 to 1
+    confidence: float | None = None
+    # Judge tier whose verdict counts: cheap or strong, rules when a structural rule decided, None without a final state
+    judge_tier: str | None = None
 
 
 @dataclass
@@ -121,6 +203,8 @@ class CaseMeasurement:
     clay_runtime: float
     judge_runtime: float
     date_measured: str
+    timings: MeasurementTimings = field(default_factory=MeasurementTimings)
+    trial: int = 0
 
     @classmethod
     def create(
@@ -130,6 +214,8 @@ class CaseMeasurement:
         result: CaseResult,
         clay_runtime: float,
         judge_runtime: float,
+        timings: MeasurementTimings | None = None,
+        trial: int = 0,
     ) -> "CaseMeasurement":
         """Create a new case result with current timestamp."""
         return cls(
@@ -139,25 +225,74 @@ class CaseMeasurement:
             clay_runtime=clay_runtime,
             judge_runtime=judge_runtime,
             date_measured=datetime.now().isoformat(),
+            timings=timings or MeasurementTimings(),
+            trial=trial,
+        )
+
+    @property
+    def status(self) -> str:
+        """
+        ok, clay_timeout when clay was killed for running too long, clay_error when it produced
+        no final state, or judge_error when no verdict was reached.
+        """
+        if self.timings.timed_out:
+            return "clay_timeout"
+        if self.final_state is None:
+            return "clay_error"
+        if self.result.judge_error:
+            return "judge_error"
+        return "ok"
+
+    def insert(self, cursor: sqlite3.Cursor, run_id: int) -> None:
+        """Insert the measurement using an open cursor, leaving the commit to the caller."""
+        blob_id = blobs.store(cursor, self.final_state) if self.final_state is not None else None
+        cursor.execute(
+            """
+            INSERT INTO measurements (
+                run_id, case_id, final_state, final_state_blob_id, score, reason, clay_runtime_seconds, judge_runtime_seconds,
+                judge_prompt_tokens, judge_completion_tokens, judge_cost, status, trial, judge_tier
+            )
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            (
+                run_id,
+                self.case.id,
+                "" if blob_id is not None else "{}",
+                blob_id,
+                self.result.score,
+                self.result.reason,
+                self.clay_runtime,
+                self.judge_runtime,
+                self.result.prompt_tokens,
+                self.result.completion_tokens,
+                self.result.cost,
+                self.status,
+                self.trial,
+                self.result.judge_tier,
+            ),
+        )
+        cursor.execute(
+            """
+            INSERT INTO measurement_timings (
+                measurement_id, spawn_seconds, first_output_seconds, exit_seconds, output_parse_seconds,
+                judge_request_seconds, judge_parse_seconds, exit_code, stderr_tail
+            )
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            (
+                cursor.lastrowid,
+                self.timings.spawn,
+                self.timings.first_output,
+                self.timings.exit,
+                self.timings.output_parse,
+                self.timings.judge_request,
+                self.timings.judge_parse,
+                self.timings.exit_code,
+                self.timings.stderr_tail,
+            ),
         )
 
     def save_to_db(self, run_id: int):
         """Save case measurement to the database."""
-        with sqlite3.connect(SQLITE_PATH) as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                """
-                INSERT INTO measurements (run_id, case_id, final_state, score, reason, clay_runtime_seconds, judge_runtime_seconds)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-                """,
-                (
-                    run_id,
-                    self.case.id,
-                    orjson.dumps(self.final_state).decode() if self.final_state else "{}",
-                    self.result.score,
-                    self.result.reason,
-                    self.clay_runtime,
-                    self.judge_runtime,
-                ),
-            )
-            conn.commit()
+        with get_connection() as conn:
+            self.insert(conn.cursor(), run_id)
@@ -1,60 +1,225 @@
+import asyncio
 import logging
+import os
+import signal
 import subprocess
-import tempfile
+import sys
 import time
+from typing import Any, Awaitable, Callable, TypeVar
 
 import orjson
 
 from .case import Case, CaseMeasurement
 from .judge import judge_instruction_achieved
 from .run import BenchmarkRun
+from .timing import MeasurementTimings, span
+from .transport import open_exchange
 
 logger = logging.getLogger(__name__)
 
+# Time clay gets to exit after SIGTERM before its process group is killed
+TERMINATE_GRACE_SECONDS = 5.0
 
-def run_case(case: Case, run: BenchmarkRun) -> CaseMeasurement:
-    """Run instruction on canvas and return a CaseResult with the measurement."""
+T = TypeVar("T")
+
+
+class ClayTimeoutError(Exception):
+    """Clay exceeded its wall-clock or idle-output timeout."""
+
+
+def clay_interpreter(script_path: str) -> list[str]:
+    """Interpreter for a clay script: node for the real clay-cli.js, python for the stub runner."""
+    if script_path.endswith(".py"):
+        return [sys.executable]
+    return ["node"]
+
+
+def clay_prompt(case: Case) -> str:
+    """The prompt as clay receives it, identical for every runner."""
+    return f"'{case.instruction}'"
+
+
+def _clay_cmd(case: Case, run: BenchmarkRun, state_path: str, output_path: str) -> list[str]:
+    """Build the clay CLI invocation for a case."""
+    return [
+        *clay_interpreter(run.script_path),
+        f"{run.script_path}",
+        "--state",
+        state_path,
+        "--prompt",
+        clay_prompt(case),
+        "--output",
+        output_path,
+        "--model-name",
+        run.model,
+    ]
+
+
+def run_clay(
+    case: Case, run: BenchmarkRun, timings: MeasurementTimings | None = None
+) -> tuple[dict[str, Any] | None, float]:
+    """Run instruction on canvas with the clay CLI and return the final state and runtime."""
+    return asyncio.run(run_clay_async(case, run, timings))
+
+
+def _signal_group(proc: asyncio.subprocess.Process, sig: signal.Signals) -> None:
+    try:
+        os.killpg(proc.pid, sig)
+    except ProcessLookupError:
+        pass
+
+
+async def terminate_process_group(proc: asyncio.subprocess.Process) -> None:
+    """
+    Stop a clay process started in its own session along with everything it spawned:
+    SIGTERM the process group, then SIGKILL whatever is left after the grace period.
+    """
+    _signal_group(proc, signal.SIGTERM)
+    try:
+        await asyncio.wait_for(proc.wait(), TERMINATE_GRACE_SECONDS)
+    except TimeoutError:
+        pass
+    # Children can outlive the group leader, so the group is killed either way
+    _signal_group(proc, signal.SIGKILL)
+    await proc.wait()
+
+
+async def wait_with_timeouts(
+    done: Awaitable[T],
+    last_output: Callable[[], float],
+    timeout: float | None,
+    idle_timeout: float | None,
+) -> T:
+    """
+    Await done, raising ClayTimeoutError once timeout seconds have passed overall,
+    or idle_timeout seconds since the monotonic time last_output() returns.
+    The caller is responsible for stopping whatever done is waiting on.
+    """
+    future = asyncio.ensure_future(done)
+    start_time = time.monotonic()
+    try:
+        while True:
+            deadlines = []
+            if timeout is not None:
+                deadlines.append(start_time + timeout)
+            if idle_timeout is not None:
+                deadlines.append(last_output() + idle_timeout)
+            wait = max(0.0, min(deadlines) - time.monotonic()) if deadlines else None
+            finished, _ = await asyncio.wait({future}, timeout=wait)
+            if finished:
+                return future.result()
+            now = time.monotonic()
+            if timeout is not None and now - start_time >= timeout:
+                raise ClayTimeoutError(f"no result after {timeout:g}s")
+            if idle_timeout is not None and now - last_output() >= idle_timeout:
+                raise ClayTimeoutError(f"no output for {idle_timeout:g}s")
+    finally:
+        if not future.done():
+            future.cancel()
+            await asyncio.wait({future})
+        # Retrieve the outcome so a cancelled gather is not reported as an unhandled error
+        if not future.cancelled():
+            future.exception()
+
+
+async def _read_stream(stream: asyncio.StreamReader, chunks: list[bytes], on_output: Callable[[], None]) -> None:
+    while chunk := await stream.read(1 << 16):
+        on_output()
+        chunks.append(chunk)
+
+
+async def run_clay_async(
+    case: Case, run: BenchmarkRun, timings: MeasurementTimings | None = None
+) -> tuple[dict[str, Any] | None, float]:
+    """
+    Async variant of run_clay, awaiting the clay CLI instead of blocking on it.
+    Per-phase durations, exit code and stderr tail are recorded into timings.
+    Clay runs in its own process group, which is terminated when the run's clay_timeout or
+    clay_idle_timeout elapses, and when the caller is cancelled.
+    """
+    if timings is None:
+        timings = MeasurementTimings()
     # Start with clear state
     final_state = None
     clay_runtime = 0.0
-    with (
-        tempfile.NamedTemporaryFile(mode="w", suffix=".json") as state_file,
-        tempfile.NamedTemporaryFile(mode="r", suffix=".json") as output_file,
-    ):
-        cmd = [
-            "node",
-            f"{run.script_path}",
-            "--state",
-            state_file.name,
-            "--prompt",
-            f"'{case.instruction}'",
-            "--output",
-            output_file.name,
-            "--model-name",
-            run.model,
-        ]
+    # States stay bytes from the database to clay and back, the run picks how they travel
+    with open_exchange(run.clay_transport, orjson.dumps(case.initial_state)) as exchange:
+        cmd = _clay_cmd(case, run, exchange.state_path, exchange.output_path)
+        start_time = time.monotonic()
         try:
-            state_file.write(orjson.dumps(case.initial_state).decode())
-            state_file.flush()
-
-            start_time = time.time()
-            result = subprocess.run(
-                cmd,
-                capture_output=True,
-                text=True,
-            )
-            result.check_returncode()
-            clay_runtime = time.time() - start_time
-
-            output = output_file.read()
-            if output:
-                final_state = orjson.loads(output)
+            with span(timings, "spawn"):
+                proc = await asyncio.create_subprocess_exec(
+                    *cmd,
+                    stdin=exchange.stdin,
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.PIPE,
+                    pass_fds=exchange.pass_fds,
+                    start_new_session=True,
+                )
+            exchange.spawned()
+            spawned_time = time.monotonic()
+            last_output = spawned_time
+
+            def on_output() -> None:
+                nonlocal last_output
+                last_output = time.monotonic()
+                if timings.first_output is None:
+                    timings.first_output = last_output - spawned_time
+
+            assert proc.stdout is not None and proc.stderr is not None
+            stdout: list[bytes] = []
+            stderr: list[bytes] = []
+            try:
+                await wait_with_timeouts(
+                    asyncio.gather(
+                        _read_stream(proc.stdout, stdout, on_output),
+                        _read_stream(proc.stderr, stderr, on_output),
+                        exchange.transfer(proc),
+                        proc.wait(),
+                    ),
+                    lambda: last_output,
+                    run.clay_timeout,
+                    run.clay_idle_timeout,
+                )
+            except BaseException as e:
+                # Timed out or cancelled, clay must not outlive the case
+                await terminate_process_group(proc)
+                if isinstance(e, ClayTimeoutError):
+                    timings.timed_out = True
+                    timings.exit_code = proc.returncode
+                    timings.set_stderr(b"".join(stderr))
+                raise
+            timings.exit = time.monotonic() - spawned_time
+            timings.exit_code = proc.returncode
+            timings.set_stderr(b"".join(stderr))
+            clay_runtime = time.monotonic() - start_time
+            if proc.returncode != 0:
+                raise subprocess.CalledProcessError(proc.returncode or 1, cmd, b"".join(stdout), b"".join(stderr))
+
+            with span(timings, "output_parse"):
+                output = exchange.output()
+                if output:
+                    final_state = orjson.loads(output)
+        except ClayTimeoutError as e:
+            clay_runtime = time.monotonic() - start_time
+            logger.error(f'\nTimed out ({e}) calling "{" ".join(cmd)}"\n')
         except Exception:
+            # Failed runs still report how long they took
+            clay_runtime = time.monotonic() - start_time
             logger.error(f'\nError from calling "{" ".join(cmd)}"\n')
 
-    start_time = time.time()
-    judge_result = judge_instruction_achieved(case.instruction, final_state)
-    end_time = time.time()
-    judge_runtime = end_time - start_time
+    return final_state, clay_runtime
+
+
+def run_case(case: Case, run: BenchmarkRun) -> CaseMeasurement:
+    """Run instruction on canvas and return a CaseResult with the measurement."""
+    timings = MeasurementTimings()
+    final_state, clay_runtime = run_clay(case, run, timings)
+
+    start_time = time.monotonic()
+    judge_result = judge_instruction_achieved(
+        case.instruction, final_state, run.judge, timings=timings, initial_state=case.initial_state
+    )
+    judge_runtime = time.monotonic() - start_time
 
-    return CaseMeasurement.create(case, final_state, judge_result, clay_runtime, judge_runtime)
+    return CaseMeasurement.create(case, final_state, judge_result, clay_runtime, judge_runtime, timings)
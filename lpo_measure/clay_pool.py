@@ -0,0 +1,221 @@
+import asyncio
+import collections
+import logging
+import time
+from typing import Any
+
+import orjson
+
+from .case import Case
+from .clay import (
+    ClayTimeoutError,
+    clay_interpreter,
+    clay_prompt,
+    run_clay_async,
+    terminate_process_group,
+    wait_with_timeouts,
+)
+from .run import BenchmarkRun
+from .timing import MeasurementTimings, span
+
+logger = logging.getLogger(__name__)
+
+# Final states of large canvases arrive as a single JSON line
+STREAM_LIMIT_BYTES = 64 * 1024 * 1024
+STDERR_TAIL_LINES = 20
+SHUTDOWN_TIMEOUT_SECONDS = 5.0
+
+
+class _ClayProcess:
+    """One long-lived `clay-cli.js --serve` process."""
+
+    def __init__(self, proc: asyncio.subprocess.Process):
+        self.proc = proc
+        self.cases_run = 0
+        self.last_used = time.monotonic()
+        self.last_output = self.last_used
+        self.stderr_tail: collections.deque[str] = collections.deque(maxlen=STDERR_TAIL_LINES)
+        self._stderr_task = asyncio.create_task(self._drain_stderr())
+
+    @classmethod
+    async def start(cls, run: BenchmarkRun) -> "_ClayProcess":
+        proc = await asyncio.create_subprocess_exec(
+            *clay_interpreter(run.script_path),
+            run.script_path,
+            "--serve",
+            "--model-name",
+            run.model,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            limit=STREAM_LIMIT_BYTES,
+            start_new_session=True,
+        )
+        return cls(proc)
+
+    async def _drain_stderr(self) -> None:
+        # Keep reading so a chatty process never blocks on a full pipe
+        assert self.proc.stderr is not None
+        async for line in self.proc.stderr:
+            self.last_output = time.monotonic()
+            self.stderr_tail.append(line.decode(errors="replace").rstrip())
+
+    @property
+    def alive(self) -> bool:
+        return self.proc.returncode is None
+
+    async def request(self, request_id: int, case: Case) -> dict[str, Any]:
+        """Send one case and wait for its final state."""
+        assert self.proc.stdin is not None and self.proc.stdout is not None
+        request = {"id": request_id, "prompt": clay_prompt(case), "state": case.initial_state}
+        self.proc.stdin.write(orjson.dumps(request) + b"\n")
+        await self.proc.stdin.drain()
+
+        line = await self.proc.stdout.readline()
+        if not line:
+            raise ConnectionError("clay process exited without responding")
+        response = orjson.loads(line)
+        if response.get("id") != request_id:
+            raise ConnectionError(f"clay process answered request {response.get('id')}, expected {request_id}")
+        if "error" in response:
+            raise RuntimeError(response["error"])
+        return response["state"]
+
+    async def close(self) -> None:
+        if self.alive:
+            assert self.proc.stdin is not None
+            self.proc.stdin.close()
+            try:
+                await asyncio.wait_for(self.proc.wait(), SHUTDOWN_TIMEOUT_SECONDS)
+            except TimeoutError:
+                await terminate_process_group(self.proc)
+        self._stderr_task.cancel()
+
+    async def terminate(self) -> None:
+        """Stop the process and its children without waiting for it to finish the current case."""
+        await terminate_process_group(self.proc)
+        self._stderr_task.cancel()
+
+
+class ClayPool:
+    """
+    Pool of long-lived clay processes taking cases over a JSON-lines stdin/stdout protocol.
+    Processes are recycled after max_cases_per_process cases, after idling for idle_timeout
+    seconds, and when they crash. A process exceeding the run's clay timeouts on a case, where
+    stderr lines count as output, is terminated along with its children. If the script cannot serve, failing
+    or hanging before any process answers a case, every case falls back to spawning clay per invocation.
+    """
+
+    def __init__(
+        self,
+        run: BenchmarkRun,
+        size: int,
+        max_cases_per_process: int = 100,
+        idle_timeout: float = 300.0,
+    ):
+        self._run = run
+        self._semaphore = asyncio.Semaphore(size)
+        self._idle: list[_ClayProcess] = []
+        self._max_cases_per_process = max_cases_per_process
+        self._idle_timeout = idle_timeout
+        self._next_request_id = 0
+        self._served_any = False
+        self._supported = True
+
+    async def _acquire(self) -> _ClayProcess:
+        while self._idle:
+            process = self._idle.pop()
+            if process.alive and time.monotonic() - process.last_used < self._idle_timeout:
+                return process
+            await process.close()
+        return await _ClayProcess.start(self._run)
+
+    async def _release(self, process: _ClayProcess) -> None:
+        process.cases_run += 1
+        if process.cases_run >= self._max_cases_per_process:
+            await process.close()
+            return
+        process.last_used = time.monotonic()
+        self._idle.append(process)
+
+    async def _fall_back(
+        self, case: Case, timings: MeasurementTimings, reason: str
+    ) -> tuple[dict[str, Any] | None, float]:
+        """Run the case by spawning clay, as every later case will be: the script does not serve."""
+        if self._supported:
+            logger.warning(f"Clay script does not serve cases ({reason}), falling back to one process per case")
+            self._supported = False
+        timings.reset()
+        return await run_clay_async(case, self._run, timings)
+
+    async def run_clay(
+        self, case: Case, timings: MeasurementTimings | None = None
+    ) -> tuple[dict[str, Any] | None, float]:
+        """
+        Run instruction on canvas with a pooled clay process and return the final state and runtime.
+        A warm process has a near-zero spawn phase. The final state arrives as one line, so the round
+        trip of the request is the exit phase and there is no first_output phase.
+        Until a process has answered a case, failing to start, crashing or timing out means the
+        script cannot serve, and the case is run by spawning clay instead.
+        """
+        if timings is None:
+            timings = MeasurementTimings()
+        if not self._supported:
+            return await run_clay_async(case, self._run, timings)
+
+        async with self._semaphore:
+            start_time = time.monotonic()
+            try:
+                with span(timings, "spawn"):
+                    process = await self._acquire()
+            except OSError as e:
+                if not self._served_any:
+                    return await self._fall_back(case, timings, f"cannot start: {e}")
+                logger.error(f"Clay process failed to start for '{case.instruction}': {e}")
+                return None, time.monotonic() - start_time
+            self._next_request_id += 1
+            request_time = time.monotonic()
+            try:
+                with span(timings, "exit"):
+                    final_state = await wait_with_timeouts(
+                        process.request(self._next_request_id, case),
+                        lambda: max(request_time, process.last_output),
+                        self._run.clay_timeout,
+                        self._run.clay_idle_timeout,
+                    )
+            except ClayTimeoutError as e:
+                await process.terminate()
+                if not self._served_any:
+                    return await self._fall_back(case, timings, f"timed out: {e}")
+                timings.timed_out = True
+                timings.exit_code = process.proc.returncode
+                timings.stderr_tail = "\n".join(process.stderr_tail)
+                logger.error(f"Clay timed out ({e}) on '{case.instruction}'")
+                return None, time.monotonic() - start_time
+            except asyncio.CancelledError:
+                await process.terminate()
+                raise
+            except RuntimeError as e:
+                # Clay reported a failure for this case, the process itself is still healthy
+                logger.error(f"Clay failed on '{case.instruction}': {e}")
+                timings.stderr_tail = "\n".join(process.stderr_tail)
+                await self._release(process)
+                return None, time.monotonic() - start_time
+            except Exception as e:
+                await process.close()
+                stderr = "\n".join(process.stderr_tail)
+                if not self._served_any:
+                    return await self._fall_back(case, timings, f"{e}\n{stderr}")
+                timings.stderr_tail = stderr
+                timings.exit_code = process.proc.returncode
+                logger.error(f"Clay process crashed on '{case.instruction}': {e}\n{stderr}")
+                return None, time.monotonic() - start_time
+            clay_runtime = time.monotonic() - start_time
+            self._served_any = True
+            await self._release(process)
+            return final_state, clay_runtime
+
+    async def close(self) -> None:
+        """Shut down every idle process."""
+        while self._idle:
+            await self._idle.pop().close()
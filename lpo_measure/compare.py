@@ -0,0 +1,235 @@
+import logging
+import sqlite3
+import string
+from dataclasses import dataclass
+
+import numpy as np
+
+from .db import get_connection
+from .stats import benjamini_hochberg, t_test_p_value, welch_t_test
+
+logger = logging.getLogger(__name__)
+
+# False discovery rate below which a per-case score drop, or a p-value below which the overall drop, is a regression
+ALPHA = 0.05
+# Score drop, in points, that flags a case measured once on either side, where there is no variance to test against
+MAX_DROP = 2.0
+# Shortest reference taken for a clay commit SHA before a run id
+MIN_SHA_PREFIX = 7
+
+
+def resolve_runs(conn: sqlite3.Connection, ref: str) -> list[int]:
+    """
+    Run ids a reference stands for: every run of a clay commit SHA or SHA prefix, or a run id.
+    A reference of at least MIN_SHA_PREFIX hex digits is tried as a SHA first, even when all digits.
+    """
+    if len(ref) >= MIN_SHA_PREFIX and all(char in string.hexdigits for char in ref):
+        rows = conn.execute(
+            "SELECT id FROM runs WHERE clay_commit_sha LIKE ? || '%' AND COALESCE(status, 'complete') != 'failed' ORDER BY id",
+            (ref.lower(),),
+        ).fetchall()
+        if rows:
+            return [run_id for (run_id,) in rows]
+    if ref.isdigit() and conn.execute("SELECT 1 FROM runs WHERE id = ?", (int(ref),)).fetchone():
+        return [int(ref)]
+    raise ValueError(f"No run or clay commit matches {ref}")
+
+
+@dataclass
+class _CaseAggregates:
+    case_ids: np.ndarray
+    trials: np.ndarray
+    mean: np.ndarray
+    variance: np.ndarray
+    runtime: np.ndarray
+
+
+def _case_aggregates(conn: sqlite3.Connection, run_ids: list[int]) -> _CaseAggregates:
+    """Per-case trial count, score mean and variance and mean clay runtime over the given runs."""
+    placeholders = ",".join("?" * len(run_ids))
+    # A measurement reused by several of the runs counts once, by the id it was first taken as
+    rows = conn.execute(
+        f"""
+        SELECT case_id, COUNT(*), AVG(score), AVG(score * score), AVG(clay_runtime_seconds)
+        FROM (
+            SELECT DISTINCT COALESCE(reused_from, id) AS origin, case_id, score, clay_runtime_seconds
+            FROM measurements
+            WHERE run_id IN ({placeholders}) AND status != 'judge_error'
+        )
+        GROUP BY case_id
+        ORDER BY case_id
+        """,
+        run_ids,
+    ).fetchall()
+    data = np.array(rows, dtype=float).reshape(-1, 5)
+    trials = data[:, 1]
+    mean = data[:, 2]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        variance = np.where(trials > 1, np.maximum(data[:, 3] - mean**2, 0) * trials / (trials - 1), np.nan)
+    return _CaseAggregates(data[:, 0].astype(np.int64), trials, mean, variance, data[:, 4])
+
+
+def _judge_configs(conn: sqlite3.Connection, run_ids: list[int]) -> list[str | None]:
+    placeholders = ",".join("?" * len(run_ids))
+    rows = conn.execute(f"SELECT DISTINCT judge_config FROM runs WHERE id IN ({placeholders})", run_ids)
+    return sorted((config for (config,) in rows), key=lambda config: config or "")
+
+
+def _paired_p_value(deltas: np.ndarray) -> float:
+    """Two-sided p-value of a paired t-test that the mean of per-case deltas is zero."""
+    if len(deltas) < 2:
+        return float("nan")
+    std = deltas.std(ddof=1)
+    mean = deltas.mean()
+    t = mean / (std / np.sqrt(len(deltas))) if std > 0 else (0.0 if mean == 0 else np.inf)
+    return float(t_test_p_value(np.array(t), np.array(len(deltas) - 1.0)))
+
+
+@dataclass
+class Comparison:
+    """Per-case differences between a base and a head, over the cases both measured."""
+
+    base_runs: list[int]
+    head_runs: list[int]
+    case_ids: np.ndarray
+    base_score: np.ndarray
+    head_score: np.ndarray
+    base_runtime: np.ndarray
+    head_runtime: np.ndarray
+    # Welch's t-test per case, NaN unless both sides have repeated trials
+    p_values: np.ndarray
+    q_values: np.ndarray
+    regressions: np.ndarray
+    # Cases without a t-test, which regressed if their score dropped by max_drop or more
+    untested: np.ndarray
+    max_drop: float
+    score_p_value: float
+    runtime_p_value: float
+    base_only: int
+    head_only: int
+    alpha: float
+    # Distinct runs.judge_config of each side, verdicts of different judges are not comparable
+    base_judge_configs: list[str | None]
+    head_judge_configs: list[str | None]
+
+    @property
+    def score_delta(self) -> np.ndarray:
+        return self.head_score - self.base_score
+
+    @property
+    def runtime_delta(self) -> np.ndarray:
+        return self.head_runtime - self.base_runtime
+
+    @property
+    def score_regressed(self) -> bool:
+        """Whether the score over all common cases dropped significantly."""
+        return bool(self.score_delta.mean() < 0 and self.score_p_value < self.alpha) if len(self.case_ids) else False
+
+    @property
+    def regressed(self) -> bool:
+        return self.score_regressed or bool(self.regressions.any())
+
+
+def compare_runs(base: str, head: str, alpha: float = ALPHA, max_drop: float = MAX_DROP) -> Comparison:
+    """
+    Compare the measurements of head with those of base, each a run id or clay commit SHA.
+    A case regressed when its score dropped with a false discovery rate below alpha, or, measured
+    only once on a side, when it dropped by max_drop points or more.
+    """
+    with get_connection() as conn:
+        base_runs = resolve_runs(conn, base)
+        head_runs = resolve_runs(conn, head)
+        a = _case_aggregates(conn, base_runs)
+        b = _case_aggregates(conn, head_runs)
+        base_judge_configs = _judge_configs(conn, base_runs)
+        head_judge_configs = _judge_configs(conn, head_runs)
+    common, a_index, b_index = np.intersect1d(a.case_ids, b.case_ids, assume_unique=True, return_indices=True)
+
+    p_values = welch_t_test(
+        a.mean[a_index], a.variance[a_index], a.trials[a_index], b.mean[b_index], b.variance[b_index], b.trials[b_index]
+    )
+    q_values = benjamini_hochberg(p_values)
+    score_delta = b.mean[b_index] - a.mean[a_index]
+    runtime_delta = b.runtime[b_index] - a.runtime[a_index]
+    untested = np.isnan(p_values)
+    return Comparison(
+        base_runs=base_runs,
+        head_runs=head_runs,
+        case_ids=common,
+        base_score=a.mean[a_index],
+        head_score=b.mean[b_index],
+        base_runtime=a.runtime[a_index],
+        head_runtime=b.runtime[b_index],
+        p_values=p_values,
+        q_values=q_values,
+        untested=untested,
+        max_drop=max_drop,
+        regressions=(score_delta < 0) & np.where(untested, score_delta <= -max_drop, q_values < alpha),
+        score_p_value=_paired_p_value(score_delta),
+        runtime_p_value=_paired_p_value(runtime_delta),
+        base_only=len(a.case_ids) - len(common),
+        head_only=len(b.case_ids) - len(common),
+        alpha=alpha,
+        base_judge_configs=base_judge_configs,
+        head_judge_configs=head_judge_configs,
+    )
+
+
+def _format_p(p: float) -> str:
+    return "n/a" if np.isnan(p) else f"{p:.3g}"
+
+
+def log_comparison(comparison: Comparison, limit: int = 20) -> None:
+    """Log the overall and per-case differences, regressions first, then the largest other changes."""
+    c = comparison
+    logger.info(
+        f"Comparing runs {c.base_runs} with {c.head_runs}: {len(c.case_ids)} common cases, "
+        f"{c.base_only} only in base, {c.head_only} only in head"
+    )
+    if c.base_judge_configs != c.head_judge_configs:
+        logger.warning(
+            f"Base and head were judged differently, score changes may come from the judge: "
+            f"{c.base_judge_configs} vs {c.head_judge_configs}"
+        )
+    if not len(c.case_ids):
+        return
+    logger.info(
+        f"Score {c.base_score.mean():.3f} -> {c.head_score.mean():.3f} "
+        f"(delta {c.score_delta.mean():+.3f}, p={_format_p(c.score_p_value)}), "
+        f"clay runtime {c.base_runtime.mean():.2f}s -> {c.head_runtime.mean():.2f}s "
+        f"(delta {c.runtime_delta.mean():+.2f}s, p={_format_p(c.runtime_p_value)})"
+    )
+
+    with get_connection() as conn:
+        placeholders = ",".join("?" * len(c.case_ids))
+        instructions = dict(
+            conn.execute(f"SELECT id, instruction FROM cases WHERE id IN ({placeholders})", c.case_ids.tolist())
+        )
+
+    def log_case(i: int) -> None:
+        logger.info(
+            f"  case {c.case_ids[i]} '{instructions.get(int(c.case_ids[i]), '')}': "
+            f"score {c.base_score[i]:.2f} -> {c.head_score[i]:.2f} ({c.score_delta[i]:+.2f}, "
+            f"p={_format_p(c.p_values[i])}, q={_format_p(c.q_values[i])}), "
+            f"runtime {c.base_runtime[i]:.2f}s -> {c.head_runtime[i]:.2f}s ({c.runtime_delta[i]:+.2f}s)"
+        )
+
+    if c.untested.any():
+        logger.warning(
+            f"{int(c.untested.sum())} cases have a single trial on a side and cannot be t-tested, "
+            f"they regressed if their score dropped by {c.max_drop:g} points or more; use --trials to test them"
+        )
+    regressions = np.flatnonzero(c.regressions)
+    if len(regressions):
+        logger.warning(f"{len(regressions)} cases regressed (q < {c.alpha}, or a drop of {c.max_drop:g}+ untested):")
+        for i in regressions[np.argsort(c.score_delta[regressions])]:
+            log_case(i)
+
+    changed = np.flatnonzero((c.score_delta != 0) & ~c.regressions)
+    if len(changed):
+        logger.info(f"Largest other score changes, of {len(changed)}:")
+        for i in changed[np.argsort(-np.abs(c.score_delta[changed]), kind="stable")][:limit]:
+            log_case(i)
+
+    if c.score_regressed:
+        logger.warning(f"Overall score regressed (p < {c.alpha})")
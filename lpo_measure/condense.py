@@ -0,0 +1,88 @@
+from dataclasses import dataclass
+from typing import Any
+
+import orjson
+
+
+@dataclass(frozen=True)
+class CondenseProfile:
+    """How a canvas state is condensed before it is shown to the judge."""
+
+    name: str
+    # Node fields that only matter for rendering the canvas
+    drop_node_fields: frozenset[str] = frozenset()
+    drop_edge_fields: frozenset[str] = frozenset()
+    # Decimal places kept for positions and sizes, None keeps them as they are
+    round_digits: int | None = None
+    # Edges as {source: [target, ...]} instead of a list of edge objects
+    adjacency: bool = False
+    indent: bool = True
+
+
+PROFILES = {
+    profile.name: profile
+    for profile in (
+        CondenseProfile("full"),
+        CondenseProfile(
+            "compact",
+            drop_node_fields=frozenset(
+                {"deletable", "width", "height", "selected", "dragging", "measured", "positionAbsolute", "zIndex"}
+            ),
+            drop_edge_fields=frozenset({"id", "selected", "animated", "style"}),
+            round_digits=0,
+            adjacency=True,
+            indent=False,
+        ),
+    )
+}
+# The full profile is the state exactly as clay wrote it
+DEFAULT_PROFILE = "full"
+
+
+def _round(value: Any, digits: int) -> Any:
+    if isinstance(value, float):
+        rounded = round(value, digits)
+        return int(rounded) if digits == 0 else rounded
+    if isinstance(value, dict):
+        return {k: _round(v, digits) for k, v in value.items()}
+    return value
+
+
+def _key(value: Any) -> str:
+    # Object keys must be strings, an edge with a missing or numeric source is keyed on its JSON instead
+    return value if isinstance(value, str) else orjson.dumps(value).decode()
+
+
+def condense(state: dict[str, Any], profile: CondenseProfile) -> dict[str, Any]:
+    """Return a condensed copy of a canvas state; the input is left untouched."""
+    if profile == PROFILES["full"]:
+        return state
+
+    nodes = []
+    for node in state.get("nodes", []):
+        node = {k: v for k, v in node.items() if k not in profile.drop_node_fields}
+        if profile.round_digits is not None:
+            for field in ("position", "width", "height"):
+                if field in node:
+                    node[field] = _round(node[field], profile.round_digits)
+        nodes.append(node)
+
+    edges: Any = [
+        {k: v for k, v in edge.items() if k not in profile.drop_edge_fields} for edge in state.get("edges", [])
+    ]
+    if profile.adjacency:
+        adjacency: dict[str, list[Any]] = {}
+        for edge in edges:
+            target = edge.get("target")
+            rest = {k: v for k, v in edge.items() if k not in ("source", "target") and v is not None}
+            # A plain target id unless the edge carries more, e.g. which handles it connects
+            adjacency.setdefault(_key(edge.get("source")), []).append({"target": target, **rest} if rest else target)
+        edges = adjacency
+
+    return {**state, "nodes": nodes, "edges": edges}
+
+
+def serialize(state: dict[str, Any], profile: CondenseProfile) -> str:
+    """Condense and serialize a canvas state for a judge prompt."""
+    option = orjson.OPT_INDENT_2 if profile.indent else 0
+    return orjson.dumps(condense(state, profile), option=option).decode()
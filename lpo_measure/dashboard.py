@@ -0,0 +1,95 @@
+import logging
+import shutil
+from itertools import groupby
+from pathlib import Path
+from typing import Any, Iterable
+
+import orjson
+
+from .db import get_connection
+from .summaries import summarize_runs
+
+logger = logging.getLogger(__name__)
+
+_PAGE = Path(__file__).with_name("dashboard.html")
+
+RUN_COLUMNS = [
+    "id",
+    "timestamp",
+    "clay_commit_sha",
+    "clay_commit_message",
+    "status",
+    "trials",
+    "judge_config",
+    "cases",
+    "score_mean",
+    "score_ci_low",
+    "score_ci_high",
+    "clay_runtime_total",
+    "clay_runtime_p50",
+    "clay_runtime_p90",
+    "clay_errors",
+    "clay_timeouts",
+    "judge_errors",
+]
+MEASUREMENT_COLUMNS = ["run_id", "trial", "score", "status", "clay_runtime_seconds", "reason"]
+
+
+def _columns(names: list[str], rows: Iterable[tuple]) -> dict[str, list[Any]]:
+    """One list per column rather than one object per row, so the page parses arrays and no repeated keys."""
+    columns: dict[str, list[Any]] = {name: [] for name in names}
+    for row in rows:
+        for name, value in zip(names, row):
+            columns[name].append(value)
+    return columns
+
+
+def _write(path: Path, data: Any) -> int:
+    encoded = orjson.dumps(data)
+    path.write_bytes(encoded)
+    return len(encoded)
+
+
+def export_dashboard(out_dir: Path) -> None:
+    """
+    Write a static dashboard to out_dir: index.html, a run index built from the run summaries,
+    a case index, and one columnar time series per case under cases/, which the page
+    fetches only when that case is selected.
+    """
+    summarize_runs()
+    case_dir = out_dir / "cases"
+    case_dir.mkdir(parents=True, exist_ok=True)
+    # Cases no longer measured must not linger from an earlier export
+    for path in case_dir.glob("*.json"):
+        path.unlink()
+
+    with get_connection() as conn:
+        runs = conn.execute(
+            f"""
+            SELECT r.id, r.timestamp, r.clay_commit_sha, r.clay_commit_message, r.status, r.trials, r.judge_config,
+                {", ".join(f"s.{column}" for column in RUN_COLUMNS[7:])}
+            FROM runs r JOIN run_summaries s ON s.run_id = r.id
+            ORDER BY r.timestamp, r.id
+            """
+        ).fetchall()
+        size = _write(out_dir / "runs.json", _columns(RUN_COLUMNS, runs))
+
+        # A single pass over the measurements of summarized runs, without their final states
+        rows = conn.execute(
+            """
+            SELECT case_id, run_id, trial, score, status, clay_runtime_seconds, reason
+            FROM measurements
+            WHERE status != 'judge_error' AND run_id IN (SELECT run_id FROM run_summaries)
+            ORDER BY case_id, run_id, trial
+            """
+        )
+        measured: set[int] = set()
+        for case_id, case_rows in groupby(rows, key=lambda row: row[0]):
+            size += _write(case_dir / f"{case_id}.json", _columns(MEASUREMENT_COLUMNS, (row[1:] for row in case_rows)))
+            measured.add(case_id)
+
+        cases = [row for row in conn.execute("SELECT id, instruction FROM cases ORDER BY id") if row[0] in measured]
+        size += _write(out_dir / "cases.json", _columns(["id", "instruction"], cases))
+
+    shutil.copyfile(_PAGE, out_dir / "index.html")
+    logger.info(f"Exported {len(runs)} runs and {len(cases)} cases ({size / 1024:.0f} KiB of data) to {out_dir}")
@@ -1,6 +1,13 @@
+import atexit
 import os
 import sqlite3
+import time
 from pathlib import Path
+from typing import Callable, Generic, TypeVar
+
+import orjson
+
+from . import blobs
 
 # repo root
 _PROD_SQLITE_PATH = Path(__file__).parent.parent / "prod-measurements.db"
@@ -8,6 +15,10 @@ _DEV_SQLITE_PATH = Path(__file__).parent.parent / "dev-measurements.db"
 
 
 def get_db_path() -> Path:
+    # Shard runners and local experiments point at a database file of their own
+    db_path = os.environ.get("LPO_MEASURE_DB")
+    if db_path:
+        return Path(db_path)
     if os.environ.get("CI"):
         return _PROD_SQLITE_PATH
     return _DEV_SQLITE_PATH
@@ -15,11 +26,98 @@ def get_db_path() -> Path:
 
 SQLITE_PATH = get_db_path()
 
-SQLITE_PATH.parent.mkdir(parents=True, exist_ok=True)
+# How long a connection waits on a lock held by another process before raising "database is locked"
+BUSY_TIMEOUT_SECONDS = 30.0
+
+_connection: sqlite3.Connection | None = None
+_connection_pid: int | None = None
+
+
+def get_connection() -> sqlite3.Connection:
+    """
+    Long-lived connection for the current process, in WAL mode with a busy timeout.
+    Statements are prepared once per connection and reused from sqlite3's statement cache.
+    A forked process opens its own connection instead of sharing the parent's.
+    """
+    global _connection, _connection_pid
+    if _connection is None or _connection_pid != os.getpid():
+        SQLITE_PATH.parent.mkdir(parents=True, exist_ok=True)
+        _connection = sqlite3.connect(SQLITE_PATH, timeout=BUSY_TIMEOUT_SECONDS)
+        # WAL lets readers proceed while one writer commits; NORMAL skips the fsync on every commit
+        _connection.execute("PRAGMA journal_mode=WAL")
+        _connection.execute("PRAGMA synchronous=NORMAL")
+        _connection_pid = os.getpid()
+    return _connection
+
+
+def close_connection() -> None:
+    """Checkpoint the WAL back into the database file and close this process's connection."""
+    global _connection, _connection_pid
+    if _connection is None or _connection_pid != os.getpid():
+        return
+    _connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    _connection.close()
+    _connection = None
+    _connection_pid = None
+
+
+atexit.register(close_connection)
+
+T = TypeVar("T")
+
+
+class BatchWriter(Generic[T]):
+    """
+    Single writer that groups inserts into one transaction per batch,
+    committing when the batch is full or has been pending for flush_interval seconds.
+    """
 
-with sqlite3.connect(SQLITE_PATH) as conn:
-    cursor = conn.cursor()
+    def __init__(
+        self,
+        write: Callable[[sqlite3.Cursor, T], None],
+        batch_size: int = 32,
+        flush_interval: float = 5.0,
+    ):
+        self._write = write
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._pending: list[T] = []
+        self._last_flush = time.monotonic()
 
+    def add(self, item: T) -> None:
+        self._pending.append(item)
+        if len(self._pending) >= self._batch_size or time.monotonic() - self._last_flush >= self._flush_interval:
+            self.flush()
+
+    def flush(self) -> None:
+        """Write every pending item in a single transaction."""
+        self._last_flush = time.monotonic()
+        if not self._pending:
+            return
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            for item in self._pending:
+                self._write(cursor, item)
+        self._pending.clear()
+
+    def __enter__(self) -> "BatchWriter[T]":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.flush()
+
+
+def _add_column_if_missing(cursor: sqlite3.Cursor, table: str, column: str, definition: str) -> bool:
+    """Add a column to a table created by an older version of this schema, returning whether it was added."""
+    cursor.execute(f"PRAGMA table_info({table})")
+    if column in {row[1] for row in cursor.fetchall()}:
+        return False
+    cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+    return True
+
+
+def _migrate_v1(cursor: sqlite3.Cursor) -> None:
+    """Create the schema, bringing databases from before schema versioning up to it."""
     # Cases table
     cursor.execute("""
     CREATE TABLE IF NOT EXISTS cases (
@@ -41,6 +139,28 @@ with sqlite3.connect(SQLITE_PATH) as conn:
         model TEXT NOT NULL
     )
     """)
+    # Content hash of the clay script, used to fingerprint measurements for incremental runs
+    _add_column_if_missing(cursor, "runs", "script_hash", "TEXT")
+    # Judge token usage and cost totals, filled in when the run finishes
+    _add_column_if_missing(cursor, "runs", "total_prompt_tokens", "INTEGER NOT NULL DEFAULT 0")
+    _add_column_if_missing(cursor, "runs", "total_completion_tokens", "INTEGER NOT NULL DEFAULT 0")
+    _add_column_if_missing(cursor, "runs", "total_cost", "REAL NOT NULL DEFAULT 0")
+    # running, then complete, partial or failed; NULL for runs recorded before it was tracked
+    _add_column_if_missing(cursor, "runs", "status", "TEXT")
+    # Slice of the cases a shard run measured, shard_index of shard_count, NULL for a full run
+    _add_column_if_missing(cursor, "runs", "shard_index", "INTEGER")
+    _add_column_if_missing(cursor, "runs", "shard_count", "INTEGER")
+    # Trials per case the run was started with
+    _add_column_if_missing(cursor, "runs", "trials", "INTEGER NOT NULL DEFAULT 1")
+
+    # Final canvas states, compressed and stored once per distinct content
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS state_blobs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        hash TEXT NOT NULL UNIQUE,
+        data BLOB NOT NULL
+    )
+    """)
 
     # Measurements table
     cursor.execute("""
@@ -57,5 +177,132 @@ with sqlite3.connect(SQLITE_PATH) as conn:
         FOREIGN KEY (case_id) REFERENCES cases (id)
     )
     """)
+    # Original measurement a row was copied from by an incremental run, NULL if it was executed
+    _add_column_if_missing(cursor, "measurements", "reused_from", "INTEGER REFERENCES measurements (id)")
+    # final_state holds '{}' for a missing state, and '' once the state lives in state_blobs
+    _add_column_if_missing(cursor, "measurements", "final_state_blob_id", "INTEGER REFERENCES state_blobs (id)")
+    # Judge usage as reported by litellm, zero for cached verdicts and reused measurements
+    _add_column_if_missing(cursor, "measurements", "judge_prompt_tokens", "INTEGER NOT NULL DEFAULT 0")
+    _add_column_if_missing(cursor, "measurements", "judge_completion_tokens", "INTEGER NOT NULL DEFAULT 0")
+    _add_column_if_missing(cursor, "measurements", "judge_cost", "REAL NOT NULL DEFAULT 0")
+    # ok, clay_error or judge_error, so infrastructure failures are not mistaken for score 0 verdicts
+    if _add_column_if_missing(cursor, "measurements", "status", "TEXT NOT NULL DEFAULT 'ok'"):
+        cursor.execute("UPDATE measurements SET status = 'judge_error' WHERE reason LIKE 'Error during evaluation:%'")
+        cursor.execute("UPDATE measurements SET status = 'clay_error' WHERE final_state = '{}'")
+    # Index of the repeated trial of a case within its run, 0 for the first
+    _add_column_if_missing(cursor, "measurements", "trial", "INTEGER NOT NULL DEFAULT 0")
+    # Runs and cases look up their measurements without scanning the whole table
+    cursor.execute("CREATE INDEX IF NOT EXISTS measurements_run_id ON measurements (run_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS measurements_case_id ON measurements (case_id)")
+
+    # Move inline final states written before state_blobs existed into blobs
+    cursor.execute(
+        "SELECT id, final_state FROM measurements WHERE final_state_blob_id IS NULL AND final_state NOT IN ('', '{}')"
+    )
+    legacy_states = cursor.fetchall()
+    for measurement_id, final_state in legacy_states:
+        blob_id = blobs.store(cursor, orjson.loads(final_state))
+        cursor.execute(
+            "UPDATE measurements SET final_state = '', final_state_blob_id = ? WHERE id = ?",
+            (blob_id, measurement_id),
+        )
+
+    # Per-phase durations of a measurement, to tell clay, model and harness time apart
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS measurement_timings (
+        measurement_id INTEGER PRIMARY KEY,
+        spawn_seconds REAL,
+        first_output_seconds REAL,
+        exit_seconds REAL,
+        output_parse_seconds REAL,
+        judge_request_seconds REAL,
+        judge_parse_seconds REAL,
+        exit_code INTEGER,
+        stderr_tail TEXT,
+        FOREIGN KEY (measurement_id) REFERENCES measurements (id)
+    )
+    """)
+
+    # Judge verdicts, content-addressed by instruction, final state, judge model and prompt
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS judge_cache (
+        key TEXT PRIMARY KEY,
+        judge_model TEXT NOT NULL,
+        prompt_hash TEXT NOT NULL,
+        score INTEGER NOT NULL,
+        reason TEXT NOT NULL,
+        created_at TEXT NOT NULL
+    )
+    """)
+
+    # Per-run aggregates, written when a run finishes, so dashboards need not read every measurement
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS run_summaries (
+        run_id INTEGER PRIMARY KEY,
+        cases INTEGER NOT NULL,
+        measurements INTEGER NOT NULL,
+        score_mean REAL,
+        score_ci_low REAL,
+        score_ci_high REAL,
+        trial_variance REAL,
+        score_0 INTEGER NOT NULL,
+        score_1 INTEGER NOT NULL,
+        score_2 INTEGER NOT NULL,
+        score_3 INTEGER NOT NULL,
+        clay_runtime_total REAL NOT NULL,
+        clay_runtime_p50 REAL,
+        clay_runtime_p90 REAL,
+        clay_runtime_p99 REAL,
+        clay_errors INTEGER NOT NULL,
+        clay_timeouts INTEGER NOT NULL,
+        judge_errors INTEGER NOT NULL,
+        updated_at TEXT NOT NULL,
+        FOREIGN KEY (run_id) REFERENCES runs (id)
+    )
+    """)
+
+
+def _migrate_v2(cursor: sqlite3.Cursor) -> None:
+    """Record which tier of a cascade judge decided, and cache the cheap tier's confidence."""
+    # cheap, strong or rules; NULL without a final state, or for measurements from before judge tiers
+    cursor.execute("ALTER TABLE measurements ADD COLUMN judge_tier TEXT")
+    cursor.execute("ALTER TABLE judge_cache ADD COLUMN confidence REAL")
+
+
+def _migrate_v3(cursor: sqlite3.Cursor) -> None:
+    """Record the judge settings of a run, see JudgeConfig.verdict_settings."""
+    # NULL for runs from before it was recorded, whose verdicts are then never reused
+    cursor.execute("ALTER TABLE runs ADD COLUMN judge_config TEXT")
+
+
+# Schema migrations in order; PRAGMA user_version holds how many a database has applied.
+# Append new migrations, never change one that may have been applied.
+MIGRATIONS: list[Callable[[sqlite3.Cursor], None]] = [_migrate_v1, _migrate_v2, _migrate_v3]
+
 
-    conn.commit()
+def migrate() -> int:
+    """
+    Apply the migrations the database has not applied yet, in one transaction,
+    and return how many ran. Up to date, it costs a single PRAGMA read.
+    """
+    conn = get_connection()
+    if conn.execute("PRAGMA user_version").fetchone()[0] == len(MIGRATIONS):
+        return 0
+    # Take the write lock before reading the version again, so concurrent runs migrate once
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        cursor = conn.cursor()
+        version = cursor.execute("PRAGMA user_version").fetchone()[0]
+        if version > len(MIGRATIONS):
+            raise RuntimeError(f"{SQLITE_PATH} has schema version {version}, newer than this code's {len(MIGRATIONS)}")
+        for number in range(version, len(MIGRATIONS)):
+            MIGRATIONS[number](cursor)
+            cursor.execute(f"PRAGMA user_version = {number + 1}")
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    # Reclaim the space freed by migrated data, so the committed database actually shrinks
+    if conn.execute("PRAGMA freelist_count").fetchone()[0]:
+        conn.execute("VACUUM")
+    return len(MIGRATIONS) - version
@@ -0,0 +1,64 @@
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+import orjson
+
+from .log import setup_logging
+
+logger = logging.getLogger(__name__)
+
+# What the CLI and the process pool workers import before doing anything
+ENTRY_POINTS = ("lpo_measure.__main__", "lpo_measure.worker")
+# Slow to import and needed by only some commands, so they are imported on first use
+DEFERRED_MODULES = ("litellm", "numpy", "pandas")
+IMPORT_BUDGET_SECONDS = 0.3
+REPEATS = 3
+
+_PROBE = """
+import sys, time
+import orjson
+start = time.perf_counter()
+import {module}
+print(orjson.dumps({{"seconds": time.perf_counter() - start, "loaded": [m for m in {deferred!r} if m in sys.modules]}}).decode())
+"""
+
+
+def check_imports() -> list[str]:
+    """
+    Import every entry point in fresh interpreters and return the problems found: a module
+    pulled in that should be deferred, a database touched at import, or the best of REPEATS
+    imports exceeding the budget.
+    """
+    problems = []
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "import-check.db"
+        env = {**os.environ, "LPO_MEASURE_DB": str(db_path)}
+        for module in ENTRY_POINTS:
+            probe = _PROBE.format(module=module, deferred=DEFERRED_MODULES)
+            results = [
+                orjson.loads(subprocess.run([sys.executable, "-c", probe], env=env, capture_output=True, check=True).stdout)
+                for _ in range(REPEATS)
+            ]
+            seconds = min(result["seconds"] for result in results)
+            logger.info(f"import {module}: {seconds * 1000:.0f} ms")
+            if results[0]["loaded"]:
+                problems.append(f"import {module} loads {', '.join(results[0]['loaded'])}, which should be deferred")
+            if seconds > IMPORT_BUDGET_SECONDS:
+                problems.append(f"import {module} takes {seconds * 1000:.0f} ms, over {IMPORT_BUDGET_SECONDS * 1000:.0f} ms")
+        if db_path.exists():
+            problems.append("Importing touched the database, schema changes belong in db.migrate")
+    return problems
+
+
+if __name__ == "__main__":
+    setup_logging()
+    problems = check_imports()
+    for problem in problems:
+        logger.error(problem)
+    if problems:
+        logger.error("Run python -X importtime -c 'import lpo_measure.__main__' to find the slow imports")
+        raise SystemExit(1)
@@ -1,35 +1,38 @@
 import logging
-from typing import Any
+from dataclasses import dataclass, replace
+from typing import Any, Generator
 
-import litellm
 import orjson
-from dotenv import load_dotenv
 
+from . import condense, judge_cache, judge_client, rules
 from .case import CaseResult
+from .run import JudgeConfig
+from .timing import MeasurementTimings, span
 
-litellm.set_verbose = False  # type: ignore
-logging.getLogger("LiteLLM").setLevel(logging.WARNING)
-logging.getLogger("LiteLLM Router").setLevel(logging.WARNING)
-logging.getLogger("LiteLLM Proxy").setLevel(logging.WARNING)
+logger = logging.getLogger(__name__)
 
 
-load_dotenv()
+SYSTEM_PROMPT = """You are an expert evaluator that judges how well user instructions were completed on a canvas interface.
 
-litellm.api_base = "https://app.lyngby.lightpost.one/"
-litellm.api_key = "9e571bf73904"
+Your task is to analyze the final state of a canvas and determine how successfully a user's instruction was fulfilled.
 
-logger = logging.getLogger(__name__)
+Evaluation criteria:
+- Score 0: Instruction completely failed or ignored
+- Score 1: Minimal progress, major elements missing or incorrect
+- Score 2: Good progress, instruction mostly completed with minor issues
+- Score 3: Perfect completion, instruction fully achieved as intended
 
+You must respond with valid JSON in this exact format:
+{
+  "score": <0-3>,
+  "reason": "<explanation in 100 words or less>"
+}
 
-def judge_instruction_achieved(instruction: str, final_state: dict[str, Any] | None) -> CaseResult:
-    """Use LLM to evaluate how well the instruction was achieved based on final state."""
-    # Handle case where run_instruction failed and returned None
-    if final_state is None:
-        return CaseResult(score=0, reason="Instruction execution failed - no final state available")
+Focus on whether the final canvas state matches what the user requested. Consider node types, content, positioning, relationships, and overall structure."""
 
-    system_prompt = """You are an expert evaluator that judges how well user instructions were completed on a canvas interface.
+CASCADE_SYSTEM_PROMPT = """You are an expert evaluator that judges how well user instructions were completed on a canvas interface.
 
-Your task is to analyze the final state of a canvas and determine how successfully a user's instruction was fulfilled.
+Your task is to analyze the final state of a canvas and determine how successfully a user's instruction was fulfilled, and how sure you are of that.
 
 Evaluation criteria:
 - Score 0: Instruction completely failed or ignored
@@ -40,25 +43,217 @@ Evaluation criteria:
 You must respond with valid JSON in this exact format:
 {
   "score": <0-3>,
+  "confidence": <0.0-1.0, how likely an expert reviewer would give the same score>,
   "reason": "<explanation in 100 words or less>"
 }
 
-Focus on whether the final canvas state matches what the user requested. Consider node types, content, positioning, relationships, and overall structure."""
+Focus on whether the final canvas state matches what the user requested. Consider node types, content, positioning, relationships, and overall structure. Give a low confidence when the state is ambiguous or hard to read rather than guessing."""
+
+NO_FINAL_STATE_REASON = "Instruction execution failed - no final state available"
+
+CHEAP_TIER = "cheap"
+STRONG_TIER = "strong"
+
 
+def _judge_messages(
+    instruction: str,
+    final_state: dict[str, Any],
+    state_profile: str,
+    system_prompt: str = SYSTEM_PROMPT,
+    facts: list[str] | None = None,
+) -> list[dict[str, str]]:
+    """Build the chat messages sent to the judge model."""
     user_prompt = f"""Instruction: "{instruction}"
 
 Final canvas state:
-{orjson.dumps(final_state, option=orjson.OPT_INDENT_2).decode()}"""
+{condense.serialize(final_state, condense.PROFILES[state_profile])}{format_facts(facts)}"""
+    return [{"role": "system", "content": system_prompt}, {"role": "user", "content": user_prompt}]
 
+
+def format_facts(facts: list[str] | None) -> str:
+    """Rule facts as a section appended to a judge prompt, nothing without facts."""
+    if not facts:
+        return ""
+    return "\n\nStructural facts checked before judging:\n" + "\n".join(f"- {fact}" for fact in facts)
+
+
+def response_usage(response: Any) -> tuple[int, int, float]:
+    """Prompt tokens, completion tokens and litellm-computed cost of a judge response."""
+    prompt_tokens = completion_tokens = 0
+    cost = 0.0
+    usage = getattr(response, "usage", None)
+    if usage is not None:
+        prompt_tokens = usage.prompt_tokens or 0
+        completion_tokens = usage.completion_tokens or 0
     try:
-        response = litellm.completion(
-            model="gpt-5",
-            messages=[{"role": "system", "content": system_prompt}, {"role": "user", "content": user_prompt}],
-            response_format={"type": "json_object"},
-        )
-        content = response.choices[0].message.content  # type: ignore
-        assert content is not None
-        return CaseResult(**orjson.loads(content))
+        cost = judge_client.get_litellm().completion_cost(completion_response=response)
     except Exception as e:
-        logger.error(f"LLM judge error: {e}")
-        return CaseResult(score=0, reason=f"Error during evaluation: {e}")
+        # The proxy may serve models litellm has no pricing for
+        logger.debug(f"No judge cost available: {e}")
+    return prompt_tokens, completion_tokens, cost
+
+
+def _parse_judge_response(response: Any) -> CaseResult:
+    content = response.choices[0].message.content  # type: ignore
+    assert content is not None
+    result = CaseResult(**orjson.loads(content))
+    result.prompt_tokens, result.completion_tokens, result.cost = response_usage(response)
+    return result
+
+
+def _escalates(result: CaseResult, config: JudgeConfig) -> bool:
+    """Whether a cheap tier verdict is left to the strong model: failed, unsure or borderline."""
+    return (
+        result.judge_error
+        or not isinstance(result.confidence, (int, float))
+        or result.confidence < config.cascade_min_confidence
+        or result.score in config.cascade_escalate_scores
+    )
+
+
+def _charge_escalation(
+    cheap: CaseResult, cheap_timings: MeasurementTimings, strong: CaseResult, timings: MeasurementTimings
+) -> None:
+    """Add the usage and judge durations of an escalated cheap verdict to the strong one replacing it."""
+    strong.prompt_tokens += cheap.prompt_tokens
+    strong.completion_tokens += cheap.completion_tokens
+    strong.cost += cheap.cost
+    for phase in ("judge_request", "judge_parse"):
+        spent = [seconds for seconds in (getattr(cheap_timings, phase), getattr(timings, phase)) if seconds is not None]
+        setattr(timings, phase, sum(spent) if spent else None)
+
+
+@dataclass
+class _JudgeRequest:
+    config: JudgeConfig
+    messages: list[dict[str, str]]
+
+
+# Judging written once for the sync and async entry points: the generator yields each request it
+# needs answered, is sent the response or thrown the error, and returns the verdict
+_JudgeSteps = Generator[_JudgeRequest, Any, CaseResult]
+
+
+def _judge_tier(
+    instruction: str,
+    final_state: dict[str, Any],
+    tier: str,
+    config: JudgeConfig,
+    system_prompt: str,
+    timings: MeasurementTimings,
+    facts: list[str],
+) -> _JudgeSteps:
+    key = judge_cache.cache_key(instruction, final_state, config.model, system_prompt, config.state_profile, facts)
+    if config.use_cache and (cached := judge_cache.get(key)) is not None:
+        cached.judge_tier = tier
+        return cached
+
+    try:
+        with span(timings, "judge_request"):
+            response = yield _JudgeRequest(
+                config, _judge_messages(instruction, final_state, config.state_profile, system_prompt, facts)
+            )
+        with span(timings, "judge_parse"):
+            result = _parse_judge_response(response)
+        result.judge_tier = tier
+        judge_cache.put(key, config.model, system_prompt, result)
+        return result
+    except Exception as e:
+        logger.error(f"LLM judge error ({config.model}): {type(e).__name__}: {e}")
+        return CaseResult(
+            score=0, reason=f"Error during evaluation: {type(e).__name__}: {e}", judge_error=True, judge_tier=tier
+        )
+
+
+def _judge_steps(
+    instruction: str,
+    final_state: dict[str, Any],
+    config: JudgeConfig,
+    timings: MeasurementTimings,
+    initial_state: dict[str, Any] | None,
+) -> _JudgeSteps:
+    verdict, facts = rules.check(initial_state, final_state, config.rules)
+    if verdict is not None:
+        return verdict
+
+    if config.cascade_model is None:
+        return (yield from _judge_tier(instruction, final_state, STRONG_TIER, config, SYSTEM_PROMPT, timings, facts))
+    cheap_config = replace(config, model=config.cascade_model)
+    cheap = yield from _judge_tier(
+        instruction, final_state, CHEAP_TIER, cheap_config, CASCADE_SYSTEM_PROMPT, timings, facts
+    )
+    if not _escalates(cheap, config):
+        return cheap
+    # The strong tier records its own durations, none at all on a cache hit, and the cheap tier's are added back
+    cheap_timings = replace(timings)
+    timings.judge_request = timings.judge_parse = None
+    strong = yield from _judge_tier(instruction, final_state, STRONG_TIER, config, SYSTEM_PROMPT, timings, facts)
+    _charge_escalation(cheap, cheap_timings, strong, timings)
+    return strong
+
+
+def judge_instruction_achieved(
+    instruction: str,
+    final_state: dict[str, Any] | None,
+    config: JudgeConfig | None = None,
+    timings: MeasurementTimings | None = None,
+    initial_state: dict[str, Any] | None = None,
+) -> CaseResult:
+    """
+    Use LLM to evaluate how well the instruction was achieved based on final state.
+    Structural rules run first, settling mechanical failures without a model and adding what they
+    found to the prompt otherwise; rules comparing against the initial state need it passed in.
+    With a cascade model configured, that model judges first and only verdicts it is unsure of,
+    or scores borderline, are judged again by the strong model.
+    """
+    # Handle case where run_instruction failed and returned None
+    if final_state is None:
+        return CaseResult(score=0, reason=NO_FINAL_STATE_REASON)
+    if config is None:
+        config = JudgeConfig()
+    if timings is None:
+        timings = MeasurementTimings()
+    steps = _judge_steps(instruction, final_state, config, timings, initial_state)
+    try:
+        request = next(steps)
+        while True:
+            try:
+                response = judge_client.complete(
+                    request.config, messages=request.messages, response_format={"type": "json_object"}
+                )
+            except Exception as e:
+                request = steps.throw(e)
+            else:
+                request = steps.send(response)
+    except StopIteration as done:
+        return done.value
+
+
+async def judge_instruction_achieved_async(
+    instruction: str,
+    final_state: dict[str, Any] | None,
+    config: JudgeConfig | None = None,
+    timings: MeasurementTimings | None = None,
+    initial_state: dict[str, Any] | None = None,
+) -> CaseResult:
+    """Async variant of judge_instruction_achieved using litellm's async API."""
+    if final_state is None:
+        return CaseResult(score=0, reason=NO_FINAL_STATE_REASON)
+    if config is None:
+        config = JudgeConfig()
+    if timings is None:
+        timings = MeasurementTimings()
+    steps = _judge_steps(instruction, final_state, config, timings, initial_state)
+    try:
+        request = next(steps)
+        while True:
+            try:
+                response = await judge_client.complete_async(
+                    request.config, messages=request.messages, response_format={"type": "json_object"}
+                )
+            except Exception as e:
+                request = steps.throw(e)
+            else:
+                request = steps.send(response)
+    except StopIteration as done:
+        return done.value
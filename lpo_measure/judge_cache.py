@@ -0,0 +1,119 @@
+import hashlib
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Sequence
+
+import orjson
+
+from .case import CaseResult
+from .db import get_connection
+
+logger = logging.getLogger(__name__)
+
+
+def prompt_hash(system_prompt: str) -> str:
+    """Short hash identifying a judge system prompt."""
+    return hashlib.sha256(system_prompt.encode()).hexdigest()[:16]
+
+
+def cache_key(
+    instruction: str,
+    final_state: dict[str, Any],
+    judge_model: str,
+    system_prompt: str,
+    state_profile: str,
+    facts: Sequence[str] = (),
+) -> str:
+    """Content address of a judge verdict."""
+    h = hashlib.sha256()
+    parts = [
+        hashlib.sha256(instruction.encode()).digest(),
+        orjson.dumps(final_state, option=orjson.OPT_SORT_KEYS),
+        judge_model.encode(),
+        prompt_hash(system_prompt).encode(),
+        # The judge sees the state as serialized by this profile
+        state_profile.encode(),
+    ]
+    # Rule facts are part of the prompt too; without any, keys stay those of verdicts from before rules
+    if facts:
+        parts.append(orjson.dumps(list(facts)))
+    for part in parts:
+        # Length-prefix each part so no two different inputs concatenate to the same bytes
+        h.update(len(part).to_bytes(8, "big"))
+        h.update(part)
+    return h.hexdigest()
+
+
+def get(key: str) -> CaseResult | None:
+    """Return the cached verdict for a key, if any."""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT score, reason, confidence FROM judge_cache WHERE key = ?", (key,))
+        row = cursor.fetchone()
+        if row:
+            return CaseResult(score=row[0], reason=row[1], cached=True, confidence=row[2])
+        return None
+
+
+def put(key: str, judge_model: str, system_prompt: str, result: CaseResult) -> None:
+    """Store a verdict in the cache."""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            """
+            INSERT OR REPLACE INTO judge_cache (key, judge_model, prompt_hash, score, reason, created_at, confidence)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            """,
+            (
+                key,
+                judge_model,
+                prompt_hash(system_prompt),
+                result.score,
+                result.reason,
+                datetime.now().isoformat(),
+                result.confidence,
+            ),
+        )
+        conn.commit()
+
+
+def clear(
+    judge_model: str | None = None,
+    older_than_days: float | None = None,
+    keep_prompt_hashes: list[str] | None = None,
+) -> int:
+    """
+    Evict cached verdicts and return how many were removed.
+    Without filters the whole cache is cleared; filters narrow the eviction.
+    """
+    conditions = []
+    params: list[Any] = []
+    if judge_model is not None:
+        conditions.append("judge_model = ?")
+        params.append(judge_model)
+    if older_than_days is not None:
+        conditions.append("created_at < ?")
+        params.append((datetime.now() - timedelta(days=older_than_days)).isoformat())
+    if keep_prompt_hashes is not None:
+        conditions.append(f"prompt_hash NOT IN ({','.join('?' * len(keep_prompt_hashes))})")
+        params.extend(keep_prompt_hashes)
+
+    query = "DELETE FROM judge_cache"
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(query, params)
+        conn.commit()
+        return cursor.rowcount
+
+
+def stats() -> list[tuple[str, str, int]]:
+    """Return (judge_model, prompt_hash, entries) for everything in the cache."""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT judge_model, prompt_hash, COUNT(*) FROM judge_cache GROUP BY judge_model, prompt_hash ORDER BY 3 DESC"
+        )
+        return cursor.fetchall()
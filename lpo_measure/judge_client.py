@@ -0,0 +1,169 @@
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+from types import ModuleType
+from typing import Any
+
+from .run import JudgeConfig
+
+logger = logging.getLogger(__name__)
+
+_litellm: ModuleType | None = None
+
+
+def get_litellm() -> ModuleType:
+    """
+    litellm, imported and pointed at the LiteLLM proxy on first use. The import takes seconds,
+    which commands and workers that never call the judge should not pay.
+    """
+    global _litellm
+    if _litellm is None:
+        import litellm
+
+        litellm.set_verbose = False  # type: ignore
+        logging.getLogger("LiteLLM").setLevel(logging.WARNING)
+        logging.getLogger("LiteLLM Router").setLevel(logging.WARNING)
+        logging.getLogger("LiteLLM Proxy").setLevel(logging.WARNING)
+        # Overridable to point the judge at a local mock LiteLLM endpoint
+        litellm.api_base = os.environ.get("LPO_MEASURE_JUDGE_API_BASE", "https://app.lyngby.lightpost.one/")
+        litellm.api_key = os.environ.get("LPO_MEASURE_JUDGE_API_KEY", "9e571bf73904")
+        _litellm = litellm
+    return _litellm
+
+
+def _retryable_errors() -> tuple[type[BaseException], ...]:
+    """Transient failures of the LiteLLM proxy or the provider behind it."""
+    litellm = get_litellm()
+    return (
+        litellm.RateLimitError,
+        litellm.Timeout,
+        litellm.APIConnectionError,
+        litellm.ServiceUnavailableError,
+        litellm.InternalServerError,
+        litellm.BadGatewayError,
+        asyncio.TimeoutError,
+    )
+
+BACKOFF_BASE_SECONDS = 1.0
+BACKOFF_MAX_SECONDS = 60.0
+# A rate limited bucket drops to this fraction of its rate, and recovers by a step per success
+RATE_LIMIT_BACKOFF = 0.5
+RATE_RECOVERY_STEP = 0.05
+
+
+class TokenBucket:
+    """
+    Token bucket rate limiter shared by every judge request in this process.
+    Its rate adapts: it halves whenever the proxy answers 429 and creeps back up to
+    the configured rate as requests succeed.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.max_rate = rate
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _take(self) -> float:
+        """Take a token if there is one, else return how long to wait for the next."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+    async def acquire(self) -> None:
+        while (wait := self._take()) > 0:
+            await asyncio.sleep(wait)
+
+    def acquire_sync(self) -> None:
+        while (wait := self._take()) > 0:
+            time.sleep(wait)
+
+    def rate_limited(self) -> None:
+        with self._lock:
+            self.rate = max(self.max_rate * 0.05, self.rate * RATE_LIMIT_BACKOFF)
+
+    def succeeded(self) -> None:
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate * RATE_RECOVERY_STEP)
+
+
+_buckets: dict[tuple[float, float], TokenBucket] = {}
+
+
+def _bucket(config: JudgeConfig) -> TokenBucket | None:
+    if config.requests_per_second is None:
+        return None
+    key = (config.requests_per_second, config.burst)
+    if key not in _buckets:
+        _buckets[key] = TokenBucket(config.requests_per_second, config.burst)
+    return _buckets[key]
+
+
+def _backoff_delay(attempt: int) -> float:
+    """Exponential backoff with full jitter, so retrying workers do not stampede together."""
+    return random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2**attempt))
+
+
+def _on_error(bucket: TokenBucket | None, error: Exception, attempt: int, config: JudgeConfig) -> float:
+    if bucket is not None and isinstance(error, get_litellm().RateLimitError):
+        bucket.rate_limited()
+    delay = _backoff_delay(attempt)
+    logger.warning(
+        f"Retryable judge error ({type(error).__name__}), attempt {attempt + 1}/{config.max_retries + 1}, "
+        f"retrying in {delay:.1f}s"
+    )
+    return delay
+
+
+def complete(config: JudgeConfig, **kwargs: Any) -> Any:
+    """litellm.completion with rate limiting, a per-request timeout and retries on transient errors."""
+    bucket = _bucket(config)
+    for attempt in range(config.max_retries + 1):
+        if bucket is not None:
+            bucket.acquire_sync()
+        try:
+            response = get_litellm().completion(
+                model=config.model, timeout=config.request_timeout, num_retries=0, **kwargs
+            )
+        except _retryable_errors() as e:
+            if attempt == config.max_retries:
+                raise
+            time.sleep(_on_error(bucket, e, attempt, config))
+            continue
+        if bucket is not None:
+            bucket.succeeded()
+        return response
+    raise AssertionError("Unreachable code.")
+
+
+async def complete_async(config: JudgeConfig, **kwargs: Any) -> Any:
+    """Async variant of complete using litellm's async API."""
+    bucket = _bucket(config)
+    for attempt in range(config.max_retries + 1):
+        if bucket is not None:
+            await bucket.acquire()
+        try:
+            # litellm's own timeout does not always cover connection setup, so bound the whole call
+            response = await asyncio.wait_for(
+                get_litellm().acompletion(model=config.model, timeout=config.request_timeout, num_retries=0, **kwargs),
+                config.request_timeout,
+            )
+        except _retryable_errors() as e:
+            if attempt == config.max_retries:
+                raise
+            await asyncio.sleep(_on_error(bucket, e, attempt, config))
+            continue
+        if bucket is not None:
+            bucket.succeeded()
+        return response
+    raise AssertionError("Unreachable code.")
@@ -0,0 +1,190 @@
+import logging
+import sqlite3
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+
+from . import blobs
+from .db import get_connection
+from .run import BenchmarkRun
+from .summaries import summarize_runs, update_run_summary
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _ShardRun:
+    path: Path
+    conn: sqlite3.Connection
+    id: int
+    timestamp: datetime
+    clay_commit_sha: str
+    clay_commit_message: str
+    benchmark_commit_sha: str
+    model: str
+    script_hash: str | None
+    status: str | None
+    shard_index: int
+    shard_count: int
+    trials: int
+    judge_config: str | None
+
+    @classmethod
+    def open(cls, path: Path) -> "_ShardRun":
+        """Open a shard database read-only and find the latest shard run in it."""
+        if not path.exists():
+            raise FileNotFoundError(f"Shard database {path} not found")
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        row = conn.execute(
+            """
+            SELECT id, timestamp, clay_commit_sha, clay_commit_message, benchmark_commit_sha, model, script_hash,
+                status, shard_index, shard_count, trials, judge_config
+            FROM runs WHERE shard_count IS NOT NULL
+            ORDER BY id DESC LIMIT 1
+            """
+        ).fetchone()
+        if row is None:
+            raise ValueError(f"{path} has no shard run")
+        return cls(path, conn, row[0], datetime.fromisoformat(row[1]), *row[2:])
+
+
+def _case_id(cursor: sqlite3.Cursor, case_hash: str, instruction: str, initial_state: str) -> int:
+    """Id of the case with this hash in the current database, creating it if needed."""
+    cursor.execute("SELECT id FROM cases WHERE hash = ?", (case_hash,))
+    row = cursor.fetchone()
+    if row:
+        return row[0]
+    cursor.execute(
+        "INSERT INTO cases (hash, instruction, initial_state) VALUES (?, ?, ?)",
+        (case_hash, instruction, initial_state),
+    )
+    if cursor.lastrowid is None:
+        raise TypeError("Failed to get last row id after insert.")
+    return cursor.lastrowid
+
+
+def _copy_measurements(cursor: sqlite3.Cursor, shard: _ShardRun, run_id: int, merged_hashes: set[str]) -> int:
+    """
+    Copy the measurements of a shard run into run_id, skipping cases already merged from another shard.
+    Returns how many were copied.
+    """
+    rows = shard.conn.execute(
+        """
+        SELECT c.hash, c.instruction, c.initial_state, m.final_state, b.hash, b.data, m.score, m.reason,
+            m.clay_runtime_seconds, m.judge_runtime_seconds, m.judge_prompt_tokens, m.judge_completion_tokens,
+            m.judge_cost, m.status, m.trial, m.judge_tier, t.measurement_id, t.spawn_seconds, t.first_output_seconds, t.exit_seconds,
+            t.output_parse_seconds, t.judge_request_seconds, t.judge_parse_seconds, t.exit_code, t.stderr_tail
+        FROM measurements m
+        JOIN cases c ON c.id = m.case_id
+        LEFT JOIN state_blobs b ON b.id = m.final_state_blob_id
+        LEFT JOIN measurement_timings t ON t.measurement_id = m.id
+        WHERE m.run_id = ?
+        ORDER BY m.id
+        """,
+        (shard.id,),
+    )
+    copied = 0
+    shard_hashes: set[str] = set()
+    for case_hash, instruction, initial_state, final_state, blob_hash, blob_data, *measurement in rows:
+        if case_hash in merged_hashes:
+            continue
+        shard_hashes.add(case_hash)
+        case_id = _case_id(cursor, case_hash, instruction, initial_state)
+        blob_id = blobs.store_encoded(cursor, blob_hash, blob_data) if blob_hash is not None else None
+        # reused_from is not carried over, it points at an id of the shard database
+        cursor.execute(
+            """
+            INSERT INTO measurements (
+                run_id, case_id, final_state, final_state_blob_id, score, reason, clay_runtime_seconds, judge_runtime_seconds,
+                judge_prompt_tokens, judge_completion_tokens, judge_cost, status, trial, judge_tier
+            )
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            (run_id, case_id, final_state, blob_id, *measurement[:10]),
+        )
+        if measurement[10] is not None:
+            cursor.execute(
+                """
+                INSERT INTO measurement_timings (
+                    measurement_id, spawn_seconds, first_output_seconds, exit_seconds, output_parse_seconds,
+                    judge_request_seconds, judge_parse_seconds, exit_code, stderr_tail
+                )
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (cursor.lastrowid, *measurement[11:]),
+            )
+        copied += 1
+    # Every trial of a case comes from the same shard
+    merged_hashes.update(shard_hashes)
+    return copied
+
+
+def merge_shards(shard_paths: list[Path]) -> int:
+    """
+    Fold the latest shard run of each shard database into one new run of the current database.
+    Cases are matched by hash and final states by content, so every id is renumbered; a case
+    measured by more than one shard keeps the first shard's measurement. Judge verdicts cached
+    by the shards are merged too. The run is complete only when every shard is present and complete.
+    Returns the id of the merged run.
+    """
+    shards = [_ShardRun.open(path) for path in shard_paths]
+    first = shards[0]
+    for shard in shards[1:]:
+        for attribute in ("shard_count", "trials", "model", "script_hash", "clay_commit_sha", "judge_config"):
+            if getattr(shard, attribute) != getattr(first, attribute):
+                raise ValueError(
+                    f"{shard.path} has {attribute} {getattr(shard, attribute)}, but {first.path} has {getattr(first, attribute)}"
+                )
+    indexes = sorted(shard.shard_index for shard in shards)
+    if len(set(indexes)) != len(indexes):
+        raise ValueError(f"Shards {indexes} contain duplicates")
+    missing = sorted(set(range(1, first.shard_count + 1)) - set(indexes))
+    if missing:
+        logger.warning(f"Shards {missing} of {first.shard_count} are missing, the merged run will be partial")
+    complete = not missing and all(shard.status == "complete" for shard in shards)
+
+    run = BenchmarkRun(
+        # The clay script ran on the shard runners, only its hash is recorded
+        script_path="",
+        clay_commit_sha=first.clay_commit_sha,
+        clay_commit_message=first.clay_commit_message,
+        model=first.model,
+        timestamp=min(shard.timestamp for shard in shards),
+        benchmark_commit_sha=first.benchmark_commit_sha,
+        script_hash=first.script_hash,
+        trials=first.trials,
+        judge_config=first.judge_config,
+    )
+    run_id = run.save_to_db()
+    try:
+        merged_hashes: set[str] = set()
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            for shard in sorted(shards, key=lambda s: s.shard_index):
+                copied = _copy_measurements(cursor, shard, run_id, merged_hashes)
+                cursor.executemany(
+                    """
+                    INSERT OR IGNORE INTO judge_cache (key, judge_model, prompt_hash, score, reason, created_at, confidence)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                    """,
+                    shard.conn.execute(
+                        "SELECT key, judge_model, prompt_hash, score, reason, created_at, confidence FROM judge_cache"
+                    ),
+                )
+                logger.info(
+                    f"Merged {copied} measurements of shard {shard.shard_index}/{shard.shard_count} ({shard.status}) from {shard.path}"
+                )
+    except BaseException:
+        run.set_status("failed")
+        raise
+    finally:
+        for shard in shards:
+            shard.conn.close()
+
+    run.update_totals()
+    update_run_summary(run_id)
+    run.set_status("complete" if complete else "partial")
+    logger.info(f"Merged {len(shards)} shards into run {run_id} with {len(merged_hashes)} cases")
+    # The merged database is what dashnb.py reads, so runs recorded before summaries existed get theirs too
+    summarize_runs()
+    return run_id
@@ -0,0 +1,306 @@
+import asyncio
+import logging
+import signal
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable
+
+from tqdm import tqdm
+
+from .batch_judge import MAX_BATCH_CASES, BatchItem, judge_batch_async
+from .case import Case, CaseMeasurement
+from .clay import run_clay_async
+from .clay_pool import ClayPool
+from .db import BatchWriter
+from .judge import judge_instruction_achieved_async
+from .run import BenchmarkRun, JudgeConfig, RunSummary
+from .timing import MeasurementTimings
+from .trials import TrialScheduler
+from .worker import log_measurement
+
+logger = logging.getLogger(__name__)
+
+STATS_LOG_INTERVAL_SECONDS = 10.0
+
+
+@dataclass
+class StageStats:
+    """Occupancy bookkeeping for one pipeline stage."""
+
+    name: str
+    workers: int
+    busy: int = 0
+    processed: int = 0
+    busy_seconds: float = 0.0
+
+    def utilization(self, elapsed: float) -> float:
+        """Fraction of the stage's worker time spent working rather than waiting."""
+        if elapsed <= 0:
+            return 0.0
+        return self.busy_seconds / (self.workers * elapsed)
+
+
+@dataclass
+class _ClayOutput:
+    case: Case
+    final_state: dict[str, Any] | None
+    clay_runtime: float
+    timings: MeasurementTimings
+    trial: int
+
+
+async def _clay_worker(
+    scheduler: TrialScheduler,
+    judge_queue: "asyncio.Queue[_ClayOutput | None]",
+    run_clay: Callable[[Case, MeasurementTimings], Awaitable[tuple[dict[str, Any] | None, float]]],
+    stats: StageStats,
+    stop: Callable[[], bool],
+) -> None:
+    # All clay workers take trials from the same scheduler, so each trial is taken exactly once
+    while (due := await scheduler.next_trial()) is not None:
+        case_id, trial = due
+        if stop():
+            # Handed back, so no worker keeps waiting for it to be recorded
+            scheduler.drop(case_id, trial)
+            return
+        # Loaded only once it is due, so just the cases in flight are held in memory
+        case = Case.load_from_db(case_id)
+        stats.busy += 1
+        start_time = time.monotonic()
+        timings = MeasurementTimings()
+        try:
+            final_state, clay_runtime = await run_clay(case, timings)
+        finally:
+            stats.busy -= 1
+            stats.busy_seconds += time.monotonic() - start_time
+        stats.processed += 1
+        # Blocks while the judge stage is behind, so clay never runs unboundedly ahead
+        await judge_queue.put(_ClayOutput(case, final_state, clay_runtime, timings, trial))
+
+
+def _record(
+    item: _ClayOutput,
+    judge_result: Any,
+    judge_runtime: float,
+    progress: tqdm,
+    summary: RunSummary,
+    writer: BatchWriter[CaseMeasurement],
+    scheduler: TrialScheduler,
+) -> None:
+    measurement = CaseMeasurement.create(
+        item.case, item.final_state, judge_result, item.clay_runtime, judge_runtime, item.timings, item.trial
+    )
+    scheduler.record(item.case.id, item.trial, None if measurement.status == "judge_error" else judge_result.score)
+    writer.add(measurement)
+    log_measurement(measurement)
+    summary.add(measurement)
+    progress.total = scheduler.expected
+    progress.update(1)
+
+
+async def _judge_worker(
+    judge_queue: "asyncio.Queue[_ClayOutput | None]",
+    run: BenchmarkRun,
+    stats: StageStats,
+    progress: tqdm,
+    summary: RunSummary,
+    writer: BatchWriter[CaseMeasurement],
+    scheduler: TrialScheduler,
+) -> None:
+    while True:
+        item = await judge_queue.get()
+        if item is None:
+            return
+        stats.busy += 1
+        start_time = time.monotonic()
+        try:
+            judge_result = await judge_instruction_achieved_async(
+                item.case.instruction,
+                item.final_state,
+                run.judge,
+                timings=item.timings,
+                initial_state=item.case.initial_state,
+            )
+            judge_runtime = time.monotonic() - start_time
+        finally:
+            stats.busy -= 1
+            stats.busy_seconds += time.monotonic() - start_time
+        stats.processed += 1
+        _record(item, judge_result, judge_runtime, progress, summary, writer, scheduler)
+
+
+def _batch_item(item: _ClayOutput) -> BatchItem:
+    return BatchItem(item.case.instruction, item.final_state, item.timings, item.case.initial_state)
+
+
+def _batch_tokens(item: _ClayOutput, config: JudgeConfig, batch_tokens: int) -> int:
+    """Prompt tokens an item adds to a batch; one whose prompt cannot be built fills a batch of its own."""
+    try:
+        return _batch_item(item).tokens(config)
+    except Exception as e:
+        # Judged alone, the failure is that case's judge error instead of one that stops the run
+        logger.warning(f"Cannot size case {item.case.id} for a batch, judging it alone: {type(e).__name__}: {e}")
+        return batch_tokens
+
+
+async def _judge_batch_worker(
+    judge_queue: "asyncio.Queue[_ClayOutput | None]",
+    run: BenchmarkRun,
+    stats: StageStats,
+    progress: tqdm,
+    summary: RunSummary,
+    writer: BatchWriter[CaseMeasurement],
+    scheduler: TrialScheduler,
+    batch_tokens: int,
+) -> None:
+    """Judge worker that packs whatever is waiting in the queue into batched requests."""
+    carry: tuple[_ClayOutput, int] | None = None
+    done = False
+    while not done:
+        if carry is None:
+            first = await judge_queue.get()
+            if first is None:
+                return
+            carry = (first, _batch_tokens(first, run.judge, batch_tokens))
+        batch, tokens = [carry[0]], carry[1]
+        carry = None
+        # Take what is already queued, without waiting for more
+        while len(batch) < MAX_BATCH_CASES:
+            try:
+                item = judge_queue.get_nowait()
+            except asyncio.QueueEmpty:
+                break
+            if item is None:
+                done = True
+                break
+            item_tokens = _batch_tokens(item, run.judge, batch_tokens)
+            if tokens + item_tokens > batch_tokens:
+                # Starts the next batch instead
+                carry = (item, item_tokens)
+                break
+            batch.append(item)
+            tokens += item_tokens
+
+        stats.busy += 1
+        start_time = time.monotonic()
+        try:
+            results = await judge_batch_async(
+                [_batch_item(item) for item in batch],
+                run.judge,
+            )
+            judge_runtime = time.monotonic() - start_time
+        finally:
+            stats.busy -= 1
+            stats.busy_seconds += time.monotonic() - start_time
+        stats.processed += len(batch)
+        for item, judge_result in zip(batch, results):
+            _record(item, judge_result, judge_runtime, progress, summary, writer, scheduler)
+
+
+async def _log_stats(clay: StageStats, judge: StageStats, judge_queue: asyncio.Queue) -> None:
+    while True:
+        await asyncio.sleep(STATS_LOG_INTERVAL_SECONDS)
+        logger.info(
+            f"Pipeline: clay {clay.busy}/{clay.workers} busy ({clay.processed} done), "
+            f"judge queue {judge_queue.qsize()}/{judge_queue.maxsize}, "
+            f"judge {judge.busy}/{judge.workers} busy ({judge.processed} done)"
+        )
+
+
+async def run_pipeline(
+    scheduler: TrialScheduler,
+    run: BenchmarkRun,
+    clay_workers: int,
+    judge_workers: int,
+    queue_size: int,
+    clay_runner: str = "spawn",
+    budget: float | None = None,
+    judge_batch_tokens: int | None = None,
+) -> RunSummary:
+    """
+    Run the trials of a scheduler through a clay stage and a judge stage connected by a bounded queue.
+    Each stage has its own worker count, so judging overlaps with the next clay executions.
+    The clay stage either spawns clay per case, or reuses a pool of persistent clay processes.
+    Once the judge spend reaches the budget, no new cases are started.
+    With judge_batch_tokens, the judge stage packs queued cases into batched requests.
+    Ctrl-C or SIGTERM cancels the cases in flight, keeping the measurements already taken.
+    """
+    run_id = run.id
+    if run_id is None:
+        raise ValueError("BenchmarkRun must have an id to save measurements.")
+
+    judge_queue: asyncio.Queue[_ClayOutput | None] = asyncio.Queue(maxsize=queue_size)
+    clay_stats = StageStats("clay", clay_workers)
+    judge_stats = StageStats("judge", judge_workers)
+    planned = scheduler.planned
+    summary = RunSummary()
+
+    pool = None
+    if clay_runner == "pool":
+        pool = ClayPool(run, clay_workers)
+        run_clay = pool.run_clay
+    elif clay_runner == "spawn":
+
+        async def run_clay(case: Case, timings: MeasurementTimings) -> tuple[dict[str, Any] | None, float]:
+            return await run_clay_async(case, run, timings)
+
+    else:
+        raise ValueError(f"Unknown clay runner: {clay_runner}")
+
+    start_time = time.monotonic()
+    stats_task = asyncio.create_task(_log_stats(clay_stats, judge_stats, judge_queue))
+    main_task = asyncio.current_task()
+    assert main_task is not None
+    loop = asyncio.get_running_loop()
+    # asyncio.run already turns Ctrl-C into cancelling the main task, SIGTERM does the same
+    loop.add_signal_handler(signal.SIGTERM, main_task.cancel)
+    try:
+        with (
+            tqdm(total=planned) as progress,
+            BatchWriter[CaseMeasurement](lambda cursor, m: m.insert(cursor, run_id)) as writer,
+        ):
+            async with asyncio.TaskGroup() as tg:
+                if judge_batch_tokens:
+                    judge_tasks = [
+                        tg.create_task(
+                            _judge_batch_worker(
+                                judge_queue, run, judge_stats, progress, summary, writer, scheduler, judge_batch_tokens
+                            )
+                        )
+                        for _ in range(judge_workers)
+                    ]
+                else:
+                    judge_tasks = [
+                        tg.create_task(
+                            _judge_worker(judge_queue, run, judge_stats, progress, summary, writer, scheduler)
+                        )
+                        for _ in range(judge_workers)
+                    ]
+                async with asyncio.TaskGroup() as clay_tg:
+                    for _ in range(clay_workers):
+                        clay_tg.create_task(
+                            _clay_worker(scheduler, judge_queue, run_clay, clay_stats, lambda: summary.over_budget(budget))
+                        )
+                # Clay stage drained, tell every judge worker to stop once the queue is empty
+                for _ in judge_tasks:
+                    await judge_queue.put(None)
+    except asyncio.CancelledError:
+        # Every worker has been cancelled, and the writer flushed what was measured
+        main_task.uncancel()
+        summary.interrupted = True
+        logger.warning("Run interrupted, cancelled the cases in flight")
+    finally:
+        loop.remove_signal_handler(signal.SIGTERM)
+        stats_task.cancel()
+        if pool is not None:
+            await pool.close()
+
+    summary.converged = scheduler.converged
+    summary.skipped = planned - summary.cases - summary.converged
+    elapsed = time.monotonic() - start_time
+    for stats in (clay_stats, judge_stats):
+        logger.info(
+            f"Stage {stats.name}: {stats.processed} cases, {stats.workers} workers, "
+            f"{stats.utilization(elapsed):.0%} utilization over {elapsed:.1f}s"
+        )
+    return summary
@@ -0,0 +1,133 @@
+import collections
+from dataclasses import dataclass, field
+from typing import Any, Callable
+
+import orjson
+
+from .case import CaseResult
+
+# Judge tier of verdicts decided by a rule, without asking a model
+RULES_TIER = "rules"
+
+
+@dataclass
+class Finding:
+    """What a rule found in a final state: a verdict that settles the case, or facts for the judge prompt."""
+
+    verdict: CaseResult | None = None
+    facts: list[str] = field(default_factory=list)
+
+
+# A rule sees the final state and, when known, the initial state it was edited from
+Rule = Callable[[dict[str, Any] | None, dict[str, Any]], Finding | None]
+
+
+def _items(state: dict[str, Any] | None, key: str) -> list[dict[str, Any]]:
+    items = state.get(key) if isinstance(state, dict) else None
+    return [item for item in items if isinstance(item, dict)] if isinstance(items, list) else []
+
+
+def _by_id(items: list[dict[str, Any]]) -> dict[Any, dict[str, Any]]:
+    """
+    Items by id. One without an id, or repeating one, is keyed by its JSON and how many identical
+    items came before it, so every item counts once and an unchanged one matches itself across states.
+    """
+    keyed: dict[Any, dict[str, Any]] = {}
+    repeats: collections.Counter[bytes] = collections.Counter()
+    for item in items:
+        item_id = item.get("id")
+        if isinstance(item_id, (str, int)) and item_id not in keyed:
+            keyed[item_id] = item
+            continue
+        content = orjson.dumps(item, option=orjson.OPT_SORT_KEYS)
+        keyed[(content, repeats[content])] = item
+        repeats[content] += 1
+    return keyed
+
+
+def _verdict(reason: str) -> Finding:
+    return Finding(verdict=CaseResult(score=0, reason=reason, judge_tier=RULES_TIER))
+
+
+def unchanged(initial_state: dict[str, Any] | None, final_state: dict[str, Any]) -> Finding | None:
+    """Clay handed back the canvas it was given, so no instruction was carried out."""
+    if initial_state is not None and final_state == initial_state:
+        return _verdict("Rule check: the final canvas is identical to the initial canvas, nothing was done")
+    return None
+
+
+def empty_canvas(initial_state: dict[str, Any] | None, final_state: dict[str, Any]) -> Finding | None:
+    """
+    A canvas left without nodes fails, unless it started with some: then clearing it may have
+    been the instruction, which only the judge can tell.
+    """
+    if _items(final_state, "nodes"):
+        return None
+    initial_nodes = _items(initial_state, "nodes")
+    if initial_state is not None and not initial_nodes:
+        return _verdict("Rule check: the final canvas has no nodes, nothing was created")
+    if initial_nodes:
+        return Finding(facts=[f"The final canvas has no nodes, all {len(initial_nodes)} initial nodes were removed."])
+    return Finding(facts=["The final canvas has no nodes."])
+
+
+def dangling_edges(initial_state: dict[str, Any] | None, final_state: dict[str, Any]) -> Finding | None:
+    """Edges whose source or target is not a node of the canvas are broken, which the judge should weigh."""
+    node_ids = set(_by_id(_items(final_state, "nodes")))
+    dangling = [
+        edge.get("id", f"{edge.get('source')}->{edge.get('target')}")
+        for edge in _items(final_state, "edges")
+        if edge.get("source") not in node_ids or edge.get("target") not in node_ids
+    ]
+    if not dangling:
+        return None
+    shown = ", ".join(str(edge_id) for edge_id in dangling[:10])
+    more = f" and {len(dangling) - 10} more" if len(dangling) > 10 else ""
+    return Finding(facts=[f"{len(dangling)} edges reference nodes that do not exist: {shown}{more}."])
+
+
+def structure(initial_state: dict[str, Any] | None, final_state: dict[str, Any]) -> Finding | None:
+    """Node and edge counts, and what changed against the initial state, so the judge need not count."""
+    nodes, edges = _by_id(_items(final_state, "nodes")), _by_id(_items(final_state, "edges"))
+    facts = [f"The final canvas has {len(nodes)} nodes and {len(edges)} edges."]
+    if initial_state is not None:
+        initial_nodes, initial_edges = _by_id(_items(initial_state, "nodes")), _by_id(_items(initial_state, "edges"))
+        kept = nodes.keys() & initial_nodes.keys()
+        changed = sum(1 for node_id in kept if nodes[node_id] != initial_nodes[node_id])
+        facts.append(
+            f"Against the initial canvas: {len(nodes.keys() - initial_nodes.keys())} nodes added, "
+            f"{len(initial_nodes.keys() - nodes.keys())} removed, {changed} changed; "
+            f"{len(edges.keys() - initial_edges.keys())} edges added, "
+            f"{len(initial_edges.keys() - edges.keys())} removed."
+        )
+    return Finding(facts=facts)
+
+
+# Rules by name, in the order they run; the first verdict settles the case
+RULES: dict[str, Rule] = {
+    "unchanged": unchanged,
+    "empty_canvas": empty_canvas,
+    "dangling_edges": dangling_edges,
+    "structure": structure,
+}
+# Rules are opt-in: they change judge prompts, cache keys and scores, so runs judged without them
+# keep judging as before; JudgeConfig.verdict_settings records which rules a run used
+DEFAULT_RULES: tuple[str, ...] = ()
+
+
+def check(
+    initial_state: dict[str, Any] | None, final_state: dict[str, Any], rules: tuple[str, ...] = DEFAULT_RULES
+) -> tuple[CaseResult | None, list[str]]:
+    """
+    Run the named rules over a final state, before any model sees it. Returns the verdict of the
+    first rule that decides the case, if any, and the facts the rules found for the judge prompt.
+    """
+    facts: list[str] = []
+    for name in rules:
+        finding = RULES[name](initial_state, final_state)
+        if finding is None:
+            continue
+        if finding.verdict is not None:
+            return finding.verdict, facts
+        facts.extend(finding.facts)
+    return None, facts
@@ -1,5 +1,72 @@
-from dataclasses import dataclass
+import hashlib
+import logging
+from dataclasses import dataclass, field
 from datetime import datetime
+from typing import Collection
+
+import orjson
+
+from .case import CaseMeasurement
+from .condense import DEFAULT_PROFILE
+from .db import get_connection
+from .rules import DEFAULT_RULES, RULES_TIER
+from .transport import DEFAULT_TRANSPORT
+
+logger = logging.getLogger(__name__)
+
+
+def hash_script(script_path: str) -> str:
+    """Content hash of the clay script, so identical releases fingerprint identically."""
+    h = hashlib.sha256()
+    with open(script_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()[:16]
+
+
+JUDGE_MODEL = "gpt-5"
+# Cheap verdicts the strong judge model is asked to confirm: unsure ones, and borderline scores
+CASCADE_MIN_CONFIDENCE = 0.8
+CASCADE_ESCALATE_SCORES = (1, 2)
+# Clay normally finishes a case well within a minute
+CLAY_TIMEOUT_SECONDS = 600.0
+
+
+@dataclass
+class JudgeConfig:
+    """Settings for judging final states."""
+
+    model: str = JUDGE_MODEL
+    # Cheaper model that judges first, escalating to model when unsure; None judges with model alone
+    cascade_model: str | None = None
+    cascade_min_confidence: float = CASCADE_MIN_CONFIDENCE
+    cascade_escalate_scores: tuple[int, ...] = CASCADE_ESCALATE_SCORES
+    # Names of the structural rules checked before any model is asked, see rules.RULES
+    rules: tuple[str, ...] = DEFAULT_RULES
+    # Name of the condense profile applied to final states in judge prompts
+    state_profile: str = DEFAULT_PROFILE
+    use_cache: bool = True
+    # Judge requests per second across all workers of a process, None for no limit
+    requests_per_second: float | None = None
+    burst: float = 5.0
+    max_retries: int = 5
+    request_timeout: float = 300.0
+
+    def verdict_settings(self) -> str:
+        """
+        The settings that can change a verdict, as canonical JSON. Stored on runs.judge_config,
+        and measurements are only reused from runs with the same settings.
+        """
+        settings = {
+            "model": self.model,
+            "state_profile": self.state_profile,
+            "rules": list(self.rules),
+            "cascade_model": self.cascade_model,
+        }
+        if self.cascade_model is not None:
+            settings["cascade_min_confidence"] = self.cascade_min_confidence
+            settings["cascade_escalate_scores"] = list(self.cascade_escalate_scores)
+        return orjson.dumps(settings, option=orjson.OPT_SORT_KEYS).decode()
 
 
 @dataclass
@@ -13,3 +80,232 @@ class BenchmarkRun:
     timestamp: datetime
     benchmark_commit_sha: str
     id: int | None = None
+    judge: JudgeConfig = field(default_factory=JudgeConfig)
+    script_hash: str | None = None
+    # Seconds before a clay execution is killed, overall and without any output, None for no limit
+    clay_timeout: float | None = CLAY_TIMEOUT_SECONDS
+    clay_idle_timeout: float | None = None
+    # How initial and final states travel between the harness and a spawned clay: file, tmpfs or pipe
+    clay_transport: str = DEFAULT_TRANSPORT
+    # Only measure the cases of shard shard_index (1-based) of shard_count
+    shard_index: int | None = None
+    shard_count: int | None = None
+    # Times every case is measured, fewer for cases whose scores converge early
+    trials: int = 1
+    # Judge settings the run was measured with as recorded in the database, see JudgeConfig.verdict_settings
+    judge_config: str | None = None
+
+    @classmethod
+    def load_from_db(cls, run_id: int, script_path: str) -> "BenchmarkRun":
+        """
+        Load a run to resume it with the clay script at script_path,
+        which must have the same content the run was started with.
+        """
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                """
+                SELECT timestamp, clay_commit_sha, clay_commit_message, benchmark_commit_sha, model, script_hash,
+                    shard_index, shard_count, trials, judge_config
+                FROM runs WHERE id = ?
+                """,
+                (run_id,),
+            )
+            row = cursor.fetchone()
+        if not row:
+            raise ValueError(f"Run with id {run_id} not found")
+        script_hash = hash_script(script_path)
+        if row[5] is not None and row[5] != script_hash:
+            raise ValueError(f"Run {run_id} was measured with script {row[5]}, but {script_path} hashes to {script_hash}")
+        return cls(
+            script_path=script_path,
+            clay_commit_sha=row[1],
+            clay_commit_message=row[2],
+            model=row[4],
+            timestamp=datetime.fromisoformat(row[0]),
+            benchmark_commit_sha=row[3],
+            id=run_id,
+            script_hash=script_hash,
+            shard_index=row[6],
+            shard_count=row[7],
+            trials=row[8],
+            judge_config=row[9],
+        )
+
+    def save_to_db(self) -> int:
+        """Insert the run into the database as running and set its id."""
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                """
+                INSERT INTO runs (
+                    timestamp, clay_commit_sha, clay_commit_message, benchmark_commit_sha, model, script_hash,
+                    shard_index, shard_count, trials, judge_config, status
+                )
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 'running')
+                """,
+                (
+                    self.timestamp.isoformat(),
+                    self.clay_commit_sha,
+                    self.clay_commit_message,
+                    self.benchmark_commit_sha,
+                    self.model,
+                    self.script_hash,
+                    self.shard_index,
+                    self.shard_count,
+                    self.trials,
+                    self.judge_config or self.judge.verdict_settings(),
+                ),
+            )
+            conn.commit()
+            if cursor.lastrowid is None:
+                raise TypeError("Failed to get last row id after insert.")
+            self.id = cursor.lastrowid
+            return self.id
+
+    def update_totals(self) -> None:
+        """Sum the judge usage and cost of the run's measurements onto the run."""
+        if self.id is None:
+            raise ValueError("BenchmarkRun must have an id to update totals.")
+        with get_connection() as conn:
+            conn.execute(
+                """
+                UPDATE runs SET (total_prompt_tokens, total_completion_tokens, total_cost) = (
+                    SELECT COALESCE(SUM(judge_prompt_tokens), 0), COALESCE(SUM(judge_completion_tokens), 0), COALESCE(SUM(judge_cost), 0)
+                    FROM measurements WHERE run_id = ?
+                )
+                WHERE id = ?
+                """,
+                (self.id, self.id),
+            )
+
+    def set_status(self, status: str) -> None:
+        """
+        Record where the run stands: running, then complete, partial when some cases
+        were not measured, or failed when measuring stopped on an error.
+        """
+        if self.id is None:
+            raise ValueError("BenchmarkRun must have an id to set its status.")
+        with get_connection() as conn:
+            conn.execute("UPDATE runs SET status = ? WHERE id = ?", (status, self.id))
+
+    def measured_trials(self) -> dict[int, dict[int, int | None]]:
+        """
+        Trials already measured in this run, by case id and trial index, with their score,
+        or None for judge errors, which have no real score.
+        """
+        if self.id is None:
+            raise ValueError("BenchmarkRun must have an id to look up its measurements.")
+        measured: dict[int, dict[int, int | None]] = {}
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT case_id, trial, score, status FROM measurements WHERE run_id = ?", (self.id,))
+            for case_id, trial, score, status in cursor.fetchall():
+                measured.setdefault(case_id, {})[trial] = None if status == "judge_error" else score
+        return measured
+
+    def reuse_measurements(self, case_ids: Collection[int]) -> set[int]:
+        """
+        Copy the latest measurement of every case already measured with the same
+        (script hash, model, judge settings, case hash) fingerprint into this run. Judge errors, clay errors and
+        clay timeouts, which can come from the judge API, the model API or machine load rather than the script,
+        are never reused.
+        Returns the ids of the cases that no longer need to be executed.
+        """
+        if self.id is None:
+            raise ValueError("BenchmarkRun must have an id to reuse measurements.")
+        if self.script_hash is None:
+            return set()
+
+        wanted = set(case_ids)
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            # Case hashes are unique, so a case id stands for its hash
+            cursor.execute(
+                """
+                SELECT m.case_id, MAX(m.id)
+                FROM measurements m
+                JOIN runs r ON r.id = m.run_id
+                WHERE r.script_hash = ? AND r.model = ? AND r.judge_config = ? AND r.id != ?
+                    AND m.status NOT IN ('judge_error', 'clay_error', 'clay_timeout')
+                GROUP BY m.case_id
+                """,
+                (self.script_hash, self.model, self.judge.verdict_settings(), self.id),
+            )
+            reusable = [(case_id, measurement_id) for case_id, measurement_id in cursor.fetchall() if case_id in wanted]
+
+            cursor.executemany(
+                """
+                INSERT INTO measurements (
+                    run_id, case_id, final_state, final_state_blob_id, score, reason,
+                    clay_runtime_seconds, judge_runtime_seconds, status, judge_tier, reused_from
+                )
+                SELECT ?, case_id, final_state, final_state_blob_id, score, reason,
+                    clay_runtime_seconds, judge_runtime_seconds, status, judge_tier, COALESCE(reused_from, id)
+                FROM measurements WHERE id = ?
+                """,
+                [(self.id, measurement_id) for _, measurement_id in reusable],
+            )
+            conn.commit()
+        return {case_id for case_id, _ in reusable}
+
+
+@dataclass
+class RunSummary:
+    """Counters accumulated over the measurements of a benchmark run."""
+
+    cases: int = 0
+    reused: int = 0
+    skipped: int = 0
+    clay_errors: int = 0
+    clay_timeouts: int = 0
+    judge_errors: int = 0
+    # Trials not run because the case's scores had already converged
+    converged: int = 0
+    judge_cache_hits: int = 0
+    judge_cache_misses: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cost: float = 0.0
+    # Verdicts per judge tier that decided them, see CaseResult.judge_tier
+    judge_tiers: dict[str, int] = field(default_factory=dict)
+    # The run was stopped by Ctrl-C or SIGTERM before all cases were measured
+    interrupted: bool = False
+
+    def add(self, measurement: CaseMeasurement) -> None:
+        """Account for one finished measurement."""
+        self.cases += 1
+        self.prompt_tokens += measurement.result.prompt_tokens
+        self.completion_tokens += measurement.result.completion_tokens
+        self.cost += measurement.result.cost
+        if measurement.status == "clay_error":
+            self.clay_errors += 1
+        elif measurement.status == "clay_timeout":
+            self.clay_timeouts += 1
+        elif measurement.status == "judge_error":
+            self.judge_errors += 1
+        if measurement.result.judge_tier is not None:
+            self.judge_tiers[measurement.result.judge_tier] = self.judge_tiers.get(measurement.result.judge_tier, 0) + 1
+        # Without a final state, or with a rule verdict, no model is consulted, so it is neither a hit nor a miss
+        if measurement.final_state is None or measurement.result.judge_tier == RULES_TIER:
+            return
+        if measurement.result.cached:
+            self.judge_cache_hits += 1
+        else:
+            self.judge_cache_misses += 1
+
+    def over_budget(self, budget: float | None) -> bool:
+        """Whether the judge spend so far has reached the budget."""
+        return budget is not None and self.cost >= budget
+
+    def log(self) -> None:
+        tiers = ", ".join(f"{tier} {count}" for tier, count in sorted(self.judge_tiers.items())) or "none"
+        logger.info(
+            f"Run summary: {self.cases} cases executed, {self.reused} reused, {self.skipped} skipped, "
+            f"{self.converged} trials saved by convergence, "
+            f"{self.clay_errors} clay errors, {self.clay_timeouts} clay timeouts, {self.judge_errors} judge errors, "
+            f"judge cache {self.judge_cache_hits} hits / {self.judge_cache_misses} misses, "
+            f"judge tiers {tiers}, "
+            f"judge tokens {self.prompt_tokens} prompt / {self.completion_tokens} completion, "
+            f"judge cost ${self.cost:.4f}"
+        )
@@ -0,0 +1,237 @@
+import math
+import sqlite3
+from dataclasses import dataclass
+from typing import Sequence
+
+import numpy as np
+
+BOOTSTRAP_SAMPLES = 2000
+CONFIDENCE = 0.95
+# Two-sided normal quantile for CONFIDENCE, used by the cheap convergence check during a run
+NORMAL_QUANTILE = 1.96
+# Bounds the intermediate arrays of the vectorized bootstraps, in elements
+CHUNK_ELEMENTS = 1 << 22
+
+
+def converged(scores: Sequence[int], min_trials: int, half_width: float) -> bool:
+    """
+    Whether the mean of a case's trial scores is known well enough to stop running trials:
+    at least min_trials scores, and a normal-approximation confidence interval no wider than ±half_width.
+    """
+    if len(scores) < min_trials:
+        return False
+    return NORMAL_QUANTILE * float(np.std(scores, ddof=1)) / np.sqrt(len(scores)) <= half_width
+
+
+def score_matrix(scores: Sequence[Sequence[float]]) -> np.ndarray:
+    """Cases x trials matrix of scores, padded with NaN where a case has fewer trials."""
+    width = max((len(row) for row in scores), default=0)
+    matrix = np.full((len(scores), width), np.nan)
+    for i, row in enumerate(scores):
+        matrix[i, : len(row)] = row
+    return matrix
+
+
+@dataclass
+class CaseStatistics:
+    """Per-case statistics over trials, one entry per row of the score matrix."""
+
+    trials: np.ndarray
+    mean: np.ndarray
+    # Sample variance over trials, NaN for a case with a single trial
+    variance: np.ndarray
+    ci_low: np.ndarray
+    ci_high: np.ndarray
+
+
+@dataclass
+class RunStatistics:
+    """Statistics of a run's score, the mean over cases of each case's mean trial score."""
+
+    cases: int
+    mean: float
+    # Average within-case variance over trials, NaN when no case has repeated trials
+    trial_variance: float
+    ci_low: float
+    ci_high: float
+
+
+def _moments(matrix: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Trial count, mean and sample variance of every row of a score matrix."""
+    trials = (~np.isnan(matrix)).sum(axis=1)
+    mean = np.nansum(matrix, axis=1) / trials
+    squared = np.nansum((matrix - mean[:, None]) ** 2, axis=1)
+    variance = np.divide(squared, trials - 1, out=np.full(len(trials), np.nan), where=trials > 1)
+    return trials, mean, variance
+
+
+def _bootstrap_case_means(matrix: np.ndarray, samples: int, rng: np.random.Generator) -> np.ndarray:
+    """Cases x samples matrix of bootstrap means, resampling each case's own trials."""
+    trials = (~np.isnan(matrix)).sum(axis=1)
+    # Move every case's scores to the front of its row, so index < trials picks a real score
+    packed = np.nan_to_num(np.take_along_axis(matrix, np.argsort(np.isnan(matrix), axis=1, kind="stable"), axis=1))
+    cases, width = matrix.shape
+    means = np.empty((cases, samples))
+    step = max(1, CHUNK_ELEMENTS // (samples * max(width, 1)))
+    for start in range(0, cases, step):
+        rows = slice(start, start + step)
+        n = trials[rows, None, None]
+        index = (rng.random((len(packed[rows]), samples, width)) * n).astype(np.intp)
+        draws = np.take_along_axis(packed[rows, None, :], index, axis=2)
+        # A resample has as many scores as the case has trials, the padding columns are masked out
+        means[rows] = (draws * (np.arange(width) < n)).sum(axis=2) / trials[rows, None]
+    return means
+
+
+def case_statistics(
+    matrix: np.ndarray,
+    samples: int = BOOTSTRAP_SAMPLES,
+    confidence: float = CONFIDENCE,
+    rng: np.random.Generator | None = None,
+) -> CaseStatistics:
+    """Mean, variance and percentile bootstrap confidence interval of every case's trial scores."""
+    rng = rng or np.random.default_rng()
+    trials, mean, variance = _moments(matrix)
+    boot = _bootstrap_case_means(matrix, samples, rng)
+    alpha = (1 - confidence) / 2
+    ci_low, ci_high = np.quantile(boot, [alpha, 1 - alpha], axis=1)
+    return CaseStatistics(trials, mean, variance, ci_low, ci_high)
+
+
+def run_statistics(
+    matrix: np.ndarray,
+    samples: int = BOOTSTRAP_SAMPLES,
+    confidence: float = CONFIDENCE,
+    rng: np.random.Generator | None = None,
+) -> RunStatistics:
+    """
+    Mean and two-stage bootstrap confidence interval of a run's score: each sample resamples
+    the cases, and the trials within each case, so both case mix and trial noise are covered.
+    """
+    rng = rng or np.random.default_rng()
+    cases = len(matrix)
+    if cases == 0:
+        return RunStatistics(0, np.nan, np.nan, np.nan, np.nan)
+    _, mean, variance = _moments(matrix)
+    boot = _bootstrap_case_means(matrix, samples, rng)
+    run_boot = np.empty(samples)
+    step = max(1, CHUNK_ELEMENTS // cases)
+    for start in range(0, samples, step):
+        columns = np.arange(start, min(start + step, samples))
+        picked = rng.integers(0, cases, size=(len(columns), cases))
+        run_boot[columns] = boot[picked, columns[:, None]].mean(axis=1)
+    alpha = (1 - confidence) / 2
+    ci_low, ci_high = np.quantile(run_boot, [alpha, 1 - alpha])
+    repeated = variance[~np.isnan(variance)]
+    trial_variance = float(repeated.mean()) if len(repeated) else np.nan
+    return RunStatistics(cases, float(mean.mean()), trial_variance, float(ci_low), float(ci_high))
+
+
+def load_score_matrix(conn: sqlite3.Connection, run_id: int) -> tuple[list[int], np.ndarray]:
+    """Case ids and cases x trials score matrix of a run, leaving out judge errors, which have no real score."""
+    scores: dict[int, list[float]] = {}
+    rows = conn.execute(
+        "SELECT case_id, score FROM measurements WHERE run_id = ? AND status != 'judge_error' ORDER BY case_id, trial",
+        (run_id,),
+    )
+    for case_id, score in rows:
+        scores.setdefault(case_id, []).append(score)
+    return list(scores), score_matrix(list(scores.values()))
+
+
+def _beta_continued_fraction(a: np.ndarray, b: np.ndarray, x: np.ndarray, iterations: int = 200) -> np.ndarray:
+    # Modified Lentz evaluation of the continued fraction of the incomplete beta function
+    tiny = 1e-300
+    c = np.ones_like(x)
+    d = 1 - (a + b) * x / (a + 1)
+    d = 1 / np.where(np.abs(d) < tiny, tiny, d)
+    h = d.copy()
+    for m in range(1, iterations + 1):
+        for numerator in (
+            m * (b - m) * x / ((a - 1 + 2 * m) * (a + 2 * m)),
+            -(a + m) * (a + b + m) * x / ((a + 2 * m) * (a + 1 + 2 * m)),
+        ):
+            d = 1 + numerator * d
+            d = 1 / np.where(np.abs(d) < tiny, tiny, d)
+            c = 1 + numerator / c
+            c = np.where(np.abs(c) < tiny, tiny, c)
+            h = h * d * c
+    return h
+
+
+def betainc(a: np.ndarray, b: np.ndarray, x: np.ndarray) -> np.ndarray:
+    """Regularized incomplete beta function I_x(a, b), elementwise."""
+    a, b, x = (np.asarray(v, dtype=float) for v in np.broadcast_arrays(a, b, x))
+    lgamma = np.vectorize(math.lgamma, otypes=[float])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        front = np.exp(lgamma(a + b) - lgamma(a) - lgamma(b) + a * np.log(x) + b * np.log1p(-x))
+        # The continued fraction converges quickly on one side of the mode, symmetry covers the other
+        direct = x < (a + 1) / (a + b + 2)
+        result = np.where(
+            direct,
+            front * _beta_continued_fraction(a, b, x) / a,
+            1 - front * _beta_continued_fraction(b, a, 1 - x) / b,
+        )
+    return np.where(x <= 0, 0.0, np.where(x >= 1, 1.0, result))
+
+
+def t_test_p_value(t: np.ndarray, df: np.ndarray) -> np.ndarray:
+    """Two-sided p-value of Student t statistics, NaN where df is not positive."""
+    t, df = (np.asarray(v, dtype=float) for v in np.broadcast_arrays(t, df))
+    p = np.full_like(df, np.nan)
+    # betainc is only defined for positive df, so the rest never reach it
+    valid = df > 0
+    t, df = t[valid], df[valid]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        x = np.where(np.isinf(t), 0.0, df / (df + t**2))
+        p[valid] = betainc(df / 2, np.full_like(df, 0.5), np.nan_to_num(x, nan=1.0))
+    return p
+
+
+def welch_t_test(
+    mean_a: np.ndarray,
+    variance_a: np.ndarray,
+    n_a: np.ndarray,
+    mean_b: np.ndarray,
+    variance_b: np.ndarray,
+    n_b: np.ndarray,
+) -> np.ndarray:
+    """
+    Two-sided p-values of Welch's t-test on summary statistics, elementwise.
+    NaN where either side has fewer than two samples.
+    """
+    mean_a, variance_a, n_a, mean_b, variance_b, n_b = (
+        np.asarray(v, dtype=float) for v in np.broadcast_arrays(mean_a, variance_a, n_a, mean_b, variance_b, n_b)
+    )
+    p = np.full_like(n_a, np.nan)
+    # Single trials have no variance to test against, e.g. every case of a --trials 1 run
+    tested = (n_a >= 2) & (n_b >= 2)
+    if not tested.any():
+        return p
+    mean_a, variance_a, n_a, mean_b, variance_b, n_b = (
+        v[tested] for v in (mean_a, variance_a, n_a, mean_b, variance_b, n_b)
+    )
+    with np.errstate(divide="ignore", invalid="ignore"):
+        se_a = variance_a / n_a
+        se_b = variance_b / n_b
+        se = se_a + se_b
+        delta = mean_b - mean_a
+        # Identical scores on both sides: no difference at all, or an unmistakable one
+        t = np.where(se > 0, delta / np.sqrt(se), np.where(delta == 0, 0.0, np.inf))
+        df = np.where(se > 0, se**2 / (se_a**2 / (n_a - 1) + se_b**2 / (n_b - 1)), n_a + n_b - 2)
+    p[tested] = t_test_p_value(t, df)
+    return p
+
+
+def benjamini_hochberg(p_values: np.ndarray) -> np.ndarray:
+    """False discovery rate adjusted p-values (q-values); NaN p-values stay NaN and are not counted."""
+    p_values = np.asarray(p_values, dtype=float)
+    q_values = np.full_like(p_values, np.nan)
+    tested = np.flatnonzero(~np.isnan(p_values))
+    if len(tested) == 0:
+        return q_values
+    order = tested[np.argsort(p_values[tested])]
+    ranked = p_values[order] * len(order) / np.arange(1, len(order) + 1)
+    # Enforce monotonicity from the largest p-value down
+    q_values[order] = np.minimum(np.minimum.accumulate(ranked[::-1])[::-1], 1.0)
+    return q_values
@@ -0,0 +1,67 @@
+"""
+Local stand-in for clay-cli.js, for exercising the harness without Node or a model.
+
+Speaks both clay interfaces:
+- per invocation: --state FILE --prompt TEXT --output FILE --model-name NAME
+- persistent:     --serve --model-name NAME, then one JSON request per stdin line
+  ({"id", "prompt", "state"}) answered by one JSON line on stdout ({"id", "state"} or {"id", "error"})
+
+The "edit" appends a text node holding the prompt. Prompts containing "fail" fail,
+and STUB_CLAY_DELAY sets a per-case delay in seconds.
+"""
+
+import argparse
+import os
+import sys
+import time
+from typing import Any
+
+import orjson
+
+
+def apply_prompt(state: dict[str, Any], prompt: str) -> dict[str, Any]:
+    time.sleep(float(os.getenv("STUB_CLAY_DELAY", "0.1")))
+    if "fail" in prompt:
+        raise RuntimeError(f"stub failure for prompt {prompt!r}")
+    nodes = list(state.get("nodes", []))
+    nodes.append({"id": f"stub-{len(nodes)}", "type": "text", "data": {"text": prompt}, "x": 0, "y": 0})
+    return {**state, "nodes": nodes}
+
+
+def serve() -> None:
+    for line in sys.stdin.buffer:
+        request = orjson.loads(line)
+        try:
+            response = {"id": request["id"], "state": apply_prompt(request["state"], request["prompt"])}
+        except Exception as e:
+            response = {"id": request["id"], "error": str(e)}
+        sys.stdout.buffer.write(orjson.dumps(response) + b"\n")
+        sys.stdout.buffer.flush()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Stub clay CLI")
+    parser.add_argument("--state")
+    parser.add_argument("--prompt")
+    parser.add_argument("--output")
+    parser.add_argument("--model-name")
+    parser.add_argument("--serve", action="store_true")
+    args = parser.parse_args()
+
+    if args.serve:
+        serve()
+        return
+
+    with open(args.state, "rb") as f:
+        state = orjson.loads(f.read())
+    try:
+        final_state = apply_prompt(state, args.prompt)
+    except RuntimeError as e:
+        print(e, file=sys.stderr)
+        sys.exit(1)
+    with open(args.output, "wb") as f:
+        f.write(orjson.dumps(final_state))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+import logging
+import math
+from datetime import datetime
+
+import numpy as np
+
+from .db import get_connection
+from .stats import RunStatistics, load_score_matrix, run_statistics
+
+logger = logging.getLogger(__name__)
+
+# Judge scores run from 0 to 3, each gets a count column
+SCORES = range(4)
+RUNTIME_PERCENTILES = (50, 90, 99)
+
+
+def _real(value: float) -> float | None:
+    return None if math.isnan(value) else value
+
+
+def update_run_summary(run_id: int) -> RunStatistics:
+    """
+    Recompute the run_summaries row of a run from its own measurements, found through the run_id index,
+    and return the run's score statistics.
+    """
+    with get_connection() as conn:
+        _, scores = load_score_matrix(conn, run_id)
+        statistics = run_statistics(scores)
+        score_counts = ", ".join(f"COALESCE(SUM(status != 'judge_error' AND score = {score}), 0)" for score in SCORES)
+        counts = conn.execute(
+            f"""
+            SELECT COUNT(*), {score_counts}, COALESCE(SUM(clay_runtime_seconds), 0),
+                COALESCE(SUM(status = 'clay_error'), 0), COALESCE(SUM(status = 'clay_timeout'), 0),
+                COALESCE(SUM(status = 'judge_error'), 0)
+            FROM measurements WHERE run_id = ?
+            """,
+            (run_id,),
+        ).fetchone()
+        rows = conn.execute("SELECT clay_runtime_seconds FROM measurements WHERE run_id = ?", (run_id,))
+        runtimes = np.array([runtime for (runtime,) in rows])
+        percentiles = (
+            np.percentile(runtimes, RUNTIME_PERCENTILES).tolist() if len(runtimes) else [None] * len(RUNTIME_PERCENTILES)
+        )
+        conn.execute(
+            """
+            INSERT OR REPLACE INTO run_summaries (
+                run_id, cases, measurements, score_mean, score_ci_low, score_ci_high, trial_variance,
+                score_0, score_1, score_2, score_3, clay_runtime_total,
+                clay_runtime_p50, clay_runtime_p90, clay_runtime_p99,
+                clay_errors, clay_timeouts, judge_errors, updated_at
+            )
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            (
+                run_id,
+                statistics.cases,
+                counts[0],
+                _real(statistics.mean),
+                _real(statistics.ci_low),
+                _real(statistics.ci_high),
+                _real(statistics.trial_variance),
+                *counts[1 : 1 + len(SCORES)],
+                counts[1 + len(SCORES)],
+                *percentiles,
+                *counts[2 + len(SCORES) :],
+                datetime.now().isoformat(),
+            ),
+        )
+    return statistics
+
+
+def summarize_runs(run_ids: list[int] | None = None) -> None:
+    """Recompute the summaries of the given runs, or summarize every finished run that has none yet."""
+    if run_ids is None:
+        with get_connection() as conn:
+            rows = conn.execute(
+                """
+                SELECT id FROM runs
+                WHERE COALESCE(status, 'complete') != 'running' AND id NOT IN (SELECT run_id FROM run_summaries)
+                ORDER BY id
+                """
+            ).fetchall()
+        run_ids = [run_id for (run_id,) in rows]
+    for run_id in run_ids:
+        update_run_summary(run_id)
+    logger.info(f"Summarized {len(run_ids)} runs")
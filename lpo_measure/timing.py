@@ -0,0 +1,44 @@
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Iterator
+
+# Enough of stderr to see the error clay died with
+STDERR_TAIL_CHARS = 2000
+
+
+@dataclass
+class MeasurementTimings:
+    """
+    Durations in seconds of the phases of one measurement, on a monotonic clock.
+    A phase that did not happen (e.g. judging a cached verdict) stays None.
+    """
+
+    spawn: float | None = None
+    first_output: float | None = None
+    exit: float | None = None
+    output_parse: float | None = None
+    judge_request: float | None = None
+    judge_parse: float | None = None
+    exit_code: int | None = None
+    stderr_tail: str | None = None
+    # Clay was killed for exceeding its wall-clock or idle-output timeout
+    timed_out: bool = False
+
+    def reset(self) -> None:
+        """Forget everything recorded so far, e.g. before retrying clay another way."""
+        for name, default in vars(MeasurementTimings()).items():
+            setattr(self, name, default)
+
+    def set_stderr(self, stderr: bytes) -> None:
+        self.stderr_tail = stderr[-STDERR_TAIL_CHARS:].decode(errors="replace")
+
+
+@contextmanager
+def span(timings: MeasurementTimings, phase: str) -> Iterator[None]:
+    """Record how long the block takes as the given phase, even when it raises."""
+    start_time = time.monotonic()
+    try:
+        yield
+    finally:
+        setattr(timings, phase, time.monotonic() - start_time)
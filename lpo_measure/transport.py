@@ -0,0 +1,131 @@
+import asyncio
+import functools
+import logging
+import os
+import tempfile
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+TRANSPORTS = ("file", "tmpfs", "pipe")
+DEFAULT_TRANSPORT = "file"
+# Memory-backed on Linux, so tmpfs exchange files never reach a disk
+MEMORY_DIR = "/dev/shm"
+
+
+@functools.cache
+def memory_dir() -> str | None:
+    """Directory for tmpfs exchange files, None for the default temp dir where there is no tmpfs."""
+    if os.path.isdir(MEMORY_DIR):
+        return MEMORY_DIR
+    logger.warning(f"{MEMORY_DIR} not found, tmpfs clay transport falls back to the default temp dir")
+    return None
+
+
+class FileExchange:
+    """
+    Hands clay its initial state and takes back its final state as files,
+    in a fresh temporary directory under directory, or the default temp dir.
+    """
+
+    stdin: int | None = None
+    pass_fds: tuple[int, ...] = ()
+
+    def __init__(self, state: bytes, directory: str | None = None):
+        self._dir = tempfile.TemporaryDirectory(prefix="clay-", dir=directory)
+        self.state_path = os.path.join(self._dir.name, "state.json")
+        self.output_path = os.path.join(self._dir.name, "output.json")
+        with open(self.state_path, "wb") as f:
+            f.write(state)
+
+    def spawned(self) -> None:
+        pass
+
+    async def transfer(self, proc: asyncio.subprocess.Process) -> None:
+        pass
+
+    def output(self) -> bytes:
+        """Final state as clay wrote it, empty if it wrote none."""
+        try:
+            with open(self.output_path, "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return b""
+
+    def close(self) -> None:
+        self._dir.cleanup()
+
+    def __enter__(self) -> "FileExchange":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+
+class PipeExchange(FileExchange):
+    """
+    Writes the initial state to clay's stdin and reads the final state from a pipe clay inherits,
+    so neither touches a file system. Clay is given them as /dev/stdin and /dev/fd/N, and keeps
+    stdout for its logs.
+    """
+
+    stdin = asyncio.subprocess.PIPE
+
+    def __init__(self, state: bytes):
+        self._state = state
+        self._output = b""
+        self._read_fd, self._write_fd = os.pipe()
+        self.state_path = "/dev/stdin"
+        self.output_path = f"/dev/fd/{self._write_fd}"
+        self.pass_fds = (self._write_fd,)
+
+    def spawned(self) -> None:
+        # Only clay holds the write end now, so the read end sees EOF once clay exits
+        os.close(self._write_fd)
+        self._write_fd = -1
+
+    async def _send(self, proc: asyncio.subprocess.Process) -> None:
+        assert proc.stdin is not None
+        try:
+            proc.stdin.write(self._state)
+            await proc.stdin.drain()
+        except (BrokenPipeError, ConnectionResetError):
+            # Clay exited without reading all of its state, its exit code tells why
+            pass
+        finally:
+            proc.stdin.close()
+
+    async def _receive(self) -> None:
+        reader = asyncio.StreamReader()
+        pipe = os.fdopen(self._read_fd, "rb", buffering=0)
+        self._read_fd = -1
+        transport, _ = await asyncio.get_running_loop().connect_read_pipe(
+            lambda: asyncio.StreamReaderProtocol(reader), pipe
+        )
+        try:
+            self._output = await reader.read()
+        finally:
+            transport.close()
+
+    async def transfer(self, proc: asyncio.subprocess.Process) -> None:
+        await asyncio.gather(self._send(proc), self._receive())
+
+    def output(self) -> bytes:
+        return self._output
+
+    def close(self) -> None:
+        for fd in (self._read_fd, self._write_fd):
+            if fd >= 0:
+                os.close(fd)
+        self._read_fd = self._write_fd = -1
+
+
+def open_exchange(transport: str, state: bytes) -> FileExchange:
+    """Set up the state exchange of one clay invocation over the given transport."""
+    if transport == "file":
+        return FileExchange(state)
+    if transport == "tmpfs":
+        return FileExchange(state, memory_dir())
+    if transport == "pipe":
+        return PipeExchange(state)
+    raise ValueError(f"Unknown clay transport: {transport}")
@@ -0,0 +1,129 @@
+import asyncio
+import collections
+from typing import Iterator
+
+from .stats import converged
+
+# Trials every case gets before its scores may count as converged
+MIN_TRIALS = 3
+# A case has converged once the confidence interval of its mean score is within ± this many points
+CONVERGENCE_HALF_WIDTH = 0.5
+
+
+class TrialScheduler:
+    """
+    Hands out (case id, trial) pairs to the workers measuring them. The first min_trials trials go out
+    round by round; a later trial of a case waits until the earlier ones are recorded, so trials of a
+    case whose scores have converged are skipped even when there is room to run every trial at once.
+    """
+
+    def __init__(
+        self,
+        case_ids: list[int],
+        trials: int,
+        measured: dict[int, dict[int, int | None]] | None = None,
+        min_trials: int = MIN_TRIALS,
+        half_width: float = CONVERGENCE_HALF_WIDTH,
+    ):
+        self._case_ids = case_ids
+        self._trials = trials
+        self._min_trials = min_trials
+        self._half_width = half_width
+        # Trials taken so far per case id, with their score, or None when it is not a real score
+        self._measured: dict[int, dict[int, int | None]] = {case_id: dict(t) for case_id, t in (measured or {}).items()}
+        # Trials left to run if no case converges early
+        self.planned = sum(
+            1 for case_id in case_ids for trial in range(trials) if trial not in self._measured.get(case_id, {})
+        )
+        # Trials skipped so far because their case had converged
+        self.converged = 0
+
+        self._early = self._early_trials()
+        # Per case, how many of its first min_trials trials have not been handed out, and the later trials left
+        self._early_left: dict[int, int] = collections.Counter()
+        self._later: dict[int, collections.deque[int]] = {}
+        for case_id in case_ids:
+            for trial in range(trials):
+                if trial in self._measured.get(case_id, {}):
+                    continue
+                if trial < min_trials:
+                    self._early_left[case_id] += 1
+                else:
+                    self._later.setdefault(case_id, collections.deque()).append(trial)
+        self._in_flight: dict[int, int] = collections.Counter()
+        self._running = 0
+        # Cases whose next later trial is due, in the order their earlier trials finished
+        self._released: collections.deque[int] = collections.deque()
+        for case_id in case_ids:
+            self._release_if_due(case_id)
+        self._changed = asyncio.Event()
+
+    @property
+    def expected(self) -> int:
+        """Trials expected to run, given the cases that have converged so far."""
+        return self.planned - self.converged
+
+    def record(self, case_id: int, trial: int, score: int | None) -> None:
+        """Account for a finished trial; judge errors are recorded with no score."""
+        self._measured.setdefault(case_id, {})[trial] = score
+        self._finished(case_id)
+
+    def drop(self, case_id: int, trial: int) -> None:
+        """Hand back a trial that will not be measured, e.g. once the run is over budget."""
+        self._finished(case_id)
+
+    def _finished(self, case_id: int) -> None:
+        self._in_flight[case_id] -= 1
+        self._running -= 1
+        self._release_if_due(case_id)
+        self._changed.set()
+
+    def _release_if_due(self, case_id: int) -> None:
+        if case_id in self._later and not self._early_left[case_id] and not self._in_flight[case_id]:
+            self._released.append(case_id)
+
+    def _converged(self, case_id: int) -> bool:
+        scores = [score for score in self._measured.get(case_id, {}).values() if score is not None]
+        return converged(scores, self._min_trials, self._half_width)
+
+    def _early_trials(self) -> Iterator[tuple[int, int]]:
+        for trial in range(min(self._trials, self._min_trials)):
+            for case_id in self._case_ids:
+                if trial not in self._measured.get(case_id, {}):
+                    yield case_id, trial
+
+    def _take(self) -> tuple[int, int] | None:
+        for case_id, trial in self._early:
+            self._early_left[case_id] -= 1
+            if self._trials > 1 and self._converged(case_id):
+                self.converged += 1
+                self._release_if_due(case_id)
+                continue
+            return self._hand_out(case_id, trial)
+        while self._released:
+            case_id = self._released.popleft()
+            later = self._later[case_id]
+            if self._converged(case_id):
+                self.converged += len(later)
+                del self._later[case_id]
+                continue
+            trial = later.popleft()
+            if not later:
+                del self._later[case_id]
+            return self._hand_out(case_id, trial)
+        return None
+
+    def _hand_out(self, case_id: int, trial: int) -> tuple[int, int]:
+        self._in_flight[case_id] += 1
+        self._running += 1
+        return case_id, trial
+
+    async def next_trial(self) -> tuple[int, int] | None:
+        """
+        The next trial to measure, waiting while the only ones left are held back for trials in flight.
+        None once every trial has been handed out or skipped.
+        """
+        while (due := self._take()) is None and self._running:
+            self._changed.clear()
+            await self._changed.wait()
+        return due
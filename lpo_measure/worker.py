@@ -1,18 +1,21 @@
 import logging
+import os
+import signal
+from dataclasses import replace
 
 from .case import Case, CaseMeasurement
 from .clay import run_case
+from .log import setup_logging
 from .run import BenchmarkRun
 
 logger = logging.getLogger(__name__)
 
+# The run this worker process measures for, sent once by init_worker rather than with every case
+_run: BenchmarkRun | None = None
 
-def run_case_and_save(case: Case, run: BenchmarkRun) -> CaseMeasurement:
-    """Load a case, run it, save the measurement, and return the measurement."""
-    measurement = run_case(case, run)
-    if run.id is None:
-        raise ValueError("BenchmarkRun must have an id to save measurements.")
-    measurement.save_to_db(run.id)
+
+def log_measurement(measurement: CaseMeasurement) -> None:
+    """Log the score of a measurement in color."""
     # Color mapping for scores
     colors = {
         0: "\033[91m",
@@ -25,6 +28,31 @@ def run_case_and_save(case: Case, run: BenchmarkRun) -> CaseMeasurement:
 
     score_color = colors.get(measurement.result.score, "")
     logger.info(
-        f"✨ Instruction '{bold}{case.instruction}{reset_color}' scored {bold}{score_color}{measurement.result.score}{reset_color} because '{measurement.result.reason}'\n"
+        f"✨ Instruction '{bold}{measurement.case.instruction}{reset_color}' scored {bold}{score_color}{measurement.result.score}{reset_color} because '{measurement.result.reason}'\n"
     )
-    return measurement
+
+
+def init_worker(run: BenchmarkRun) -> None:
+    """Set up a worker process for a run, making SIGTERM interrupt it like Ctrl-C so clay gets cleaned up."""
+    global _run
+    _run = run
+    setup_logging()
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+
+
+def run_case_and_log(case_id: int) -> CaseMeasurement:
+    """
+    Load a case, run it and log the measurement, leaving saving it to the single writer in the parent.
+    The case's initial state is not sent back, the parent only needs its id.
+    """
+    if _run is None:
+        raise RuntimeError("Worker was not initialized with a run.")
+    case = Case.load_from_db(case_id)
+    try:
+        measurement = run_case(case, _run)
+    except KeyboardInterrupt:
+        # Clay has been terminated by now, leave the pool instead of taking the next case
+        os._exit(1)
+    log_measurement(measurement)
+    return replace(measurement, case=replace(case, initial_state={}))
+
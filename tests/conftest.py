@@ -0,0 +1,64 @@
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Callable
+
+import orjson
+import pytest
+
+from lpo_measure import db, judge, judge_client, timing
+from lpo_measure.run import JudgeConfig
+
+
+@pytest.fixture
+def temp_db(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    """Point the process's connection at an empty database file of the test's own."""
+    path = tmp_path / "measurements.db"
+    db.close_connection()
+    monkeypatch.setattr(db, "SQLITE_PATH", path)
+    yield path
+    db.close_connection()
+
+
+@pytest.fixture
+def use_db(monkeypatch: pytest.MonkeyPatch) -> Callable[[Path], None]:
+    """Switch the process's connection to a database file, migrated, as a command run against it would."""
+
+    def use(path: Path) -> None:
+        db.close_connection()
+        monkeypatch.setattr(db, "SQLITE_PATH", path)
+        db.migrate()
+
+    yield use
+    db.close_connection()
+
+
+class StubJudge:
+    """Stands in for judge_client: answers each model with a fixed verdict and advances a fake clock."""
+
+    def __init__(self, monkeypatch: pytest.MonkeyPatch, verdicts: dict[str, dict[str, Any]], seconds: float = 1.0):
+        self.verdicts = verdicts
+        self.seconds = seconds
+        self.models: list[str] = []
+        self.prompts: list[str] = []
+        self.now = 0.0
+        monkeypatch.setattr(judge_client, "complete", self.complete)
+        monkeypatch.setattr(judge_client, "complete_async", self.complete_async)
+        monkeypatch.setattr(judge, "response_usage", lambda response: (100, 10, 0.01))
+        # Only span's clock is faked, not the time module asyncio runs on
+        monkeypatch.setattr(timing, "time", SimpleNamespace(monotonic=lambda: self.now))
+
+    def complete(self, config: JudgeConfig, **kwargs: Any) -> Any:
+        self.models.append(config.model)
+        self.prompts.append(kwargs["messages"][1]["content"])
+        self.now += self.seconds
+        message = SimpleNamespace(content=orjson.dumps(self.verdicts[config.model]).decode())
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+    async def complete_async(self, config: JudgeConfig, **kwargs: Any) -> Any:
+        return self.complete(config, **kwargs)
+
+
+@pytest.fixture
+def stub_judge(monkeypatch: pytest.MonkeyPatch) -> Callable[..., StubJudge]:
+    """Replace judge_client with a StubJudge answering each model with the given verdict."""
+    return lambda verdicts, seconds=1.0: StubJudge(monkeypatch, verdicts, seconds)
@@ -0,0 +1,59 @@
+import asyncio
+from types import SimpleNamespace
+from typing import Any
+
+import orjson
+import pytest
+
+from lpo_measure import batch_judge, db, judge, judge_client
+from lpo_measure.batch_judge import BatchItem, judge_batch_async
+from lpo_measure.run import JudgeConfig
+from lpo_measure.timing import MeasurementTimings
+
+
+def response(content: dict[str, Any]) -> Any:
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=orjson.dumps(content).decode()))])
+
+
+@pytest.fixture
+def batch_response(temp_db, monkeypatch):
+    """Answer batch requests with the given entries and single-case requests with score 1, 10 + 1 tokens each."""
+    db.migrate()
+    entries: list[dict[str, Any]] = []
+
+    async def complete_async(config: JudgeConfig, **kwargs: Any) -> Any:
+        if kwargs["messages"][0]["content"] == batch_judge.BATCH_SYSTEM_PROMPT:
+            return response({"results": entries})
+        return response({"score": 1, "reason": "alone"})
+
+    def usage(answer: Any) -> tuple[int, int, float]:
+        if "results" in answer.choices[0].message.content:
+            return 100, 20, 0.3
+        return 10, 1, 0.01
+
+    monkeypatch.setattr(judge_client, "complete_async", complete_async)
+    monkeypatch.setattr(batch_judge, "response_usage", usage)
+    monkeypatch.setattr(judge, "response_usage", usage)
+    return entries
+
+
+def items(count: int) -> list[BatchItem]:
+    state = {"nodes": [{"id": "a", "type": "text"}], "edges": []}
+    return [BatchItem(f"instruction {n}", state, MeasurementTimings()) for n in range(count)]
+
+
+def test_batch_usage_adds_up_to_the_request(batch_response):
+    batch_response.extend({"case": number, "score": 3, "reason": "done"} for number in (1, 2, 3))
+    results = asyncio.run(judge_batch_async(items(3), JudgeConfig(use_cache=False)))
+    assert [result.prompt_tokens for result in results] == [34, 33, 33]
+    assert [result.completion_tokens for result in results] == [8, 6, 6]
+    assert sum(result.cost for result in results) == pytest.approx(0.3)
+
+
+def test_cases_judged_again_carry_their_own_usage(batch_response):
+    # Case 2 is left out of the response, so the batch request is charged to cases 1 and 3
+    batch_response.extend({"case": number, "score": 3, "reason": "done"} for number in (1, 3))
+    results = asyncio.run(judge_batch_async(items(3), JudgeConfig(use_cache=False)))
+    assert [result.score for result in results] == [3, 1, 3]
+    assert [result.prompt_tokens for result in results] == [50, 10, 50]
+    assert [result.completion_tokens for result in results] == [10, 1, 10]
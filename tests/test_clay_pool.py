@@ -0,0 +1,64 @@
+import asyncio
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+
+from lpo_measure import stub_clay
+from lpo_measure.case import Case
+from lpo_measure.clay_pool import ClayPool
+from lpo_measure.run import BenchmarkRun
+from lpo_measure.timing import MeasurementTimings
+
+# Accepts --serve and then never answers, but runs cases spawned one at a time like the stub
+HANGING_SERVER = f"""
+import sys, time
+sys.path.insert(0, {str(Path(stub_clay.__file__).parent.parent)!r})
+if "--serve" in sys.argv:
+    time.sleep(3600)
+from lpo_measure.stub_clay import main
+main()
+"""
+
+
+def benchmark_run(script_path: str) -> BenchmarkRun:
+    return BenchmarkRun(script_path, "abc123", "change", "model", datetime.now(), "def456", clay_timeout=2.0)
+
+
+def case(instruction: str) -> Case:
+    return Case(id=1, hash=instruction, instruction=instruction, initial_state={"nodes": [], "edges": []})
+
+
+async def run_cases(run: BenchmarkRun, instructions: list[str]) -> list[tuple[dict | None, MeasurementTimings]]:
+    pool = ClayPool(run, size=1)
+    results = []
+    try:
+        for instruction in instructions:
+            timings = MeasurementTimings()
+            final_state, _ = await pool.run_clay(case(instruction), timings)
+            results.append((final_state, timings))
+    finally:
+        await pool.close()
+    return results
+
+
+@pytest.fixture(autouse=True)
+def no_stub_delay(monkeypatch):
+    monkeypatch.setenv("STUB_CLAY_DELAY", "0")
+
+
+def test_served_case_records_the_round_trip_as_exit():
+    [(final_state, timings)] = asyncio.run(run_cases(benchmark_run(stub_clay.__file__), ["say hi"]))
+    assert "say hi" in final_state["nodes"][0]["data"]["text"]
+    assert timings.spawn is not None and timings.exit is not None
+    assert timings.first_output is None
+
+
+def test_script_hanging_before_its_first_answer_falls_back_to_spawning(tmp_path):
+    script = tmp_path / "hanging_clay.py"
+    script.write_text(HANGING_SERVER)
+    results = asyncio.run(run_cases(benchmark_run(str(script)), ["say hi", "say bye"]))
+    assert [final_state is not None for final_state, _ in results] == [True, True]
+    # Spawned clay, not a timed out process
+    assert [timings.timed_out for _, timings in results] == [False, False]
+    assert all(timings.exit_code == 0 for _, timings in results)
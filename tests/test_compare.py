@@ -0,0 +1,82 @@
+import pytest
+
+from lpo_measure import db
+from lpo_measure.compare import compare_runs, resolve_runs
+
+
+@pytest.fixture
+def runs(temp_db):
+    """Insert runs of a clay commit, each with the given scores per case id; returns a function doing so."""
+    db.migrate()
+    conn = db.get_connection()
+    conn.executemany(
+        "INSERT INTO cases (hash, instruction, initial_state) VALUES (?, ?, '{}')",
+        [(f"h{case_id}", f"case {case_id}") for case_id in (1, 2, 3)],
+    )
+
+    def insert(sha: str, scores: dict[int, list[int]]) -> int:
+        cursor = conn.execute(
+            """
+            INSERT INTO runs (timestamp, clay_commit_sha, clay_commit_message, benchmark_commit_sha, model, status)
+            VALUES ('2025-01-01T00:00:00', ?, 'change', 'def', 'model', 'complete')
+            """,
+            (sha,),
+        )
+        run_id = cursor.lastrowid
+        conn.executemany(
+            """
+            INSERT INTO measurements (
+                run_id, case_id, final_state, score, reason, clay_runtime_seconds, judge_runtime_seconds, trial
+            )
+            VALUES (?, ?, '', ?, 'reason', 1.0, 1.0, ?)
+            """,
+            [
+                (run_id, case_id, score, trial)
+                for case_id, case_scores in scores.items()
+                for trial, score in enumerate(case_scores)
+            ],
+        )
+        conn.commit()
+        return run_id
+
+    return insert
+
+
+def test_single_trial_drops_regress(runs):
+    base = runs("aaaaaaa", {1: [3], 2: [3], 3: [3]})
+    head = runs("bbbbbbb", {1: [0], 2: [0], 3: [3]})
+    comparison = compare_runs(str(base), str(head))
+    # Three cases are too few for the paired t-test to call it, the per-case drops are what flags it
+    assert comparison.score_p_value > 0.05
+    assert comparison.untested.all()
+    assert comparison.regressions.tolist() == [True, True, False]
+    assert comparison.regressed
+
+
+def test_single_trial_drops_below_the_threshold_do_not_regress(runs):
+    base = runs("aaaaaaa", {1: [3], 2: [3], 3: [3]})
+    head = runs("bbbbbbb", {1: [2], 2: [3], 3: [3]})
+    assert not compare_runs(str(base), str(head)).regressed
+    assert compare_runs(str(base), str(head), max_drop=1).regressed
+
+
+def test_repeated_trials_are_t_tested(runs):
+    base = runs("aaaaaaa", {1: [3, 3, 2, 3], 2: [1, 2, 1, 2]})
+    head = runs("bbbbbbb", {1: [0, 0, 1, 0], 2: [1, 1, 2, 2]})
+    comparison = compare_runs(str(base), str(head))
+    assert not comparison.untested.any()
+    assert comparison.regressions.tolist() == [True, False]
+
+
+def test_digit_only_sha_resolves_as_a_commit(runs):
+    runs("aaaaaaa", {1: [3]})
+    sha_run = runs("1234567abc", {1: [3]})
+    conn = db.get_connection()
+    assert resolve_runs(conn, "1234567") == [sha_run]
+    # Short references are run ids, and long ones fall back to run ids when no commit matches
+    assert resolve_runs(conn, "1") == [1]
+    conn.execute("UPDATE runs SET id = 7654321 WHERE id = 1")
+    conn.commit()
+    assert resolve_runs(conn, "7654321") == [7654321]
+    with pytest.raises(ValueError, match="No run"):
+        resolve_runs(conn, "deadbeef")
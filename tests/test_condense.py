@@ -0,0 +1,27 @@
+import orjson
+
+from lpo_measure import condense
+
+STATE = {
+    "nodes": [{"id": "a", "width": 100.4, "position": {"x": 1.6, "y": 2.2}}, {"id": "b"}],
+    "edges": [
+        {"id": "e1", "source": "a", "target": "b"},
+        {"id": "e2", "source": "a", "target": "b", "sourceHandle": "right"},
+    ],
+}
+
+
+def test_compact_profile_condenses_nodes_and_edges():
+    state = orjson.loads(condense.serialize(STATE, condense.PROFILES["compact"]))
+    assert state["nodes"][0] == {"id": "a", "position": {"x": 2, "y": 2}}
+    assert state["edges"] == {"a": ["b", {"target": "b", "sourceHandle": "right"}]}
+
+
+def test_full_profile_is_the_state_as_written():
+    assert orjson.loads(condense.serialize(STATE, condense.PROFILES["full"])) == STATE
+
+
+def test_adjacency_keys_edges_without_a_string_source():
+    state = {"nodes": [], "edges": [{"target": "b"}, {"source": 1, "target": "b"}, {"source": None, "target": "c"}]}
+    edges = orjson.loads(condense.serialize(state, condense.PROFILES["compact"]))["edges"]
+    assert edges == {"null": ["b", "c"], "1": ["b"]}
@@ -0,0 +1,104 @@
+import sqlite3
+
+import orjson
+import pytest
+
+from lpo_measure import blobs, db
+from lpo_measure.case import Case, CaseMeasurement, CaseResult
+
+STATE = {"nodes": [{"id": "a", "type": "text"}], "edges": []}
+
+
+@pytest.fixture
+def v0_db(temp_db):
+    """A database as written before schema versions: the original three tables, one run with two measurements."""
+    conn = sqlite3.connect(temp_db)
+    conn.executescript(
+        """
+        CREATE TABLE cases (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            hash TEXT NOT NULL UNIQUE,
+            instruction TEXT NOT NULL,
+            initial_state TEXT NOT NULL
+        );
+        CREATE TABLE runs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp TEXT NOT NULL,
+            clay_commit_sha TEXT NOT NULL,
+            clay_commit_message TEXT NOT NULL,
+            benchmark_commit_sha TEXT NOT NULL,
+            model TEXT NOT NULL
+        );
+        CREATE TABLE measurements (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            run_id INTEGER NOT NULL,
+            case_id INTEGER NOT NULL,
+            final_state TEXT NOT NULL,
+            score INTEGER NOT NULL,
+            reason TEXT NOT NULL,
+            clay_runtime_seconds REAL NOT NULL,
+            judge_runtime_seconds REAL NOT NULL,
+            FOREIGN KEY (run_id) REFERENCES runs (id),
+            FOREIGN KEY (case_id) REFERENCES cases (id)
+        );
+        INSERT INTO cases (hash, instruction, initial_state) VALUES ('h1', 'add a node', '{}');
+        INSERT INTO runs (timestamp, clay_commit_sha, clay_commit_message, benchmark_commit_sha, model)
+            VALUES ('2025-01-01T00:00:00', 'abc', 'change', 'def', 'model');
+        """
+    )
+    conn.executemany(
+        "INSERT INTO measurements (run_id, case_id, final_state, score, reason, clay_runtime_seconds, "
+        "judge_runtime_seconds) VALUES (1, 1, ?, ?, 'reason', 1.0, 1.0)",
+        [(orjson.dumps(STATE).decode(), 3), ("{}", 0)],
+    )
+    conn.commit()
+    conn.close()
+    return temp_db
+
+
+def columns(conn: sqlite3.Connection, table: str) -> set[str]:
+    return {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+
+
+def test_migrate_upgrades_a_v0_database(v0_db):
+    assert db.migrate() == len(db.MIGRATIONS)
+
+    conn = db.get_connection()
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == len(db.MIGRATIONS)
+    assert {"status", "trials", "shard_count", "judge_config"} <= columns(conn, "runs")
+    assert {"final_state_blob_id", "status", "trial", "judge_tier"} <= columns(conn, "measurements")
+    assert {"run_summaries", "judge_cache", "state_blobs", "measurement_timings"} <= {
+        row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")
+    }
+    # Inline final states move to state_blobs, and a missing state marks a clay error
+    assert blobs.load_final_state(conn, 1) == STATE
+    assert conn.execute("SELECT final_state FROM measurements WHERE id = 1").fetchone() == ("",)
+    assert conn.execute("SELECT status FROM measurements WHERE id = 2").fetchone() == ("clay_error",)
+
+
+def test_migrate_is_a_no_op_when_up_to_date(v0_db):
+    db.migrate()
+    assert db.migrate() == 0
+
+
+def test_migrate_refuses_a_newer_database(temp_db):
+    conn = sqlite3.connect(temp_db)
+    conn.execute(f"PRAGMA user_version = {len(db.MIGRATIONS) + 1}")
+    conn.close()
+    with pytest.raises(RuntimeError, match="newer"):
+        db.migrate()
+
+
+@pytest.mark.parametrize("final_state", [STATE, {}, None])
+def test_measurement_final_state_round_trips(temp_db, final_state):
+    db.migrate()
+    case = Case.get_or_create("add a node", {"nodes": [], "edges": []})
+    measurement = CaseMeasurement.create(case, final_state, CaseResult(score=0, reason="reason"), 1.0, 1.0)
+    conn = db.get_connection()
+    cursor = conn.cursor()
+    measurement.insert(cursor, run_id=1)
+    conn.commit()
+    # An empty canvas is a final state clay produced, not a clay error
+    measurement_id, status = conn.execute("SELECT id, status FROM measurements").fetchone()
+    assert blobs.load_final_state(conn, measurement_id) == final_state
+    assert status == ("clay_error" if final_state is None else "ok")
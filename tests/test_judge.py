@@ -0,0 +1,97 @@
+import asyncio
+from typing import Any
+
+import pytest
+
+from lpo_measure import db, judge, rules
+from lpo_measure.run import JudgeConfig
+from lpo_measure.timing import MeasurementTimings
+
+STATE = {"nodes": [{"id": "a", "type": "text", "data": {"text": "hello"}}], "edges": []}
+INITIAL = {"nodes": [], "edges": []}
+ALL_RULES = tuple(rules.RULES)
+
+
+@pytest.fixture
+def judge_db(temp_db):
+    db.migrate()
+    return temp_db
+
+
+@pytest.fixture(params=["sync", "async"])
+def judge_case(request):
+    """Both entry points, which must judge alike."""
+    if request.param == "sync":
+        return judge.judge_instruction_achieved
+    return lambda *args, **kwargs: asyncio.run(judge.judge_instruction_achieved_async(*args, **kwargs))
+
+
+def cascade(**kwargs: Any) -> JudgeConfig:
+    return JudgeConfig(model="strong", cascade_model="cheap", **kwargs)
+
+
+def test_rules_settle_unchanged_canvas_without_a_model(judge_db, judge_case, stub_judge):
+    stub = stub_judge({})
+    result = judge_case("add a node", INITIAL, cascade(rules=ALL_RULES), initial_state=INITIAL)
+    assert (result.score, result.judge_tier) == (0, "rules")
+    assert stub.models == []
+
+
+def test_rule_facts_reach_the_prompt(judge_db, judge_case, stub_judge):
+    stub = stub_judge({"strong": {"score": 3, "reason": "done"}})
+    judge_case("add a node", STATE, JudgeConfig(model="strong", rules=ALL_RULES), initial_state=INITIAL)
+    assert "Structural facts checked before judging" in stub.prompts[0]
+    assert "1 nodes added" in stub.prompts[0]
+
+
+def test_rules_are_opt_in(judge_db, judge_case, stub_judge):
+    # Doing nothing may be right, without rules the judge decides
+    stub = stub_judge({"strong": {"score": 3, "reason": "nothing to do"}})
+    result = judge_case("leave the canvas as is", INITIAL, JudgeConfig(model="strong"), initial_state=INITIAL)
+    assert (result.score, result.judge_tier) == (3, "strong")
+    assert "Structural facts" not in stub.prompts[0]
+    assert '"rules":[]' in JudgeConfig().verdict_settings()
+
+
+def test_confident_cheap_verdict_is_kept(judge_db, judge_case, stub_judge):
+    stub = stub_judge({"cheap": {"score": 3, "confidence": 0.95, "reason": "done"}})
+    timings = MeasurementTimings()
+    result = judge_case("add a node", STATE, cascade(), timings)
+    assert (result.score, result.judge_tier, result.confidence) == (3, "cheap", 0.95)
+    assert stub.models == ["cheap"]
+    assert timings.judge_request == pytest.approx(1.0)
+
+
+@pytest.mark.parametrize("verdict", [{"score": 3, "confidence": 0.5}, {"score": 2, "confidence": 0.95}, {"score": 3}])
+def test_unsure_or_borderline_cheap_verdict_escalates(judge_db, judge_case, stub_judge, verdict):
+    stub = stub_judge({"cheap": {**verdict, "reason": "?"}, "strong": {"score": 1, "reason": "no"}})
+    timings = MeasurementTimings()
+    result = judge_case("add a node", STATE, cascade(), timings)
+    assert (result.score, result.judge_tier) == (1, "strong")
+    assert stub.models == ["cheap", "strong"]
+    # Both tiers' usage and request time are charged to the case
+    assert (result.prompt_tokens, result.completion_tokens) == (200, 20)
+    assert result.cost == pytest.approx(0.02)
+    assert timings.judge_request == pytest.approx(2.0)
+
+
+def test_cached_strong_verdict_charges_only_the_cheap_request(judge_db, judge_case, stub_judge):
+    verdicts = {"cheap": {"score": 2, "confidence": 0.9, "reason": "?"}, "strong": {"score": 3, "reason": "done"}}
+    stub = stub_judge(verdicts)
+    judge_case("add a node", STATE, JudgeConfig(model="strong"))
+    stub.models.clear()
+
+    timings = MeasurementTimings()
+    result = judge_case("add a node", STATE, cascade(), timings)
+    assert (result.cached, result.judge_tier) == (True, "strong")
+    assert stub.models == ["cheap"]
+    assert timings.judge_request == pytest.approx(1.0)
+
+
+def test_judge_errors_escalate_and_are_reported(judge_db, judge_case, stub_judge):
+    stub = stub_judge({"strong": {"score": 2, "reason": "ok"}})
+    timings = MeasurementTimings()
+    result = judge_case("add a node", STATE, cascade(), timings)
+    # The cheap model has no verdict in the stub, the KeyError is its judge error
+    assert (result.score, result.judge_tier, result.judge_error) == (2, "strong", False)
+    assert stub.models == ["cheap", "strong"]
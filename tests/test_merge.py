@@ -0,0 +1,81 @@
+from pathlib import Path
+
+import pytest
+
+from lpo_measure import db, stub_clay
+from lpo_measure.__main__ import run_all_cases
+from lpo_measure.case import Case
+from lpo_measure.merge import merge_shards
+from lpo_measure.run import JudgeConfig
+
+INSTRUCTIONS = [f"add a node saying {word}" for word in ("one", "two", "three", "four", "five", "six")]
+
+
+@pytest.fixture
+def shard_run(use_db, stub_judge, monkeypatch):
+    """Run one shard of the cases with the stub clay and judge into its own database."""
+    monkeypatch.setenv("STUB_CLAY_DELAY", "0")
+    stub_judge({"strong": {"score": 3, "reason": "done"}}, seconds=0)
+
+    def run(path: Path, shard: int, shard_count: int = 2, model: str = "model") -> None:
+        use_db(path)
+        Case.bulk_create((instruction, None) for instruction in INSTRUCTIONS)
+        run_all_cases(
+            stub_clay.__file__, "abc123", "change", model, judge=JudgeConfig(model="strong"), shard=(shard, shard_count)
+        )
+
+    return run
+
+
+def test_merge_folds_shards_into_one_complete_run(tmp_path, use_db, shard_run):
+    shards = [tmp_path / "shard-1.db", tmp_path / "shard-2.db"]
+    for index, path in enumerate(shards, 1):
+        shard_run(path, index)
+
+    use_db(tmp_path / "prod.db")
+    run_id = merge_shards(shards)
+
+    conn = db.get_connection()
+    status, judge_config = conn.execute("SELECT status, judge_config FROM runs WHERE id = ?", (run_id,)).fetchone()
+    assert status == "complete"
+    assert '"model":"strong"' in judge_config
+    instructions = [
+        row[0]
+        for row in conn.execute(
+            "SELECT c.instruction FROM measurements m JOIN cases c ON c.id = m.case_id WHERE m.run_id = ?", (run_id,)
+        )
+    ]
+    assert sorted(instructions) == sorted(INSTRUCTIONS)
+    assert conn.execute("SELECT score_mean FROM run_summaries WHERE run_id = ?", (run_id,)).fetchone() == (3.0,)
+
+
+def test_merge_counts_shards_without_cases(tmp_path, use_db, shard_run):
+    # More shards than cases, so some shards have nothing to measure
+    shards = [tmp_path / f"shard-{index}.db" for index in range(1, 9)]
+    for index, path in enumerate(shards, 1):
+        shard_run(path, index, shard_count=len(shards))
+
+    use_db(tmp_path / "prod.db")
+    run_id = merge_shards(shards)
+
+    conn = db.get_connection()
+    assert conn.execute("SELECT status FROM runs WHERE id = ?", (run_id,)).fetchone() == ("complete",)
+    assert conn.execute("SELECT COUNT(*) FROM measurements WHERE run_id = ?", (run_id,)).fetchone() == (len(INSTRUCTIONS),)
+
+
+def test_merge_without_every_shard_is_partial(tmp_path, use_db, shard_run):
+    shard_run(tmp_path / "shard-1.db", 1)
+
+    use_db(tmp_path / "prod.db")
+    run_id = merge_shards([tmp_path / "shard-1.db"])
+
+    assert db.get_connection().execute("SELECT status FROM runs WHERE id = ?", (run_id,)).fetchone() == ("partial",)
+
+
+def test_merge_rejects_shards_of_different_runs(tmp_path, use_db, shard_run):
+    shard_run(tmp_path / "shard-1.db", 1)
+    shard_run(tmp_path / "shard-2.db", 2, model="other")
+
+    use_db(tmp_path / "prod.db")
+    with pytest.raises(ValueError, match="model"):
+        merge_shards([tmp_path / "shard-1.db", tmp_path / "shard-2.db"])
@@ -0,0 +1,55 @@
+import pytest
+
+from lpo_measure import batch_judge, db, stub_clay
+from lpo_measure.__main__ import run_all_cases
+from lpo_measure.case import Case
+from lpo_measure.run import JudgeConfig
+
+INSTRUCTIONS = ["add a node saying one", "add a node saying two", "add a bad node"]
+
+
+@pytest.fixture
+def stub_run(temp_db, stub_judge, monkeypatch):
+    monkeypatch.setenv("STUB_CLAY_DELAY", "0")
+    db.migrate()
+    Case.bulk_create((instruction, None) for instruction in INSTRUCTIONS)
+    return stub_judge({"strong": {"score": 3, "reason": "done"}}, seconds=0)
+
+
+def test_batch_worker_judges_a_case_it_cannot_size_alone(stub_run, monkeypatch):
+    def failing_tokens(item, config):
+        if "bad" in item.instruction:
+            raise TypeError("unsizable state")
+        return 100
+
+    monkeypatch.setattr(batch_judge.BatchItem, "tokens", failing_tokens)
+    run_all_cases(
+        stub_clay.__file__, "abc123", "change", "model", judge=JudgeConfig(model="strong"), judge_batch_tokens=100_000
+    )
+
+    conn = db.get_connection()
+    assert conn.execute("SELECT status FROM runs").fetchone() == ("complete",)
+    assert conn.execute("SELECT COUNT(*), MIN(score) FROM measurements").fetchone() == (3, 3)
+
+
+def test_trials_stop_once_scores_converge(stub_run):
+    # Far more clay workers than trials, the case the scheduler must still hold later trials back for
+    run_all_cases(stub_clay.__file__, "abc123", "change", "model", judge=JudgeConfig(model="strong"), trials=5)
+
+    counts = db.get_connection().execute("SELECT COUNT(*) FROM measurements GROUP BY case_id").fetchall()
+    assert counts == [(3,), (3,), (3,)]
+
+
+def test_reuse_skips_failed_measurements(stub_run):
+    judge = JudgeConfig(model="strong")
+    run_all_cases(stub_clay.__file__, "abc123", "change", "model", judge=judge)
+    conn = db.get_connection()
+    conn.execute("UPDATE measurements SET status = 'clay_error' WHERE case_id = 1")
+    conn.execute("UPDATE measurements SET status = 'clay_timeout' WHERE case_id = 2")
+    conn.commit()
+
+    run_all_cases(stub_clay.__file__, "abc123", "change", "model", judge=judge)
+    conn = db.get_connection()
+    reused = conn.execute("SELECT case_id FROM measurements WHERE run_id = 2 AND reused_from IS NOT NULL").fetchall()
+    assert reused == [(3,)]
+    assert conn.execute("SELECT COUNT(*) FROM measurements WHERE run_id = 2").fetchone() == (3,)
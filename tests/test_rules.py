@@ -0,0 +1,46 @@
+from lpo_measure import rules
+
+
+def node(text: str, **fields) -> dict:
+    return {"type": "text", "data": {"text": text}, **fields}
+
+
+def test_structure_counts_and_diffs_nodes_by_id():
+    initial = {"nodes": [node("a", id="1"), node("b", id="2")], "edges": []}
+    final = {"nodes": [node("a", id="1"), node("B", id="2"), node("c", id="3")], "edges": [{"source": "1", "target": "3"}]}
+    facts = rules.structure(initial, final).facts
+    assert facts == [
+        "The final canvas has 3 nodes and 1 edges.",
+        "Against the initial canvas: 1 nodes added, 0 removed, 1 changed; 1 edges added, 0 removed.",
+    ]
+
+
+def test_structure_counts_items_without_ids():
+    initial = {"nodes": [node("a"), node("b")], "edges": []}
+    # Two identical id-less nodes are two nodes, and id-less edges between the same nodes are two edges
+    final = {
+        "nodes": [node("a"), node("b"), node("c"), node("c")],
+        "edges": [{"source": "x", "target": "y"}, {"source": "x", "target": "y", "label": "twice"}],
+    }
+    facts = rules.structure(initial, final).facts
+    assert facts == [
+        "The final canvas has 4 nodes and 2 edges.",
+        "Against the initial canvas: 2 nodes added, 0 removed, 0 changed; 2 edges added, 0 removed.",
+    ]
+
+
+def test_structure_sees_removed_items_without_ids():
+    initial = {"nodes": [node("a"), node("b"), node("b")], "edges": []}
+    final = {"nodes": [node("b")], "edges": []}
+    assert rules.structure(initial, final).facts[1].startswith("Against the initial canvas: 0 nodes added, 2 removed")
+
+
+def test_dangling_edges_ignore_id_less_nodes():
+    final = {"nodes": [node("a"), node("b", id="b")], "edges": [{"source": "b", "target": "b"}, {"source": None}]}
+    assert rules.dangling_edges(None, final).facts == ["1 edges reference nodes that do not exist: None->None."]
+
+
+def test_unchanged_only_for_identical_states():
+    initial = {"nodes": [node("a")], "edges": []}
+    assert rules.unchanged(initial, {"nodes": [node("a")], "edges": []}).verdict.score == 0
+    assert rules.unchanged(initial, {"nodes": [node("a"), node("a")], "edges": []}) is None
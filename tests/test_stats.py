@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+from lpo_measure.stats import benjamini_hochberg, t_test_p_value, welch_t_test
+
+
+def test_t_test_p_value_matches_reference():
+    # Two-sided p of t = 2 with 10 degrees of freedom, by numerical integration of the t density
+    assert t_test_p_value(np.array([2.0]), np.array([10.0]))[0] == pytest.approx(0.07339, abs=1e-4)
+
+
+def test_t_test_p_value_is_nan_without_degrees_of_freedom():
+    p = t_test_p_value(np.array([2.0, 2.0]), np.array([0.0, 10.0]))
+    assert np.isnan(p[0])
+    assert p[1] == pytest.approx(0.07339, abs=1e-4)
+
+
+def test_welch_t_test_single_trials_are_not_tested():
+    # Every case of a --trials 1 run has one sample per side
+    p = welch_t_test(
+        mean_a=np.array([1.0, 2.0]),
+        variance_a=np.array([0.0, 0.0]),
+        n_a=np.array([1, 1]),
+        mean_b=np.array([2.0, 2.0]),
+        variance_b=np.array([0.0, 0.0]),
+        n_b=np.array([1, 1]),
+    )
+    assert np.isnan(p).all()
+
+
+def test_welch_t_test_mixed_sample_sizes():
+    p = welch_t_test(
+        mean_a=np.array([1.0, 1.0, 2.0]),
+        variance_a=np.array([0.5, 0.0, 0.0]),
+        n_a=np.array([5, 1, 3]),
+        mean_b=np.array([2.0, 3.0, 2.0]),
+        variance_b=np.array([0.5, 0.0, 0.0]),
+        n_b=np.array([5, 4, 3]),
+    )
+    assert 0 < p[0] < 0.1
+    assert np.isnan(p[1])
+    # Identical scores on both sides are no difference at all
+    assert p[2] == pytest.approx(1.0)
+
+
+def test_benjamini_hochberg_adjusts_and_skips_nan():
+    q = benjamini_hochberg(np.array([0.01, np.nan, 0.04, 0.03]))
+    assert np.isnan(q[1])
+    np.testing.assert_allclose(q[[0, 2, 3]], [0.03, 0.04, 0.04])
+
+
+def test_benjamini_hochberg_without_tests():
+    assert np.isnan(benjamini_hochberg(np.array([np.nan, np.nan]))).all()
@@ -0,0 +1,67 @@
+import asyncio
+from typing import Callable
+
+from lpo_measure.trials import TrialScheduler
+
+
+def measure(
+    scheduler: TrialScheduler, score: Callable[[int, int], int], workers: int = 50, stop_after: int | None = None
+) -> list[tuple[int, int]]:
+    """Run the scheduler's trials with more workers than trials, recording score(case id, trial) for each."""
+    taken: list[tuple[int, int]] = []
+
+    async def worker() -> None:
+        while (due := await scheduler.next_trial()) is not None:
+            if stop_after is not None and len(taken) >= stop_after:
+                scheduler.drop(*due)
+                return
+            taken.append(due)
+            await asyncio.sleep(0.001)
+            scheduler.record(*due, score(*due))
+
+    async def main() -> None:
+        async with asyncio.TaskGroup() as tg:
+            for _ in range(workers):
+                tg.create_task(worker())
+
+    asyncio.run(main())
+    return taken
+
+
+def test_cases_converge_with_room_for_every_trial():
+    scheduler = TrialScheduler([1, 2, 3, 4, 5], trials=5)
+    taken = measure(scheduler, lambda case_id, trial: 3)
+    # Identical scores converge after the minimum of 3 trials
+    assert sorted(taken) == [(case_id, trial) for case_id in range(1, 6) for trial in range(3)]
+    assert (scheduler.planned, scheduler.converged, scheduler.expected) == (25, 10, 15)
+
+
+def test_noisy_cases_run_every_trial():
+    scheduler = TrialScheduler([1, 2], trials=5)
+    taken = measure(scheduler, lambda case_id, trial: 3 if case_id == 1 else 3 * (trial % 2))
+    assert sorted(trial for case_id, trial in taken if case_id == 2) == [0, 1, 2, 3, 4]
+    assert sorted(trial for case_id, trial in taken if case_id == 1) == [0, 1, 2]
+
+
+def test_later_trials_wait_for_earlier_ones():
+    scheduler = TrialScheduler([1], trials=5)
+    taken = measure(scheduler, lambda case_id, trial: 3 * (trial % 2))
+    assert taken == [(1, 0), (1, 1), (1, 2), (1, 3), (1, 4)]
+
+
+def test_first_round_goes_out_before_the_second():
+    scheduler = TrialScheduler([1, 2, 3], trials=2)
+    assert measure(scheduler, lambda case_id, trial: 3)[:3] == [(1, 0), (2, 0), (3, 0)]
+
+
+def test_resumed_run_skips_measured_trials():
+    scheduler = TrialScheduler([1, 2], trials=4, measured={1: {0: 3, 1: 3, 2: 3}, 2: {0: 0}})
+    taken = measure(scheduler, lambda case_id, trial: 3 * (trial % 2))
+    # Case 1 had already converged
+    assert sorted(taken) == [(2, 1), (2, 2), (2, 3)]
+    assert scheduler.converged == 1
+
+
+def test_dropped_trials_do_not_keep_workers_waiting():
+    scheduler = TrialScheduler([1, 2, 3], trials=5)
+    assert len(measure(scheduler, lambda case_id, trial: 3 * (trial % 2), workers=4, stop_after=4)) == 4